@@ -26,6 +26,14 @@ fileConfig(config.config_file_name)
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
+# search columns and indexes only exist on Postgres and aren't mapped, see the add_search_indexes migration
+UNMAPPED_SEARCH_OBJECTS = {"search_vector", "ix_items_search_vector", "ix_menus_search_vector",
+                           "ix_items_title_trgm", "ix_menus_title_trgm"}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    return not (reflected and name in UNMAPPED_SEARCH_OBJECTS)
+
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
@@ -49,6 +57,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -72,7 +81,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_object=include_object
         )
 
         with context.begin_transaction():
@@ -0,0 +1,61 @@
+"""Soft delete stores, menus and items
+
+Revision ID: a6b2e8f4c1d9
+Revises: f5a0d7c3e912
+Create Date: 2026-10-18 19:47:26.731605
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6b2e8f4c1d9'
+down_revision = 'f5a0d7c3e912'
+branch_labels = None
+depends_on = None
+
+LIVE = sa.text('deleted_at IS NULL')
+PUBLIC = sa.text('deleted_at IS NULL AND is_active')
+
+
+def upgrade() -> None:
+    for table in ('stores', 'menus', 'items'):
+        op.add_column(table, sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+
+    # names and titles only have to be unique among live rows
+    op.drop_constraint('stores_name_key', 'stores', type_='unique')
+    op.drop_constraint('stores_name_owner_id_key', 'stores', type_='unique')
+    op.drop_constraint('menus_title_key', 'menus', type_='unique')
+    op.drop_constraint('menus_title_store_id_key', 'menus', type_='unique')
+    op.drop_constraint('items_title_menu_id_key', 'items', type_='unique')
+    op.create_index('uq_stores_name_live', 'stores', ['name'], unique=True,
+                    postgresql_where=LIVE, sqlite_where=LIVE)
+    op.create_index('uq_menus_title_live', 'menus', ['title'], unique=True,
+                    postgresql_where=LIVE, sqlite_where=LIVE)
+    op.create_index('uq_items_title_menu_id_live', 'items', ['title', 'menu_id'], unique=True,
+                    postgresql_where=LIVE, sqlite_where=LIVE)
+
+    # public listings only read live active rows
+    op.create_index('ix_menus_store_id_public', 'menus', ['store_id', 'id'], unique=False,
+                    postgresql_where=PUBLIC, sqlite_where=PUBLIC)
+    op.create_index('ix_items_menu_id_public', 'items', ['menu_id', 'id'], unique=False,
+                    postgresql_where=PUBLIC, sqlite_where=PUBLIC)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_items_menu_id_public', table_name='items')
+    op.drop_index('ix_menus_store_id_public', table_name='menus')
+    op.drop_index('uq_items_title_menu_id_live', table_name='items')
+    op.drop_index('uq_menus_title_live', table_name='menus')
+    op.drop_index('uq_stores_name_live', table_name='stores')
+    # archived rows would break the unique constraints
+    for table in ('items', 'menus', 'stores'):
+        op.execute(f'DELETE FROM {table} WHERE deleted_at IS NOT NULL')
+    op.create_unique_constraint('items_title_menu_id_key', 'items', ['title', 'menu_id'])
+    op.create_unique_constraint('menus_title_store_id_key', 'menus', ['title', 'store_id'])
+    op.create_unique_constraint('menus_title_key', 'menus', ['title'])
+    op.create_unique_constraint('stores_name_owner_id_key', 'stores', ['name', 'owner_id'])
+    op.create_unique_constraint('stores_name_key', 'stores', ['name'])
+    for table in ('items', 'menus', 'stores'):
+        op.drop_column(table, 'deleted_at')
@@ -0,0 +1,32 @@
+"""Add lookup indexes
+
+Revision ID: b3f1c2a9d4e7
+Revises: 6d8df73cc636
+Create Date: 2026-10-18 10:12:31.418207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3f1c2a9d4e7'
+down_revision = '6d8df73cc636'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_stores_unique_store_key'), 'stores', ['unique_store_key'], unique=True)
+    op.create_index(op.f('ix_stores_owner_id'), 'stores', ['owner_id'], unique=False)
+    op.create_index(op.f('ix_menus_store_id'), 'menus', ['store_id'], unique=False)
+    op.create_index(op.f('ix_items_menu_id'), 'items', ['menu_id'], unique=False)
+    op.create_index(op.f('ix_items_owner_id'), 'items', ['owner_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_items_owner_id'), table_name='items')
+    op.drop_index(op.f('ix_items_menu_id'), table_name='items')
+    op.drop_index(op.f('ix_menus_store_id'), table_name='menus')
+    op.drop_index(op.f('ix_stores_owner_id'), table_name='stores')
+    op.drop_index(op.f('ix_stores_unique_store_key'), table_name='stores')
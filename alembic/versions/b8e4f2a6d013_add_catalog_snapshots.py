@@ -0,0 +1,36 @@
+"""Add catalog snapshots
+
+Revision ID: b8e4f2a6d013
+Revises: a6b2e8f4c1d9
+Create Date: 2026-10-18 20:31:08.914276
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e4f2a6d013'
+down_revision = 'a6b2e8f4c1d9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # snapshots are built on the first read of a store, or its next write
+    op.create_table('catalog_snapshots',
+    sa.Column('store_id', sa.Integer(), nullable=False),
+    sa.Column('unique_store_key', sa.String(), nullable=False),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.Column('etag', sa.String(), nullable=False),
+    sa.Column('built_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['store_id'], ['stores.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('store_id')
+    )
+    op.create_index(op.f('ix_catalog_snapshots_unique_store_key'), 'catalog_snapshots', ['unique_store_key'],
+                    unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_catalog_snapshots_unique_store_key'), table_name='catalog_snapshots')
+    op.drop_table('catalog_snapshots')
@@ -0,0 +1,46 @@
+"""Add full text and trigram search indexes
+
+Revision ID: c4a7e9d2f1b3
+Revises: b3f1c2a9d4e7
+Create Date: 2026-10-18 14:05:47.102394
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a7e9d2f1b3'
+down_revision = 'b3f1c2a9d4e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Postgres only, other databases use the in-memory search index
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.add_column('items', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B')", persisted=True)))
+    op.add_column('menus', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(
+        "to_tsvector('english', coalesce(title, ''))", persisted=True)))
+    op.create_index('ix_items_search_vector', 'items', ['search_vector'], postgresql_using='gin')
+    op.create_index('ix_menus_search_vector', 'menus', ['search_vector'], postgresql_using='gin')
+    op.create_index('ix_items_title_trgm', 'items', ['title'], postgresql_using='gin',
+                    postgresql_ops={'title': 'gin_trgm_ops'})
+    op.create_index('ix_menus_title_trgm', 'menus', ['title'], postgresql_using='gin',
+                    postgresql_ops={'title': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.drop_index('ix_menus_title_trgm', table_name='menus')
+    op.drop_index('ix_items_title_trgm', table_name='items')
+    op.drop_index('ix_menus_search_vector', table_name='menus')
+    op.drop_index('ix_items_search_vector', table_name='items')
+    op.drop_column('menus', 'search_vector')
+    op.drop_column('items', 'search_vector')
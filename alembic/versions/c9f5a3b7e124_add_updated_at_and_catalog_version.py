@@ -0,0 +1,32 @@
+"""Add updated_at and catalog version
+
+Revision ID: c9f5a3b7e124
+Revises: b8e4f2a6d013
+Create Date: 2026-10-18 21:12:44.503817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9f5a3b7e124'
+down_revision = 'b8e4f2a6d013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    for table in ('stores', 'menus', 'items'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'),
+                                       nullable=False))
+    op.add_column('stores', sa.Column('catalog_version', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('stores', sa.Column('catalog_updated_at', sa.DateTime(timezone=True),
+                                      server_default=sa.text('now()'), nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('stores', 'catalog_updated_at')
+    op.drop_column('stores', 'catalog_version')
+    for table in ('items', 'menus', 'stores'):
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,28 @@
+"""Add image renditions
+
+Revision ID: d81e5b3c7a20
+Revises: c4a7e9d2f1b3
+Create Date: 2026-10-18 15:22:09.531870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81e5b3c7a20'
+down_revision = 'c4a7e9d2f1b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('items', sa.Column('image_renditions', sa.JSON(), nullable=True))
+    op.add_column('menus', sa.Column('image_renditions', sa.JSON(), nullable=True))
+    op.add_column('stores', sa.Column('logo_renditions', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('stores', 'logo_renditions')
+    op.drop_column('menus', 'image_renditions')
+    op.drop_column('items', 'image_renditions')
@@ -0,0 +1,34 @@
+"""Allow rows to share image objects
+
+Revision ID: e2c94f6a1b58
+Revises: d81e5b3c7a20
+Create Date: 2026-10-18 16:40:12.884123
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2c94f6a1b58'
+down_revision = 'd81e5b3c7a20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.drop_constraint('items_image_url_key', 'items', type_='unique')
+    op.drop_constraint('menus_image_url_key', 'menus', type_='unique')
+    op.drop_constraint('stores_logo_url_key', 'stores', type_='unique')
+    op.create_index(op.f('ix_items_image_url'), 'items', ['image_url'], unique=False)
+    op.create_index(op.f('ix_menus_image_url'), 'menus', ['image_url'], unique=False)
+    op.create_index(op.f('ix_stores_logo_url'), 'stores', ['logo_url'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_stores_logo_url'), table_name='stores')
+    op.drop_index(op.f('ix_menus_image_url'), table_name='menus')
+    op.drop_index(op.f('ix_items_image_url'), table_name='items')
+    op.create_unique_constraint('stores_logo_url_key', 'stores', ['logo_url'])
+    op.create_unique_constraint('menus_image_url_key', 'menus', ['image_url'])
+    op.create_unique_constraint('items_image_url_key', 'items', ['image_url'])
@@ -0,0 +1,35 @@
+"""Add outbox
+
+Revision ID: f5a0d7c3e912
+Revises: e2c94f6a1b58
+Create Date: 2026-10-18 18:03:55.260317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5a0d7c3e912'
+down_revision = 'e2c94f6a1b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('task', sa.String(), nullable=False),
+    sa.Column('args', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('delivered_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_outbox_pending', 'outbox', ['id'], unique=False,
+                    postgresql_where=sa.text('sent_at IS NULL'), sqlite_where=sa.text('sent_at IS NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_outbox_pending', table_name='outbox')
+    op.drop_table('outbox')
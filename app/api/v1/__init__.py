@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.v1.routers import menu, items, user, store
+from app.api.v1.routers import menu, items, user, store, catalog, search, internal
 
 version_router = APIRouter(prefix="/v1")
 
@@ -8,3 +8,6 @@ version_router.include_router(user.router)
 version_router.include_router(store.router)
 version_router.include_router(menu.router)
 version_router.include_router(items.router)
+version_router.include_router(catalog.router)
+version_router.include_router(search.router)
+version_router.include_router(internal.router)
@@ -2,3 +2,7 @@ from .crud_store import store
 from .crud_user import user
 from .crud_menu import menu
 from .crud_item import item
+from .crud_catalog import catalog
+from .crud_search import search
+from .crud_outbox import outbox
+from .crud_snapshot import snapshot
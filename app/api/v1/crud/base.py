@@ -1,10 +1,19 @@
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
+from typing import Any, Dict, Generic, List, Optional, Sequence, Type, TypeVar, Union
 
 from fastapi.encoders import jsonable_encoder
+from fastapi_pagination import Page, Params
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
 
+from app.api.v1.crud.crud_outbox import outbox
 from app.db.database import Base
+from app.db.soft_delete import SoftDeleteMixin
+from app.utils.cache import invalidate_store
+from app.utils.helpers import upload_encoded_photo
 
 ModelType = TypeVar("ModelType", bound=Base)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
@@ -12,6 +21,12 @@ UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
 
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
+    # url column of the image of the model and the column holding its resized renditions
+    image_field: Optional[str] = None
+    renditions_field: Optional[str] = None
+    # response schema of the rows of the fast read path, see `select_rows`
+    read_schema: Optional[Type[BaseModel]] = None
+
     def __init__(self, model: Type[ModelType]):
         """
         CRUD object with default methods to Create, Read, Update, Delete (CRUD).
@@ -21,44 +36,250 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         """
         self.model = model
 
-    def get(self, db: Session, id: Any) -> Optional[ModelType]:
-        return db.query(self.model).filter(self.model.id == id).first()
+    @property
+    def soft_delete(self) -> bool:
+        return issubclass(self.model, SoftDeleteMixin)
+
+    def live(self) -> List[Any]:
+        """
+        Criteria of the rows not archived, for statements the ORM doesn't filter itself (UPDATE,
+        DELETE and selects wrapped in subqueries).
+        """
+        return [self.model.deleted_at.is_(None)] if self.soft_delete else []
+
+    async def get(self, db: AsyncSession, id: Any) -> Optional[ModelType]:
+        return await db.scalar(select(self.model).filter(self.model.id == id))
 
-    def get_multi(self, db: Session, *, skip: int = 0, limit: int = 5000) -> List[ModelType]:
-        return (
-            db.query(self.model).order_by(self.model.id).offset(skip).limit(limit).all()
+    async def get_multi(self, db: AsyncSession, *, skip: int = 0, limit: int = 5000) -> List[ModelType]:
+        result = await db.scalars(
+            select(self.model).order_by(self.model.id).offset(skip).limit(limit)
         )
+        return result.all()
+
+    async def store_key_of(self, db: AsyncSession, db_obj: ModelType) -> Optional[str]:
+        """
+        `unique_store_key` of the store whose public catalog shows `db_obj`, if any.
+        """
+        return None
 
-    def create(self, db: Session, *, obj_in: CreateSchemaType) -> ModelType:
+    def catalog_changed(self, db: AsyncSession, unique_store_key: Optional[str]) -> None:
+        """
+        Queue the rebuild of the catalog snapshot of a store with the pending changes of `db`, the
+        previous snapshot is served until a celery worker has rebuilt it and bumped the catalog version.
+        """
+        if unique_store_key:
+            outbox.add(db, task="refresh_catalog_snapshot", args=[unique_store_key])
+
+    async def commit_catalog_change(self, db: AsyncSession, unique_store_key: Optional[str]) -> None:
+        """
+        Commit a write to the catalog of a store, the cached entries of the store are dropped once
+        committed so that readers can't cache the previous rows again.
+        """
+        self.catalog_changed(db, unique_store_key)
+        await db.commit()
+        if unique_store_key:
+            await invalidate_store(unique_store_key)
+
+    def schedule_renditions(self, db: AsyncSession, *ids: int) -> None:
+        """
+        Resize the images of the given rows on the celery workers. The jobs go through the outbox
+        with the pending changes of `db`, so the request neither waits on nor fails with the broker.
+        """
+        if self.image_field:
+            for id in ids:
+                outbox.add(db, task="generate_image_renditions", args=[self.model.__tablename__, id])
+
+    async def paginate(self, db: AsyncSession, query: Select, params: Params) -> Page[ModelType]:
+        """
+        Page through `query` with LIMIT/OFFSET and a COUNT query, both run in the database.
+        """
+        raw_params = params.to_raw_params()
+        total = await db.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+        result = await db.scalars(
+            query.order_by(self.model.id).offset(raw_params.offset).limit(raw_params.limit)
+        )
+        return Page.create(items=result.all(), total=total, params=params)
+
+    async def paginate_keyset(
+            self, db: AsyncSession, query: Select, *, cursor: Optional[int] = None, size: int = 50
+    ) -> Dict[str, Any]:
+        """
+        Page through `query` on `id` (keyset pagination), deep pages cost the same as the first one.
+        """
+        if cursor is not None:
+            query = query.filter(self.model.id > cursor)
+        result = await db.scalars(query.order_by(self.model.id).limit(size + 1))
+        items = result.all()
+        next_cursor = items[size - 1].id if len(items) > size else None
+        return {"items": items[:size], "size": size, "next_cursor": next_cursor}
+
+    def select_rows(self, query: Select) -> Select:
+        """
+        `query` narrowed to the columns of `read_schema`. The rows are trusted database values and
+        are serialized as they are, without the per object validation of the response model.
+        """
+        columns = self.model.__table__.columns
+        return query.with_only_columns(*(columns[name] for name in self.read_schema.__fields__ if name in columns))
+
+    def row_to_dict(self, row: Row) -> Dict[str, Any]:
+        """
+        Response dict of a row of `select_rows`, subclasses add the fields not stored in a column.
+        """
+        return dict(row._mapping)
+
+    async def paginate_rows(self, db: AsyncSession, query: Select, params: Params) -> Dict[str, Any]:
+        """
+        `paginate` as a dict of plain rows, sent by `rows_response`.
+        """
+        raw_params = params.to_raw_params()
+        total = await db.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+        result = await db.execute(
+            self.select_rows(query).order_by(self.model.id).offset(raw_params.offset).limit(raw_params.limit)
+        )
+        page = Page.create(items=[], total=total, params=params)
+        return {**page.dict(), "items": [self.row_to_dict(row) for row in result]}
+
+    async def paginate_keyset_rows(
+            self, db: AsyncSession, query: Select, *, cursor: Optional[int] = None, size: int = 50
+    ) -> Dict[str, Any]:
+        """
+        `paginate_keyset` as a dict of plain rows, sent by `rows_response`.
+        """
+        if cursor is not None:
+            query = query.filter(self.model.id > cursor)
+        result = await db.execute(self.select_rows(query).order_by(self.model.id).limit(size + 1))
+        items = [self.row_to_dict(row) for row in result]
+        next_cursor = items[size - 1]["id"] if len(items) > size else None
+        return {"items": items[:size], "size": size, "next_cursor": next_cursor}
+
+    async def insert_many(
+            self, db: AsyncSession, rows: List[Dict[str, Any]], *returning: Any, chunk_size: int = 500
+    ) -> List[Row]:
+        """
+        Batched `INSERT ... ON CONFLICT DO NOTHING RETURNING`, rows hitting a unique constraint are
+        skipped instead of failing the batch and are missing from the result. Doesn't commit.
+        """
+        if not rows:
+            return []
+        dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+        inserted = []
+        for start in range(0, len(rows), chunk_size):
+            statement = dialect.insert(self.model).values(rows[start:start + chunk_size])
+            result = await db.execute(statement.on_conflict_do_nothing().returning(*returning))
+            inserted.extend(result.all())
+        return inserted
+
+    async def create(self, db: AsyncSession, *, obj_in: CreateSchemaType) -> ModelType:
         obj_in_data = jsonable_encoder(obj_in)
         db_obj = self.model(**obj_in_data)  # type: ignore
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        await db.flush()
+        await self.commit_catalog_change(db, await self.store_key_of(db, db_obj))
+        await db.refresh(db_obj)
         return db_obj
 
-    def update(
+    def get_update_data(self, obj_in: Union[UpdateSchemaType, Dict[str, Any]]) -> Dict[str, Any]:
+        if isinstance(obj_in, dict):
+            return dict(obj_in)
+        return obj_in.dict(exclude_unset=True)
+
+    def get_update_values(self, update_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Column values to write for `update_data`, a new image drops the renditions of the previous one.
+        """
+        columns = self.model.__table__.columns
+        values = {field: value for field, value in update_data.items() if field in columns}
+        if self.image_field in values:
+            values[self.renditions_field] = None
+        return values
+
+    async def update(
             self,
-            db: Session,
+            db: AsyncSession,
             *,
             db_obj: ModelType,
             obj_in: Union[UpdateSchemaType, Dict[str, Any]]
     ) -> ModelType:
-        obj_data = jsonable_encoder(db_obj)
-        if isinstance(obj_in, dict):
-            update_data = obj_in
-        else:
-            update_data = obj_in.dict(exclude_unset=True)
-        for field in obj_data:
-            if field in update_data:
-                setattr(db_obj, field, update_data[field])
+        values = self.get_update_values(self.get_update_data(obj_in))
+        for field, value in values.items():
+            setattr(db_obj, field, value)
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        if self.image_field in values:
+            self.schedule_renditions(db, db_obj.id)
+        await self.commit_catalog_change(db, await self.store_key_of(db, db_obj))
         return db_obj
 
-    def remove(self, db: Session, *, id: int) -> ModelType:
-        obj = db.query(self.model).get(id)
-        db.delete(obj)
-        db.commit()
+    async def update_returning(
+            self,
+            db: AsyncSession,
+            *,
+            where: List[Any],
+            obj_in: Union[UpdateSchemaType, Dict[str, Any]],
+            returning: Sequence[Any] = ()
+    ) -> Optional[Row]:
+        """
+        Update the row matching `where` with a single `UPDATE ... RETURNING`, None when no row matches.
+        The row has the model columns plus the `returning` expressions, a `unique_store_key` among them
+        names the store whose catalog changed. An `encoded_photo` is only uploaded once `where` has
+        matched and locked the row, its url is then written by a second UPDATE in the same transaction.
+        """
+        table = self.model.__table__
+        update_data = self.get_update_data(obj_in)
+        encoded_photo, extension = update_data.pop("encoded_photo", None), update_data.pop("extension", None)
+        values = self.get_update_values(update_data)
+        where = [*where, *self.live()]
+        if values:
+            statement = update(table).where(*where).values(**values).returning(*table.columns, *returning)
+        else:
+            statement = select(*table.columns, *returning).where(*where)
+            if encoded_photo and extension:
+                statement = statement.with_for_update(of=table)
+        row = (await db.execute(statement)).first()
+        if row is not None and self.image_field and encoded_photo and extension:
+            image_values = self.get_update_values(
+                {self.image_field: await upload_encoded_photo(encoded_photo, extension)}
+            )
+            row = (await db.execute(
+                update(table).where(table.c.id == row.id).values(**image_values).returning(*table.columns, *returning)
+            )).first()
+            values.update(image_values)
+        changed = row is not None and bool(values)
+        if changed and self.image_field in values:
+            self.schedule_renditions(db, row.id)
+        await self.commit_catalog_change(db, row._mapping.get("unique_store_key") if changed else None)
+        return row
+
+    async def remove(self, db: AsyncSession, *, id: int) -> ModelType:
+        obj = await db.get(self.model, id)
+        if self.soft_delete:
+            obj.deleted_at = func.now()
+            await self.archive_children(db, id)
+        else:
+            await db.delete(obj)
+        await self.commit_catalog_change(db, await self.store_key_of(db, obj))
         return obj
+
+    async def remove_returning(
+            self, db: AsyncSession, *, where: List[Any], returning: Sequence[Any] = ()
+    ) -> Optional[Row]:
+        """
+        Delete the row matching `where` with a single `DELETE ... RETURNING`, None when no row matches.
+        Soft deleted models are archived with an UPDATE instead, along with their children. As with
+        `update_returning`, a returned `unique_store_key` names the store whose catalog changed.
+        """
+        table = self.model.__table__
+        if self.soft_delete:
+            statement = update(table).where(*where, *self.live()).values(deleted_at=func.now())
+        else:
+            statement = delete(table).where(*where)
+        row = (await db.execute(statement.returning(*table.columns, *returning))).first()
+        if row is not None and self.soft_delete:
+            await self.archive_children(db, row.id)
+        await self.commit_catalog_change(db, row._mapping.get("unique_store_key") if row is not None else None)
+        return row
+
+    async def archive_children(self, db: AsyncSession, id: int) -> None:
+        """
+        Archive the live rows belonging to the archived row `id`, in its transaction.
+        """
+        pass
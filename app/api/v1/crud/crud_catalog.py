@@ -0,0 +1,111 @@
+import codecs
+import csv
+import json
+import zipfile
+from typing import List, Optional, Tuple
+
+from fastapi import UploadFile
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1 import schemas
+from app.api.v1.crud.crud_item import item
+from app.api.v1.crud.crud_menu import menu
+from app.api.v1.crud.crud_store import store as crud_store
+from app.models.item import Item
+from app.models.menu import Menu
+from app.models.store import Store
+from app.utils.helpers import upload_archive_images
+
+
+def parse_catalog(catalog: UploadFile) -> Tuple[List[Tuple[int, schemas.CatalogImportRow]],
+                                                List[schemas.CatalogImportError]]:
+    """
+    Parse a csv or json lines catalog into rows, invalid lines are returned as errors.
+    """
+    rows, errors = [], []
+    lines = codecs.iterdecode(catalog.file, "utf-8")
+    if (catalog.filename or "").lower().endswith(".csv"):
+        records = (
+            (number, {key: value for key, value in record.items() if value not in ("", None)})
+            for number, record in enumerate(csv.DictReader(lines), start=1)
+        )
+    else:
+        records = ((number, line) for number, line in enumerate(lines, start=1) if line.strip())
+    for number, record in records:
+        try:
+            record = json.loads(record) if isinstance(record, str) else record
+            rows.append((number, schemas.CatalogImportRow.parse_obj(record)))
+        except (ValueError, ValidationError) as ex:
+            errors.append(schemas.CatalogImportError(row=number, detail=str(ex)))
+    return rows, errors
+
+
+class CRUDCatalog:
+    async def import_catalog(self, db: AsyncSession, *, store: Store, owner_id: int, catalog: UploadFile,
+                             images: Optional[zipfile.ZipFile]) -> schemas.CatalogImportResult:
+        """
+        Import menus and items of a store in batches. Images are uploaded concurrently and a failing
+        row (bad data, missing image, duplicate title) is reported without aborting the import.
+        """
+        rows, errors = parse_catalog(catalog)
+
+        def fail(number, detail):
+            errors.append(schemas.CatalogImportError(row=number, detail=detail))
+
+        # menus, created with the first menu_image given for a title
+        menu_ids = dict((await db.execute(
+            select(Menu.title, Menu.id).filter(Menu.store_id == store.id, Menu.deleted_at.is_(None))
+        )).all())
+        new_menus = {}
+        for number, row in rows:
+            if row.menu.capitalize() not in menu_ids and row.menu_image:
+                new_menus.setdefault(row.menu.capitalize(), row.menu_image)
+        menu_urls, menu_errors = await upload_archive_images(images, new_menus)
+        menu_rows = [dict(title=title, is_active=True, store_id=store.id, image_url=url)
+                     for title, url in menu_urls.items()]
+        created_menus = await menu.insert_many(db, menu_rows, Menu.title, Menu.id)
+        menu_ids.update(dict(created_menus))
+
+        # items, checked against the store's existing titles before uploading their image
+        existing = set((await db.execute(
+            select(Item.title, Item.menu_id).filter(Item.menu_id.in_(menu_ids.values()), Item.deleted_at.is_(None))
+        )).all())
+        pending = []
+        for number, row in rows:
+            title, menu_title = row.title.capitalize(), row.menu.capitalize()
+            if menu_title not in menu_ids:
+                if menu_title not in new_menus:
+                    fail(number, f"Menu {menu_title} doesn't exist and has no menu_image")
+                elif menu_title in menu_errors:
+                    fail(number, menu_errors[menu_title])
+                else:
+                    fail(number, f"Menu {menu_title} already exists")
+            elif (title, menu_ids[menu_title]) in existing:
+                fail(number, f"Item {title} already exists in menu {menu_title}")
+            else:
+                existing.add((title, menu_ids[menu_title]))
+                pending.append((number, row, dict(title=title, description=row.description, price=row.price,
+                                                  is_active=row.is_active, menu_id=menu_ids[menu_title],
+                                                  owner_id=owner_id)))
+        item_urls, item_errors = await upload_archive_images(images, {number: row.image for number, row, _ in pending})
+        item_rows = {}
+        for number, row, values in pending:
+            if number in item_urls:
+                item_rows[(values["title"], values["menu_id"])] = (number, dict(values, image_url=item_urls[number]))
+            else:
+                fail(number, item_errors[number])
+        created_items = await item.insert_many(db, [values for _, values in item_rows.values()],
+                                               Item.title, Item.menu_id, Item.id)
+        for key in item_rows.keys() - {(title, menu_id) for title, menu_id, _ in created_items}:
+            fail(item_rows[key][0], f"Item {key[0]} already exists")
+
+        menu.schedule_renditions(db, *(menu_id for _, menu_id in created_menus))
+        item.schedule_renditions(db, *(item_id for _, _, item_id in created_items))
+        await crud_store.commit_catalog_change(db, store.unique_store_key)
+        return schemas.CatalogImportResult(menus_created=len(created_menus), items_created=len(created_items),
+                                           errors=sorted(errors, key=lambda error: error.row))
+
+
+catalog = CRUDCatalog()
@@ -1,52 +1,93 @@
-from typing import List
+from typing import Any, Dict, List, Optional, Union
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
 
 from app.api.v1 import schemas
 from app.api.v1.crud.base import CRUDBase
+from app.api.v1.crud.crud_store import unique_store_key_of
 from app.models.item import Item
-from app.utils.helpers import upload_photo_to_s3
+from app.models.menu import Menu
+from app.models.store import Store
+from app.utils.helpers import upload_encoded_photo
 
 
 class CRUDItem(CRUDBase[Item, schemas.ItemCreate, schemas.ItemUpdate]):
-    def create_with_menu_owner(self, db: Session, *, obj_in: schemas.ItemCreate, menu_id: int, owner_id: int) -> Item:
-        url = upload_photo_to_s3(obj_in.encoded_photo, obj_in.extension)
+    image_field = "image_url"
+    renditions_field = "image_renditions"
+    read_schema = schemas.Item
+
+    async def create_with_menu_owner(self, db: AsyncSession, *, obj_in: Union[schemas.ItemCreate, schemas.ItemForm],
+                                     menu_id: int, owner_id: int, image_url: Optional[str] = None) -> Item:
+        if image_url is None:
+            image_url = await upload_encoded_photo(obj_in.encoded_photo, obj_in.extension)
         db_obj = Item(title=obj_in.title.capitalize(),
                       description=obj_in.description,
                       price=obj_in.price,
                       is_active=obj_in.is_active,
                       menu_id=menu_id,
                       owner_id=owner_id,
-                      image_url=url)
+                      image_url=image_url)
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        await db.flush()
+        self.schedule_renditions(db, db_obj.id)
+        await self.commit_catalog_change(db, await self.store_key_of(db, db_obj))
+        await db.refresh(db_obj)
         return db_obj
 
-    def get_multi_by_menu(
-            self, db: Session, *, menu_id: int, owner_id:int, skip: int = 0, limit: int = 100
-    ) -> List[Item]:
+    async def store_key_of(self, db: AsyncSession, db_obj: Item) -> Optional[str]:
+        return await db.scalar(select(Store.unique_store_key).join(Menu).filter(Menu.id == db_obj.menu_id))
+
+    def query_by_store(self, *, store_id: int) -> Select:
+        return select(self.model).join(Menu).filter(Menu.store_id == store_id, *self.live())
+
+    def query_public_by_store(self, *, store_id: int) -> Select:
+        """
+        Live active items of the live active menus of a store, read through the public partial indexes.
+        """
         return (
-            db.query(self.model)
+            self.query_by_store(store_id=store_id)
+            .filter(Menu.deleted_at.is_(None), Menu.is_active.is_(True))
+            .filter(self.model.is_active.is_(True))
+        )
+
+    def query_by_store_menu(self, *, store_id: int, menu_id: int) -> Select:
+        return self.query_by_store(store_id=store_id).filter(self.model.menu_id == menu_id)
+
+    async def get_multi_by_menu(
+            self, db: AsyncSession, *, menu_id: int, owner_id:int, skip: int = 0, limit: int = 100
+    ) -> List[Item]:
+        result = await db.scalars(
+            select(self.model)
             .filter(self.model.menu_id == menu_id)
             .filter(self.model.owner_id == owner_id)
             .offset(skip)
             .limit(limit)
-            .all()
+        )
+        return result.all()
+
+    def filter_owned(self, *, item_id: int, menu_id: int, store_id: int, owner_id: int) -> List[Any]:
+        return [Item.id == item_id, Item.owner_id == owner_id, Item.menu_id == menu_id,
+                Item.menu_id.in_(select(Menu.id).filter(Menu.store_id == store_id))]
+
+    async def update_owned(self, db: AsyncSession, *, item_id: int, menu_id: int, store_id: int, owner_id: int,
+                           obj_in: Union[schemas.ItemUpdate, Dict[str, Any]]) -> Optional[Row]:
+        """
+        Update an item of `owner_id` in one statement, None when the owner has no such item in the menu.
+        """
+        return await self.update_returning(
+            db, where=self.filter_owned(item_id=item_id, menu_id=menu_id, store_id=store_id, owner_id=owner_id),
+            obj_in=obj_in, returning=[unique_store_key_of(store_id)]
         )
 
-    def update(
-            self, db: Session, *, db_obj: Item, obj_in: schemas.ItemUpdate
-    ) -> Item:
-        if isinstance(obj_in, dict):
-            update_data = obj_in
-        else:
-            update_data = obj_in.dict(exclude_unset=True)
-        if "encoded_photo" in update_data and  update_data["encoded_photo"] and update_data["extension"]:
-            url = upload_photo_to_s3(update_data["encoded_photo"], update_data["extension"])
-            del update_data["image_url"]
-            update_data["image_url"] = url
-        return super().update(db, db_obj=db_obj, obj_in=update_data)
+    async def remove_owned(self, db: AsyncSession, *, item_id: int, menu_id: int, store_id: int,
+                           owner_id: int) -> Optional[Row]:
+        return await self.remove_returning(
+            db, where=self.filter_owned(item_id=item_id, menu_id=menu_id, store_id=store_id, owner_id=owner_id),
+            returning=[unique_store_key_of(store_id)]
+        )
 
 
 item = CRUDItem(Item)
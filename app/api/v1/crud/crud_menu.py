@@ -1,48 +1,84 @@
-from typing import List
+from typing import Any, Dict, List, Optional, Union
 
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
 
 from app.api.v1 import schemas
 from app.api.v1.crud.base import CRUDBase
+from app.api.v1.crud.crud_store import unique_store_key_of
+from app.models.item import Item
 from app.models.menu import Menu
-from app.utils.helpers import upload_photo_to_s3
+from app.models.store import Store
+from app.utils.helpers import upload_encoded_photo
 
 
 class CRUDMenu(CRUDBase[Menu, schemas.MenuCreate, schemas.MenuUpdate]):
-    def create_with_shop(self, db: Session, *, obj_in: schemas.StoreCreate, store_id: int) -> Menu:
-        url = upload_photo_to_s3(obj_in.encoded_photo, obj_in.extension)
+    image_field = "image_url"
+    renditions_field = "image_renditions"
+    read_schema = schemas.Menu
+
+    async def create_with_shop(self, db: AsyncSession, *, obj_in: Union[schemas.MenuCreate, schemas.MenuForm],
+                               store_id: int, image_url: Optional[str] = None) -> Menu:
+        if image_url is None:
+            image_url = await upload_encoded_photo(obj_in.encoded_photo, obj_in.extension)
         db_obj = Menu(title=obj_in.title.capitalize(),
                       is_active=obj_in.is_active,
                       store_id=store_id,
-                      image_url=url)
+                      image_url=image_url)
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        await db.flush()
+        self.schedule_renditions(db, db_obj.id)
+        await self.commit_catalog_change(db, await self.store_key_of(db, db_obj))
+        await db.refresh(db_obj)
         return db_obj
 
-    def get_multi_by_shop(
-            self, db: Session, *, store_id: int, skip: int = 0, limit: int = 100
+    async def store_key_of(self, db: AsyncSession, db_obj: Menu) -> Optional[str]:
+        return await db.scalar(select(Store.unique_store_key).filter(Store.id == db_obj.store_id))
+
+    def query_by_shop(self, *, store_id: int) -> Select:
+        return select(self.model).filter(self.model.store_id == store_id, *self.live())
+
+    def query_public_by_shop(self, *, store_id: int) -> Select:
+        """
+        Live active menus of a store, read through the ix_menus_store_id_public partial index.
+        """
+        return self.query_by_shop(store_id=store_id).filter(self.model.is_active.is_(True))
+
+    async def archive_children(self, db: AsyncSession, id: int) -> None:
+        await db.execute(update(Item).where(Item.menu_id == id, Item.deleted_at.is_(None))
+                         .values(deleted_at=func.now()))
+
+    async def get_multi_by_shop(
+            self, db: AsyncSession, *, store_id: int, skip: int = 0, limit: int = 100
     ) -> List[Menu]:
-        return (
-            db.query(self.model)
-            .filter(self.model.store_id == store_id)
+        result = await db.scalars(
+            self.query_by_shop(store_id=store_id)
             .offset(skip)
             .limit(limit)
-            .all()
         )
+        return result.all()
 
-    def update(
-            self, db: Session, *, db_obj: Menu, obj_in: schemas.MenuUpdate
-    ) -> Menu:
-        if isinstance(obj_in, dict):
-            update_data = obj_in
-        else:
-            update_data = obj_in.dict(exclude_unset=True)
-        if "encoded_photo" in update_data and  update_data["encoded_photo"] and update_data["extension"]:
-            url = upload_photo_to_s3(update_data["encoded_photo"], update_data["extension"])
-            del update_data["image_url"]
-            update_data["image_url"] = url
-        return super().update(db, db_obj=db_obj, obj_in=update_data)
+    def filter_owned(self, *, menu_id: int, store_id: int, owner_id: int) -> List[Any]:
+        return [Menu.id == menu_id, Menu.store_id == store_id,
+                Menu.store_id.in_(select(Store.id).filter(Store.owner_id == owner_id))]
+
+    async def update_owned(self, db: AsyncSession, *, menu_id: int, store_id: int, owner_id: int,
+                           obj_in: Union[schemas.MenuUpdate, Dict[str, Any]]) -> Optional[Row]:
+        """
+        Update a menu of a store of `owner_id` in one statement, None when the owner has no such menu.
+        """
+        return await self.update_returning(
+            db, where=self.filter_owned(menu_id=menu_id, store_id=store_id, owner_id=owner_id), obj_in=obj_in,
+            returning=[unique_store_key_of(store_id)]
+        )
+
+    async def remove_owned(self, db: AsyncSession, *, menu_id: int, store_id: int, owner_id: int) -> Optional[Row]:
+        return await self.remove_returning(
+            db, where=self.filter_owned(menu_id=menu_id, store_id=store_id, owner_id=owner_id),
+            returning=[unique_store_key_of(store_id)]
+        )
 
 
 menu = CRUDMenu(Menu)
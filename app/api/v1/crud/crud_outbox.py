@@ -0,0 +1,18 @@
+from typing import Any, List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.outbox import OutboxMessage
+
+
+class CRUDOutbox:
+    def add(self, db: AsyncSession, *, task: str, args: List[Any]) -> OutboxMessage:
+        """
+        Queue a celery task with the pending changes of `db`, it is only published if they commit.
+        """
+        db_obj = OutboxMessage(task=task, args=args)
+        db.add(db_obj)
+        return db_obj
+
+
+outbox = CRUDOutbox()
@@ -0,0 +1,82 @@
+from typing import List
+
+from sqlalchemy import func, literal_column, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1 import schemas
+from app.models.item import Item
+from app.models.menu import Menu
+from app.models.store import Store
+from app.utils.search import SearchIndex, get_search_index, set_search_index
+
+# generated tsvector columns, added by migration on Postgres only and so not mapped on the models
+ITEM_SEARCH_VECTOR = literal_column("items.search_vector")
+MENU_SEARCH_VECTOR = literal_column("menus.search_vector")
+SEARCH_CONFIG = "english"
+
+
+class CRUDSearch:
+    def query_active_items(self, store_id: int):
+        return (
+            select(Item, Menu.title.label("menu_title"))
+            .join(Menu)
+            .filter(Menu.store_id == store_id)
+            .filter(Menu.deleted_at.is_(None), Menu.is_active.is_(True))
+            .filter(Item.deleted_at.is_(None), Item.is_active.is_(True))
+        )
+
+    async def search(self, db: AsyncSession, *, store: Store, q: str, limit: int = 20) -> List[schemas.SearchResult]:
+        """
+        Active items of a store matching `q` in their title, description or menu title, best first.
+        """
+        if db.bind.dialect.name == "postgresql":
+            rows = await self.search_postgres(db, store_id=store.id, q=q, limit=limit)
+        else:
+            rows = await self.search_index(db, store=store, q=q, limit=limit)
+        return [schemas.SearchResult(**schemas.Item.from_orm(item).dict(), menu_title=menu_title, rank=rank)
+                for item, menu_title, rank in rows]
+
+    async def search_postgres(self, db: AsyncSession, *, store_id: int, q: str, limit: int):
+        """
+        Full text match on the GIN indexed tsvectors, trigram similarity of the titles catches typos.
+        """
+        query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+        rank = (func.ts_rank(ITEM_SEARCH_VECTOR, query)
+                + 0.2 * func.ts_rank(MENU_SEARCH_VECTOR, query)
+                + 0.5 * func.similarity(Item.title, q))
+        result = await db.execute(
+            self.query_active_items(store_id)
+            .add_columns(rank.label("rank"))
+            .filter(or_(ITEM_SEARCH_VECTOR.op("@@")(query),
+                        MENU_SEARCH_VECTOR.op("@@")(query),
+                        Item.title.op("%")(q),
+                        Menu.title.op("%")(q)))
+            .order_by(rank.desc(), Item.id)
+            .limit(limit)
+        )
+        return result.all()
+
+    async def search_index(self, db: AsyncSession, *, store: Store, q: str, limit: int):
+        """
+        Search the in-memory index of the store, built on first use and dropped on catalog changes.
+        """
+        index = get_search_index(str(store.unique_store_key))
+        if index is None:
+            result = await db.execute(
+                select(Item.id, Item.title, Item.description, Menu.title)
+                .join(Menu)
+                .filter(Menu.store_id == store.id)
+                .filter(Menu.deleted_at.is_(None), Menu.is_active.is_(True))
+                .filter(Item.deleted_at.is_(None), Item.is_active.is_(True))
+            )
+            index = SearchIndex(result.all())
+            set_search_index(str(store.unique_store_key), index)
+        scores = dict(index.search(q, limit))
+        if not scores:
+            return []
+        result = await db.execute(self.query_active_items(store.id).filter(Item.id.in_(scores)))
+        rows = [(item, menu_title, scores[item.id]) for item, menu_title in result.all()]
+        return sorted(rows, key=lambda row: (-row[2], row[0].id))
+
+
+search = CRUDSearch()
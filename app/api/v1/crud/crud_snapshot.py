@@ -0,0 +1,32 @@
+from typing import Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.catalog_snapshot import CatalogSnapshot
+from app.utils.snapshot import refresh_snapshot
+
+
+class CRUDSnapshot:
+    async def get(self, db: AsyncSession, *, unique_store_key: str) -> Optional[Row]:
+        """
+        (body, etag) of the catalog of a public store, one indexed read whatever the catalog size.
+        """
+        return (await db.execute(
+            select(CatalogSnapshot.body, CatalogSnapshot.etag)
+            .filter(CatalogSnapshot.unique_store_key == unique_store_key)
+        )).first()
+
+    async def refresh(self, db: AsyncSession, *, unique_store_key: str,
+                      bump_version: bool = True) -> Optional[Tuple[str, str]]:
+        """
+        Rebuild the snapshot of a store in a transaction of its own, None when the store isn't public.
+        Writes leave the rebuild to the celery workers, this is for stores without a snapshot yet.
+        """
+        snapshot = await db.run_sync(refresh_snapshot, unique_store_key, bump_version)
+        await db.commit()
+        return snapshot
+
+
+snapshot = CRUDSnapshot()
@@ -1,19 +1,38 @@
-from typing import List
+from typing import Any, Dict, List, Optional, Union
 from uuid import uuid4
 
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.engine import Row
+from sqlalchemy.sql import Select
 
 from app.api.v1 import schemas
 from app.api.v1.crud.base import CRUDBase
+from app.api.v1.crud.crud_outbox import outbox
+from app.models.item import Item
+from app.models.menu import Menu
 from app.models.store import Store
-from app.utils.helpers import upload_photo_to_s3, create_qr_code_url
+
+
+def unique_store_key_of(store_id: int) -> Any:
+    """
+    `unique_store_key` of a store as a scalar subquery, to be added to a RETURNING clause.
+    """
+    return select(Store.unique_store_key).filter(Store.id == store_id).scalar_subquery().label("unique_store_key")
 
 
 class CRUDStore(CRUDBase[Store, schemas.StoreCreate, schemas.StoreUpdate]):
-    def create_with_owner(self, db: Session, *, obj_in: schemas.StoreCreate, owner_id: int) -> Store:
-        logo_url = upload_photo_to_s3(obj_in.encoded_photo, obj_in.extension)
+    image_field = "logo_url"
+    renditions_field = "logo_renditions"
+    read_schema = schemas.Store
+
+    async def create_with_owner(self, db: AsyncSession, *, obj_in: Union[schemas.StoreCreate, schemas.StoreForm],
+                                owner_id: int, logo_url: Optional[str] = None) -> Store:
+        """
+        Create the store, the qr code and the logo (unless `logo_url` is already uploaded) are queued
+        through the outbox with the store and fill in their urls once done.
+        """
         unique_store_key = str(uuid4())
-        qr_code_url = create_qr_code_url(unique_store_key)
 
         db_obj = Store(name=obj_in.name.capitalize(),
                        contact_no=obj_in.contact_no,
@@ -21,37 +40,79 @@ class CRUDStore(CRUDBase[Store, schemas.StoreCreate, schemas.StoreUpdate]):
                        is_active=obj_in.is_active,
                        owner_id=owner_id,
                        logo_url=logo_url,
-                       qr_code_url=qr_code_url,
                        unique_store_key=unique_store_key)
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        await db.flush()
+        outbox.add(db, task="generate_store_qr_code", args=[unique_store_key])
+        if logo_url is None:
+            encoded_photo = obj_in.encoded_photo
+            if isinstance(encoded_photo, bytes):
+                encoded_photo = encoded_photo.decode("ascii", errors="replace")
+            outbox.add(db, task="upload_store_logo", args=[unique_store_key, encoded_photo, obj_in.extension])
+        else:
+            self.schedule_renditions(db, db_obj.id)
+        await self.commit_catalog_change(db, unique_store_key)
+        await db.refresh(db_obj)
         return db_obj
 
-    def get_multi_by_owner(
-            self, db: Session, *, owner_id: int, skip: int = 0, limit: int = 100
+    async def store_key_of(self, db: AsyncSession, db_obj: Store) -> Optional[str]:
+        return db_obj.unique_store_key
+
+    async def get_public(self, db: AsyncSession, *, unique_store_key: str) -> Optional[Store]:
+        """
+        Live and active store, as shown to customers.
+        """
+        return await db.scalar(
+            select(self.model).filter(Store.unique_store_key == unique_store_key).filter(Store.is_active.is_(True))
+        )
+
+    async def get_catalog_version(self, db: AsyncSession, *, unique_store_key: str) -> Optional[Row]:
+        """
+        (catalog_version, catalog_updated_at) of a live active store.
+        """
+        return (await db.execute(
+            select(Store.catalog_version, Store.catalog_updated_at)
+            .filter(Store.unique_store_key == unique_store_key, Store.is_active.is_(True), *self.live())
+        )).first()
+
+    def row_to_dict(self, row: Row) -> Dict[str, Any]:
+        data = dict(row._mapping)
+        data["status"] = "ready" if data["logo_url"] and data["qr_code_url"] else "pending"
+        return data
+
+    def query_by_owner(self, *, owner_id: int) -> Select:
+        return select(self.model).filter(Store.owner_id == owner_id, *self.live())
+
+    async def archive_children(self, db: AsyncSession, id: int) -> None:
+        menu_ids = select(Menu.id).filter(Menu.store_id == id, Menu.deleted_at.is_(None))
+        await db.execute(update(Item).where(Item.menu_id.in_(menu_ids), Item.deleted_at.is_(None))
+                         .values(deleted_at=func.now()))
+        await db.execute(update(Menu).where(Menu.store_id == id, Menu.deleted_at.is_(None))
+                         .values(deleted_at=func.now()))
+
+    async def get_multi_by_owner(
+            self, db: AsyncSession, *, owner_id: int, skip: int = 0, limit: int = 100
     ) -> List[Store]:
-        return (
-            db.query(self.model)
-            .filter(Store.owner_id == owner_id)
+        result = await db.scalars(
+            self.query_by_owner(owner_id=owner_id)
             .offset(skip)
             .limit(limit)
-            .all()
         )
+        return result.all()
 
-    def update(
-            self, db: Session, *, db_obj: Store, obj_in: schemas.StoreUpdate
-    ) -> Store:
-        if isinstance(obj_in, dict):
-            update_data = obj_in
-        else:
-            update_data = obj_in.dict(exclude_unset=True)
-        if "encoded_photo" in update_data and update_data["encoded_photo"] and update_data["extension"]:
-            url = upload_photo_to_s3(update_data["encoded_photo"], update_data["extension"])
-            if "logo_url" in update_data:
-                del update_data["logo_url"]
-            update_data["logo_url"] = url
-        return super().update(db, db_obj=db_obj, obj_in=update_data)
+    def filter_owned(self, *, store_id: int, owner_id: int) -> List[Any]:
+        return [Store.id == store_id, Store.owner_id == owner_id]
+
+    async def update_owned(self, db: AsyncSession, *, store_id: int, owner_id: int,
+                           obj_in: Union[schemas.StoreUpdate, Dict[str, Any]]) -> Optional[Row]:
+        """
+        Update a store of `owner_id` in one statement, None when the owner has no such store.
+        """
+        return await self.update_returning(db, where=self.filter_owned(store_id=store_id, owner_id=owner_id),
+                                           obj_in=obj_in)
+
+    async def remove_owned(self, db: AsyncSession, *, store_id: int, owner_id: int) -> Optional[Row]:
+        return await self.remove_returning(db, where=self.filter_owned(store_id=store_id, owner_id=owner_id))
 
 
 store = CRUDStore(Store)
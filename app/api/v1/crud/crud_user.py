@@ -1,34 +1,51 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.v1 import schemas
 from app.api.v1.crud.base import CRUDBase
-from app.dependencies import get_password_hash
+from app.api.v1.crud.crud_outbox import outbox
 from app.models.user import User
+from app.utils.passwords import get_password_hash
 
 
 class CRUDUser(CRUDBase[User, schemas.UserCreate, schemas.UserUpdate]):
-    def create(self, db: Session, *, obj_in: schemas.UserCreate) -> User:
+    async def create(self, db: AsyncSession, *, obj_in: schemas.UserCreate) -> User:
         db_obj = User(
             email=obj_in.email,
-            hashed_password=get_password_hash(obj_in.password)
+            hashed_password=await get_password_hash(obj_in.password)
         )
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
         return db_obj
 
-    def update(
-            self, db: Session, *, db_obj: User, obj_in: schemas.UserUpdate
+    async def register(self, db: AsyncSession, *, obj_in: schemas.UserCreate) -> User:
+        """
+        Create the user and queue the registration email in the same transaction, the email is
+        handed to celery by the outbox relay so registering doesn't wait on the broker.
+        """
+        db_obj = User(
+            email=obj_in.email,
+            hashed_password=await get_password_hash(obj_in.password)
+        )
+        db.add(db_obj)
+        outbox.add(db, task="send_email", args=[f"User {obj_in.email} Registered Successfully", obj_in.email,
+                                                "Email registration Successfully."])
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
+    async def update(
+            self, db: AsyncSession, *, db_obj: User, obj_in: schemas.UserUpdate
     ) -> User:
         if isinstance(obj_in, dict):
             update_data = obj_in
         else:
             update_data = obj_in.dict(exclude_unset=True)
         if update_data["password"]:
-            hashed_password = get_password_hash(update_data["password"])
+            hashed_password = await get_password_hash(update_data["password"])
             del update_data["password"]
             update_data["hashed_password"] = hashed_password
-        return super().update(db, db_obj=db_obj, obj_in=update_data)
+        return await super().update(db, db_obj=db_obj, obj_in=update_data)
 
 
 user = CRUDUser(User)
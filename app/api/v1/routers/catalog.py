@@ -0,0 +1,45 @@
+import zipfile
+
+from fastapi import APIRouter, Depends, File, UploadFile, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1 import schemas, crud
+from app.dependencies import (get_db, get_current_user, get_user_exception, http_exception)
+from app.models import Store
+
+router = APIRouter(
+    tags=["Catalog"]
+)
+
+
+@router.post("/stores/{store_id}/catalog/import", status_code=status.HTTP_200_OK,
+             response_model=schemas.CatalogImportResult)
+async def import_catalog(store_id: int,
+                         catalog: UploadFile = File(..., description="Catalog as .csv or json lines"),
+                         images: UploadFile = File(None, description="Zip archive of the menu and item images"),
+                         current_user: dict = Depends(get_current_user),
+                         db: AsyncSession = Depends(get_db)):
+    """
+    Bulk import menus and items of a store, rows that fail are reported in errors
+    """
+    if current_user is None:
+        raise get_user_exception()
+
+    owner_id = current_user.get("id")
+
+    # checking if use has store with store_id provided.
+    store = await db.scalar(select(Store).filter(Store.owner_id == owner_id).filter(Store.id == store_id))
+    if store is None:
+        raise http_exception(status_code=404, detail="Store not found")
+    try:
+        archive = zipfile.ZipFile(images.file) if images else None
+    except zipfile.BadZipFile:
+        raise http_exception(status_code=400, detail="Images must be a zip archive")
+
+    try:
+        return await crud.catalog.import_catalog(db=db, store=store, owner_id=owner_id, catalog=catalog,
+                                                 images=archive)
+    except UnicodeDecodeError:
+        # raised by parse_catalog while reading the rows, before anything is written
+        raise http_exception(status_code=400, detail="Catalog must be UTF-8 encoded")
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, status
+
+from app.db.database import async_engine, engine, get_pool_stats
+from app.dependencies import verify_internal_token
+
+router = APIRouter(
+    prefix="/internal",
+    tags=["Internal"],
+    include_in_schema=False,
+    dependencies=[Depends(verify_internal_token)]
+)
+
+
+@router.get("/pool", status_code=status.HTTP_200_OK)
+async def get_pool_metrics():
+    """
+    Connection pool usage of the API (async) and sync engines of this worker
+    """
+    return {"async": get_pool_stats(async_engine), "sync": get_pool_stats(engine)}
@@ -1,13 +1,14 @@
-from typing import List
-
-from fastapi import APIRouter, status, Depends
-from fastapi_pagination import Page, paginate
+from fastapi import APIRouter, status, Depends, File, UploadFile
+from fastapi_pagination import Page, Params
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.v1 import schemas, crud
 from app.dependencies import (get_db, get_current_user, get_user_exception, http_exception)
 from app.models import Store, Menu, Item
+from app.utils.cache import cache, catalog_group, catalog_key
+from app.utils.helpers import rows_response, upload_file_to_s3
 
 router = APIRouter(
     tags=["Items"]
@@ -20,7 +21,7 @@ async def create_item(store_id: int,
                       menu_id: int,
                       item_in: schemas.ItemCreate,
                       current_user: dict = Depends(get_current_user),
-                      db: Session = Depends(get_db)):
+                      db: AsyncSession = Depends(get_db)):
     """
     Create new Item
     """
@@ -30,25 +31,56 @@ async def create_item(store_id: int,
     owner_id = current_user.get("id")
 
     # checking if user has store and menu with provided store_id and menu_id.
-    menu = db.query(Store).join(Menu).filter(Store.owner_id == owner_id).filter(Store.id == store_id).filter(
-        Menu.id == menu_id).first()
+    menu = await db.scalar(select(Store).join(Menu).filter(Store.owner_id == owner_id).filter(Store.id == store_id).filter(
+        Menu.id == menu_id))
 
     if menu is None:
         raise http_exception(status_code=404, detail="Menu not found")
     try:
-        menu = crud.item.create_with_menu_owner(db=db, obj_in=item_in, menu_id=menu_id, owner_id=owner_id)
+        menu = await crud.item.create_with_menu_owner(db=db, obj_in=item_in, menu_id=menu_id, owner_id=owner_id)
     except IntegrityError:
         raise http_exception(status_code=400, detail="Item already exists")
     return menu
 
 
+@router.post("/stores/{store_id}/menus/{menu_id}/items/upload", status_code=status.HTTP_201_CREATED,
+             response_model=schemas.Item)
+async def create_item_with_upload(store_id: int,
+                                  menu_id: int,
+                                  item_in: schemas.ItemForm = Depends(schemas.ItemForm.as_form),
+                                  photo: UploadFile = File(...),
+                                  current_user: dict = Depends(get_current_user),
+                                  db: AsyncSession = Depends(get_db)):
+    """
+    Create new Item, the image is uploaded as multipart file
+    """
+    if current_user is None:
+        raise get_user_exception()
+
+    owner_id = current_user.get("id")
+
+    # checking if user has store and menu with provided store_id and menu_id.
+    menu = await db.scalar(select(Store).join(Menu).filter(Store.owner_id == owner_id).filter(Store.id == store_id).filter(
+        Menu.id == menu_id))
+
+    if menu is None:
+        raise http_exception(status_code=404, detail="Menu not found")
+    image_url = await upload_file_to_s3(photo)
+    try:
+        item = await crud.item.create_with_menu_owner(db=db, obj_in=item_in, menu_id=menu_id, owner_id=owner_id,
+                                                      image_url=image_url)
+    except IntegrityError:
+        raise http_exception(status_code=400, detail="Item already exists")
+    return item
+
+
 @router.delete("/stores/{store_id}/menus/{menu_id}/items/{item_id}", status_code=status.HTTP_200_OK,
                response_model=schemas.Item)
 async def delete_item(store_id: int,
                       menu_id: int,
                       item_id: int,
                       current_user: dict = Depends(get_current_user),
-                      db: Session = Depends(get_db)):
+                      db: AsyncSession = Depends(get_db)):
     """
     Delete a Item
     """
@@ -57,15 +89,12 @@ async def delete_item(store_id: int,
 
     owner_id = current_user.get("id")
 
-    # checking if use has store with store_id and menu with menu id that is provided.
-    item = db.query(Item).join(Menu).filter(Item.id == item_id).filter(Item.owner_id == owner_id).filter(
-        Menu.store_id == store_id).filter(
-        Menu.id == menu_id).first()
+    # deleting only if user has store with store_id and menu with menu id that is provided.
+    item = await crud.item.remove_owned(db=db, item_id=item_id, menu_id=menu_id, store_id=store_id,
+                                        owner_id=owner_id)
 
     if item is None:
         raise http_exception(status_code=404, detail="Item not found")
-
-    item = crud.item.remove(db=db, id=item_id)
     return item
 
 
@@ -73,27 +102,53 @@ async def delete_item(store_id: int,
             response_model=schemas.Item)
 async def get_item_details(menu_id: int,
                            item_id: int,
-                           db: Session = Depends(get_db)):
+                           db: AsyncSession = Depends(get_db)):
     """
     Get a item of a store
     """
-    # checking if user has store and menu with provided store_id and menu_id.
-    item = db.query(Item).filter(Item.menu_id == menu_id).filter(Item.id == item_id).first()
+    item = await db.scalar(select(Item).filter(Item.menu_id == menu_id).filter(Item.id == item_id).filter(
+        Item.is_active.is_(True)))
+    if item is None:
+        raise http_exception(status_code=404, detail="Item not found")
     return item
 
 
 @router.get("/stores/{unique_store_key}/items", status_code=status.HTTP_200_OK, response_model=Page[schemas.Item])
-async def get_item_details(unique_store_key: str,
-                           db: Session = Depends(get_db)):
+async def get_all_item_of_store(unique_store_key: str,
+                                params: Params = Depends(),
+                                db: AsyncSession = Depends(get_db)):
     """
     Get all items of the store using unique_store_key
     """
-    store = db.query(Store).filter(Store.unique_store_key == unique_store_key).first()
+
+    async def load_items():
+        store = await crud.store.get_public(db, unique_store_key=unique_store_key)
+        if not store:
+            raise http_exception(status_code=404, detail=f"Store not found")
+
+        query = crud.item.query_public_by_store(store_id=store.id)
+        return await crud.item.paginate_rows(db, query, params)
+
+    return rows_response(
+        await cache.get_or_set(catalog_key(unique_store_key, "items", params.page, params.size), load_items,
+                               group=catalog_group(unique_store_key))
+    )
+
+
+@router.get("/stores/{unique_store_key}/items/keyset", status_code=status.HTTP_200_OK,
+            response_model=schemas.KeysetPage[schemas.Item])
+async def get_all_item_of_store_keyset(unique_store_key: str,
+                                       params: schemas.KeysetParams = Depends(),
+                                       db: AsyncSession = Depends(get_db)):
+    """
+    Get all items of the store using unique_store_key, paginated on id using cursor
+    """
+    store = await crud.store.get_public(db, unique_store_key=unique_store_key)
     if not store:
         raise http_exception(status_code=404, detail=f"Store not found")
 
-    items = db.query(Item).join(Menu).filter(Menu.store_id == store.id).all()
-    return paginate(items)
+    query = crud.item.query_public_by_store(store_id=store.id)
+    return rows_response(await crud.item.paginate_keyset_rows(db, query, cursor=params.cursor, size=params.size))
 
 
 @router.put("/stores/{store_id}/menus/{menu_id}/items/{item_id}", status_code=status.HTTP_200_OK,
@@ -103,7 +158,7 @@ async def update_item(store_id: int,
                       item_id: int,
                       item_in: schemas.ItemUpdate,
                       current_user: dict = Depends(get_current_user),
-                      db: Session = Depends(get_db)):
+                      db: AsyncSession = Depends(get_db)):
     """
     Update a Item
     """
@@ -112,33 +167,73 @@ async def update_item(store_id: int,
 
     owner_id = current_user.get("id")
 
+    # updating only if user has store with store_id and menu with menu id that is provided.
+    item = await crud.item.update_owned(db=db, item_id=item_id, menu_id=menu_id, store_id=store_id,
+                                        owner_id=owner_id, obj_in=item_in)
+
+    if item is None:
+        raise http_exception(status_code=404, detail="Item not found")
+    return item
+
+
+@router.put("/stores/{store_id}/menus/{menu_id}/items/{item_id}/image", status_code=status.HTTP_200_OK,
+            response_model=schemas.Item)
+async def upload_item_image(store_id: int,
+                            menu_id: int,
+                            item_id: int,
+                            photo: UploadFile = File(...),
+                            current_user: dict = Depends(get_current_user),
+                            db: AsyncSession = Depends(get_db)):
+    """
+    Replace the image of a Item, the image is uploaded as multipart file
+    """
+    if current_user is None:
+        raise get_user_exception()
+
+    owner_id = current_user.get("id")
+
     # checking if use has store with store_id and menu with menu id that is provided.
-    item = db.query(Item).join(Menu).filter(Item.id == item_id).filter(Item.owner_id == owner_id).filter(
+    item = await db.scalar(select(Item).join(Menu).filter(Item.id == item_id).filter(Item.owner_id == owner_id).filter(
         Menu.store_id == store_id).filter(
-        Menu.id == menu_id).first()
+        Menu.id == menu_id))
 
     if item is None:
         raise http_exception(status_code=404, detail="Item not found")
 
-    item = crud.item.get(db=db, id=item_id)
-    item = crud.item.update(db=db, db_obj=item, obj_in=item_in)
+    image_url = await upload_file_to_s3(photo)
+    item = await crud.item.update(db=db, db_obj=item, obj_in={"image_url": image_url})
     return item
 
 
 @router.get("/stores/{store_id}/menus/{menu_id}/items", status_code=status.HTTP_200_OK,
-            response_model=List[schemas.Item])
+            response_model=Page[schemas.Item])
 async def get_all_item_of_menu(store_id: int,
                                menu_id: int,
-                               skip: int = 0,
-                               limit: int = 100,
-                               db: Session = Depends(get_db)):
+                               params: Params = Depends(),
+                               db: AsyncSession = Depends(get_db)):
     """
     Get all item of a store using store_id
     """
-    store = db.query(Store).filter(Store.id == store_id).first()
+    store = await db.scalar(select(Store).filter(Store.id == store_id))
+    if store is None:
+        raise http_exception(status_code=404, detail="Store not found")
+
+    query = crud.item.query_by_store_menu(store_id=store.id, menu_id=menu_id)
+    return rows_response(await crud.item.paginate_rows(db, query, params))
+
+
+@router.get("/stores/{store_id}/menus/{menu_id}/items/keyset", status_code=status.HTTP_200_OK,
+            response_model=schemas.KeysetPage[schemas.Item])
+async def get_all_item_of_menu_keyset(store_id: int,
+                                      menu_id: int,
+                                      params: schemas.KeysetParams = Depends(),
+                                      db: AsyncSession = Depends(get_db)):
+    """
+    Get all item of a store using store_id, paginated on id using cursor
+    """
+    store = await db.scalar(select(Store).filter(Store.id == store_id))
     if store is None:
         raise http_exception(status_code=404, detail="Store not found")
 
-    items = db.query(Item).join(Menu).filter(Menu.store_id == store.id).filter(Item.menu_id == menu_id).offset(
-        skip).limit(limit).all()
-    return items
+    query = crud.item.query_by_store_menu(store_id=store.id, menu_id=menu_id)
+    return rows_response(await crud.item.paginate_keyset_rows(db, query, cursor=params.cursor, size=params.size))
@@ -1,12 +1,13 @@
-from typing import List
-
-from fastapi import APIRouter, status, Depends
+from fastapi import APIRouter, status, Depends, File, UploadFile
+from fastapi_pagination import Page, Params
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.v1 import schemas, crud
 from app.dependencies import (get_db, get_current_user, get_user_exception, http_exception)
 from app.models import Store, Menu
+from app.utils.helpers import rows_response, upload_file_to_s3
 
 router = APIRouter(
     tags=["Menus"]
@@ -17,7 +18,7 @@ router = APIRouter(
 async def create_menu(store_id: int,
                       menu_in: schemas.MenuCreate,
                       current_user: dict = Depends(get_current_user),
-                      db: Session = Depends(get_db)):
+                      db: AsyncSession = Depends(get_db)):
     """
     Create new Menu
     """
@@ -27,11 +28,37 @@ async def create_menu(store_id: int,
     owner_id = current_user.get("id")
 
     # checking if use has store with store_id provided.
-    menu = db.query(Store).filter(Store.owner_id == owner_id).filter(Store.id == store_id).first()
+    menu = await db.scalar(select(Store).filter(Store.owner_id == owner_id).filter(Store.id == store_id))
+    if menu is None:
+        raise http_exception(status_code=404, detail="Menu not found")
+    try:
+        menu = await crud.menu.create_with_shop(db=db, obj_in=menu_in, store_id=store_id)
+    except IntegrityError:
+        raise http_exception(status_code=400, detail="Menu already exists")
+    return menu
+
+
+@router.post("/stores/{store_id}/menus/upload", status_code=status.HTTP_201_CREATED, response_model=schemas.Menu)
+async def create_menu_with_upload(store_id: int,
+                                  menu_in: schemas.MenuForm = Depends(schemas.MenuForm.as_form),
+                                  photo: UploadFile = File(...),
+                                  current_user: dict = Depends(get_current_user),
+                                  db: AsyncSession = Depends(get_db)):
+    """
+    Create new Menu, the image is uploaded as multipart file
+    """
+    if current_user is None:
+        raise get_user_exception()
+
+    owner_id = current_user.get("id")
+
+    # checking if use has store with store_id provided.
+    menu = await db.scalar(select(Store).filter(Store.owner_id == owner_id).filter(Store.id == store_id))
     if menu is None:
         raise http_exception(status_code=404, detail="Menu not found")
+    image_url = await upload_file_to_s3(photo)
     try:
-        menu = crud.menu.create_with_shop(db=db, obj_in=menu_in, store_id=store_id)
+        menu = await crud.menu.create_with_shop(db=db, obj_in=menu_in, store_id=store_id, image_url=image_url)
     except IntegrityError:
         raise http_exception(status_code=400, detail="Menu already exists")
     return menu
@@ -41,7 +68,7 @@ async def create_menu(store_id: int,
 async def delete_menu(store_id: int,
                       menu_id: int,
                       current_user: dict = Depends(get_current_user),
-                      db: Session = Depends(get_db)):
+                      db: AsyncSession = Depends(get_db)):
     """
     Delete a Menu using menu id
     """
@@ -50,23 +77,19 @@ async def delete_menu(store_id: int,
 
     owner_id = current_user.get("id")
 
-    # checking if use has store with store_id provided.
-    store = db.query(Store).join(Menu).filter(Store.owner_id == owner_id).filter(Store.id == store_id).filter(
-        Menu.id == menu_id).first()
+    # deleting only if user has store with store_id provided.
+    menu = await crud.menu.remove_owned(db=db, menu_id=menu_id, store_id=store_id, owner_id=owner_id)
 
-    if store is None:
+    if menu is None:
         raise http_exception(status_code=404, detail="Menu not found")
-
-    menu = crud.menu.remove(db=db, id=menu_id)
     return menu
 
 
-@router.get("/stores/{store_id}/all-menus", status_code=status.HTTP_200_OK, response_model=List[schemas.Menu])
+@router.get("/stores/{store_id}/all-menus", status_code=status.HTTP_200_OK, response_model=Page[schemas.Menu])
 async def get_all_menu(store_id: int,
-                       skip: int = 0,
-                       limit: int = 100,
+                       params: Params = Depends(),
                        current_user: dict = Depends(get_current_user),
-                       db: Session = Depends(get_db)):
+                       db: AsyncSession = Depends(get_db)):
     """
     Get all Menu of a store
     """
@@ -75,19 +98,41 @@ async def get_all_menu(store_id: int,
 
     owner_id = current_user.get("id")
     # checking if use has store with store_id provided.
-    store = db.query(Store).filter(Store.owner_id == owner_id).filter(Store.id == store_id).first()
+    store = await db.scalar(select(Store).filter(Store.owner_id == owner_id).filter(Store.id == store_id))
     if store is None:
         raise http_exception(status_code=404, detail="store not found")
 
-    menu = crud.menu.get_multi_by_shop(db=db, store_id=store_id, skip=skip, limit=limit)
-    return menu
+    query = crud.menu.query_by_shop(store_id=store_id)
+    return rows_response(await crud.menu.paginate_rows(db, query, params))
+
+
+@router.get("/stores/{store_id}/all-menus/keyset", status_code=status.HTTP_200_OK,
+            response_model=schemas.KeysetPage[schemas.Menu])
+async def get_all_menu_keyset(store_id: int,
+                              params: schemas.KeysetParams = Depends(),
+                              current_user: dict = Depends(get_current_user),
+                              db: AsyncSession = Depends(get_db)):
+    """
+    Get all Menu of a store, paginated on id using cursor
+    """
+    if current_user is None:
+        raise get_user_exception()
+
+    owner_id = current_user.get("id")
+    # checking if use has store with store_id provided.
+    store = await db.scalar(select(Store).filter(Store.owner_id == owner_id).filter(Store.id == store_id))
+    if store is None:
+        raise http_exception(status_code=404, detail="store not found")
+
+    query = crud.menu.query_by_shop(store_id=store_id)
+    return rows_response(await crud.menu.paginate_keyset_rows(db, query, cursor=params.cursor, size=params.size))
 
 
 @router.get("/stores/{store_id}/menus/{menu_id}", status_code=status.HTTP_200_OK, response_model=schemas.Menu)
 async def get_menu(store_id: int,
                    menu_id: int,
                    current_user: dict = Depends(get_current_user),
-                   db: Session = Depends(get_db)):
+                   db: AsyncSession = Depends(get_db)):
     """
     Get Menu of the store using menu_id
     """
@@ -97,11 +142,11 @@ async def get_menu(store_id: int,
     owner_id = current_user.get("id")
 
     # checking if user has store with store_id provided.
-    store = db.query(Store).filter(Store.owner_id == owner_id).filter(Store.id == store_id).first()
+    store = await db.scalar(select(Store).filter(Store.owner_id == owner_id).filter(Store.id == store_id))
     if store is None:
         raise http_exception(status_code=404, detail="Store not found")
 
-    menu = db.query(Menu).filter(Menu.id == menu_id).first()
+    menu = await db.scalar(select(Menu).filter(Menu.id == menu_id))
     return menu
 
 
@@ -110,7 +155,7 @@ async def update_menu(store_id: int,
                       menu_id: int,
                       menu_in: schemas.MenuUpdate,
                       current_user: dict = Depends(get_current_user),
-                      db: Session = Depends(get_db)):
+                      db: AsyncSession = Depends(get_db)):
     """
     Update a Menu using menu id
     """
@@ -119,13 +164,36 @@ async def update_menu(store_id: int,
 
     owner_id = current_user.get("id")
 
+    # updating only if user has menu with store_id and menu_id provided.
+    menu = await crud.menu.update_owned(db=db, menu_id=menu_id, store_id=store_id, owner_id=owner_id,
+                                        obj_in=menu_in)
+
+    if menu is None:
+        raise http_exception(status_code=404, detail="Menu not found")
+    return menu
+
+
+@router.put("/stores/{store_id}/menus/{menu_id}/image", status_code=status.HTTP_200_OK, response_model=schemas.Menu)
+async def upload_menu_image(store_id: int,
+                            menu_id: int,
+                            photo: UploadFile = File(...),
+                            current_user: dict = Depends(get_current_user),
+                            db: AsyncSession = Depends(get_db)):
+    """
+    Replace the image of a Menu, the image is uploaded as multipart file
+    """
+    if current_user is None:
+        raise get_user_exception()
+
+    owner_id = current_user.get("id")
+
     # checking if use has menu with store_id and menu_id provided.
-    menu = db.query(Store).join(Menu).filter(Store.owner_id == owner_id).filter(Store.id == store_id).filter(
-        Menu.id == menu_id).first()
+    menu = await db.scalar(select(Menu).join(Store).filter(Store.owner_id == owner_id).filter(Store.id == store_id).filter(
+        Menu.id == menu_id))
 
     if menu is None:
         raise http_exception(status_code=404, detail="Menu not found")
 
-    menu = crud.menu.get(db=db, id=menu_id)
-    menu = crud.menu.update(db=db, db_obj=menu, obj_in=menu_in)
+    image_url = await upload_file_to_s3(photo)
+    menu = await crud.menu.update(db=db, db_obj=menu, obj_in={"image_url": image_url})
     return menu
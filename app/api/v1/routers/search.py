@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1 import schemas, crud
+from app.dependencies import get_db, http_exception
+
+router = APIRouter(
+    tags=["Search"]
+)
+
+
+@router.get("/stores/{unique_store_key}/search", status_code=status.HTTP_200_OK,
+            response_model=schemas.SearchResults)
+async def search_store(unique_store_key: str,
+                       q: str = Query(..., min_length=1, max_length=100),
+                       limit: int = Query(20, ge=1, le=100),
+                       db: AsyncSession = Depends(get_db)):
+    """
+    Search the items of a store by title, description and menu title, best matches first
+    """
+    store = await crud.store.get_public(db, unique_store_key=unique_store_key)
+    if store is None:
+        raise http_exception(status_code=404, detail="Store doesn't exists.")
+
+    results = await crud.search.search(db=db, store=store, q=q, limit=limit)
+    return schemas.SearchResults(query=q, results=results)
@@ -1,14 +1,16 @@
-from typing import List
-
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, File, Request, Response, UploadFile, status
+from fastapi.encoders import jsonable_encoder
+from fastapi_pagination import Page, Params
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.v1 import schemas, crud
 from app.dependencies import (get_db, get_current_user,
                               get_user_exception, http_exception)
-from app.models.menu import Menu
 from app.models.store import Store
+from app.utils.cache import cache, catalog_group, catalog_key
+from app.utils.helpers import etag_matches, rows_response, upload_file_to_s3
 
 router = APIRouter(
     tags=["Stores"]
@@ -18,7 +20,7 @@ router = APIRouter(
 @router.post("/stores", status_code=status.HTTP_201_CREATED, response_model=schemas.Store)
 async def create_store(store_in: schemas.StoreCreate,
                        current_user: dict = Depends(get_current_user),
-                       db: Session = Depends(get_db)):
+                       db: AsyncSession = Depends(get_db)):
     """
     Create new store
     """
@@ -26,17 +28,35 @@ async def create_store(store_in: schemas.StoreCreate,
         raise get_user_exception()
     owner_id = current_user.get("id")
     try:
-        store = crud.store.create_with_owner(db=db, obj_in=store_in, owner_id=owner_id)
+        store = await crud.store.create_with_owner(db=db, obj_in=store_in, owner_id=owner_id)
+    except IntegrityError:
+        raise http_exception(status_code=400, detail=f"Store with name {store_in.name} already exists.")
+    return store
+
+
+@router.post("/stores/upload", status_code=status.HTTP_201_CREATED, response_model=schemas.Store)
+async def create_store_with_upload(store_in: schemas.StoreForm = Depends(schemas.StoreForm.as_form),
+                                   photo: UploadFile = File(...),
+                                   current_user: dict = Depends(get_current_user),
+                                   db: AsyncSession = Depends(get_db)):
+    """
+    Create new store, the logo is uploaded as multipart file
+    """
+    if current_user is None:
+        raise get_user_exception()
+    owner_id = current_user.get("id")
+    logo_url = await upload_file_to_s3(photo)
+    try:
+        store = await crud.store.create_with_owner(db=db, obj_in=store_in, owner_id=owner_id, logo_url=logo_url)
     except IntegrityError:
-        raise http_exception(status_code=400, detail=f"Store with name {store.name} already exists.")
+        raise http_exception(status_code=400, detail=f"Store with name {store_in.name} already exists.")
     return store
 
 
-@router.get("/stores", status_code=status.HTTP_200_OK, response_model=List[schemas.Store])
-async def get_all_store(skip: int = 0,
-                        limit: int = 100,
+@router.get("/stores", status_code=status.HTTP_200_OK, response_model=Page[schemas.Store])
+async def get_all_store(params: Params = Depends(),
                         current_user: dict = Depends(get_current_user),
-                        db: Session = Depends(get_db)):
+                        db: AsyncSession = Depends(get_db)):
     """
     Get all stores of a user
     """
@@ -44,14 +64,29 @@ async def get_all_store(skip: int = 0,
         raise get_user_exception()
 
     owner_id = current_user.get("id")
-    store = crud.store.get_multi_by_owner(db=db, owner_id=owner_id, skip=skip, limit=limit)
-    return store
+    query = crud.store.query_by_owner(owner_id=owner_id)
+    return rows_response(await crud.store.paginate_rows(db, query, params))
+
+
+@router.get("/stores/keyset", status_code=status.HTTP_200_OK, response_model=schemas.KeysetPage[schemas.Store])
+async def get_all_store_keyset(params: schemas.KeysetParams = Depends(),
+                               current_user: dict = Depends(get_current_user),
+                               db: AsyncSession = Depends(get_db)):
+    """
+    Get all stores of a user, paginated on id using cursor
+    """
+    if current_user is None:
+        raise get_user_exception()
+
+    owner_id = current_user.get("id")
+    query = crud.store.query_by_owner(owner_id=owner_id)
+    return rows_response(await crud.store.paginate_keyset_rows(db, query, cursor=params.cursor, size=params.size))
 
 
 @router.get("/stores/{store_id}", response_model=schemas.Store)
 async def get_store(store_id: int,
                     current_user: dict = Depends(get_current_user),
-                    db: Session = Depends(get_db)):
+                    db: AsyncSession = Depends(get_db)):
     """
     Get store  details of a store using store id.
     """
@@ -59,7 +94,7 @@ async def get_store(store_id: int,
         raise get_user_exception()
 
     owner_id = current_user.get("id")
-    store = db.query(Store).filter(Store.owner_id == owner_id).filter(Store.id == store_id).first()
+    store = await db.scalar(select(Store).filter(Store.owner_id == owner_id).filter(Store.id == store_id))
     if store is None:
         raise http_exception(status_code=404, detail="Store doesn't exists.")
     return store
@@ -67,36 +102,86 @@ async def get_store(store_id: int,
 
 @router.get("/stores/", response_model=schemas.Store)
 async def get_store_using_unique_key(unique_store_key: str,
-                                     db: Session = Depends(get_db)):
+                                     db: AsyncSession = Depends(get_db)):
     """
     Get store details using store id.
     """
-    store = db.query(Store).filter(Store.unique_store_key == unique_store_key).first()
+
+    key = catalog_key(unique_store_key, "store")
+    store = await cache.get(key)
     if store is None:
-        raise http_exception(status_code=404, detail="Store doesn't exists.")
+        store = await crud.store.get_public(db, unique_store_key=unique_store_key)
+        if store is None:
+            raise http_exception(status_code=404, detail="Store doesn't exists.")
+        store = jsonable_encoder(schemas.Store.from_orm(store))
+        # pending stores are filled in by the background jobs, which can't reach the cache
+        if store["status"] == "ready":
+            await cache.set(key, store, group=catalog_group(unique_store_key))
     return store
 
 
-@router.get("/stores/{unique_store_key}/menus", response_model=List[schemas.Menu])
+@router.get("/stores/{unique_store_key}/menus", response_model=Page[schemas.Menu])
 async def get_all_menu_of_store(unique_store_key: str,
-                                skip: int = 0,
-                                limit: int = 100,
-                                db: Session = Depends(get_db)):
+                                params: Params = Depends(),
+                                db: AsyncSession = Depends(get_db)):
     """
     Get all menu's of a store using unique_store_key
     """
-    store = db.query(Store).filter(Store.unique_store_key == unique_store_key).first()
+
+    async def load_menus():
+        store = await crud.store.get_public(db, unique_store_key=unique_store_key)
+        if store is None:
+            raise http_exception(status_code=404, detail="Store doesn't exists.")
+        query = crud.menu.query_public_by_shop(store_id=store.id)
+        return await crud.menu.paginate_rows(db, query, params)
+
+    return rows_response(
+        await cache.get_or_set(catalog_key(unique_store_key, "menus", params.page, params.size), load_menus,
+                               group=catalog_group(unique_store_key))
+    )
+
+
+@router.get("/stores/{unique_store_key}/menus/keyset", response_model=schemas.KeysetPage[schemas.Menu])
+async def get_all_menu_of_store_keyset(unique_store_key: str,
+                                       params: schemas.KeysetParams = Depends(),
+                                       db: AsyncSession = Depends(get_db)):
+    """
+    Get all menu's of a store using unique_store_key, paginated on id using cursor
+    """
+    store = await crud.store.get_public(db, unique_store_key=unique_store_key)
     if store is None:
         raise http_exception(status_code=404, detail="Store doesn't exists.")
-    menus = db.query(Menu).filter(Menu.store_id == store.id).offset(skip).limit(limit).all()
-    return menus
+    query = crud.menu.query_public_by_shop(store_id=store.id)
+    return rows_response(await crud.menu.paginate_keyset_rows(db, query, cursor=params.cursor, size=params.size))
+
+
+@router.get("/stores/{unique_store_key}/catalog", response_model=schemas.StoreCatalog,
+            responses={304: {"description": "Catalog not modified since the If-None-Match ETag"}})
+async def get_store_catalog(unique_store_key: str,
+                            request: Request,
+                            db: AsyncSession = Depends(get_db)):
+    """
+    Get the store with all its menus and their items using unique_store_key, served from its snapshot
+    """
+    snapshot = await crud.snapshot.get(db, unique_store_key=unique_store_key)
+    if snapshot is None:
+        # stores not written to since the snapshots were introduced
+        snapshot = await crud.snapshot.refresh(db, unique_store_key=unique_store_key, bump_version=False)
+        if snapshot is None:
+            raise http_exception(status_code=404, detail="Store doesn't exists.")
+    body, etag = snapshot
+
+    headers = {"ETag": etag}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
 
 
 @router.patch("/stores/{store_id}", status_code=status.HTTP_200_OK, response_model=schemas.Store)
 async def update_store(store_id: int,
                        store_in: schemas.StoreUpdate,
                        current_user: dict = Depends(get_current_user),
-                       db: Session = Depends(get_db)):
+                       db: AsyncSession = Depends(get_db)):
     """
     Update a store using store id
     """
@@ -104,19 +189,39 @@ async def update_store(store_id: int,
         raise get_user_exception()
 
     owner_id = current_user.get("id")
-    store = db.query(Store).filter(Store.owner_id == owner_id).filter(Store.id == store_id).first()
+    store = await crud.store.update_owned(db=db, store_id=store_id, owner_id=owner_id, obj_in=store_in)
 
     if store is None:
         raise http_exception(status_code=404, detail="Store doesn't exists.")
+    return store
+
 
-    store = crud.store.update(db=db, db_obj=store, obj_in=store_in)
+@router.put("/stores/{store_id}/logo", status_code=status.HTTP_200_OK, response_model=schemas.Store)
+async def upload_store_logo(store_id: int,
+                            photo: UploadFile = File(...),
+                            current_user: dict = Depends(get_current_user),
+                            db: AsyncSession = Depends(get_db)):
+    """
+    Replace the logo of a store, the logo is uploaded as multipart file
+    """
+    if current_user is None:
+        raise get_user_exception()
+
+    owner_id = current_user.get("id")
+    store = await db.scalar(select(Store).filter(Store.owner_id == owner_id).filter(Store.id == store_id))
+
+    if store is None:
+        raise http_exception(status_code=404, detail="Store doesn't exists.")
+
+    logo_url = await upload_file_to_s3(photo)
+    store = await crud.store.update(db=db, db_obj=store, obj_in={"logo_url": logo_url})
     return store
 
 
 @router.delete("/stores/{store_id}", status_code=status.HTTP_200_OK, response_model=schemas.Store)
 async def delete_store(store_id: int,
                        current_user: dict = Depends(get_current_user),
-                       db: Session = Depends(get_db)):
+                       db: AsyncSession = Depends(get_db)):
     """
     Delete a store using store id
     """
@@ -124,11 +229,8 @@ async def delete_store(store_id: int,
         raise get_user_exception()
 
     owner_id = current_user.get("id")
-    store = db.query(Store).filter(Store.owner_id == owner_id).filter(Store.id == store_id) \
-        .first()
+    store = await crud.store.remove_owned(db=db, store_id=store_id, owner_id=owner_id)
 
     if store is None:
-        raise http_exception(f"Store {store.name} doesn't exists.")
-
-    store = crud.store.remove(db=db, id=store.id)
+        raise http_exception(status_code=404, detail="Store doesn't exists.")
     return store
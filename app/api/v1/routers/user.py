@@ -3,11 +3,11 @@ from typing import Any
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import EmailStr
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.v1 import schemas, crud
-from app.celery_worker import send_email
 from app.dependencies import (get_db, generate_access_token,
                               verify_password, get_current_user,
                               http_exception, get_user_exception)
@@ -18,40 +18,39 @@ router = APIRouter(
 )
 
 
-def authenticate_user(email: EmailStr, password: str, db):
+async def authenticate_user(email: EmailStr, password: str, db):
     """
     Authenticate the user
     """
-    user_record = db.query(User).filter(User.email == email).first()
+    user_record = await db.scalar(select(User).filter(User.email == email))
     if not user_record:
         return False
-    if not verify_password(password, user_record.hashed_password):
+    if not await verify_password(password, user_record.hashed_password):
         return False
     return user_record
 
 
 @router.get("/user", status_code=status.HTTP_200_OK, response_model=schemas.UserInDB)
 async def get_user_details(current_user: dict = Depends(get_current_user),
-                           db: Session = Depends(get_db)) -> Any:
+                           db: AsyncSession = Depends(get_db)) -> Any:
     """
     Provide the user info.
     """
     if current_user is None:
         raise get_user_exception()
     user_id = current_user.get("id")
-    user_data = crud.user.get(db=db, id=user_id)
+    user_data = await crud.user.get(db=db, id=user_id)
     return user_data
 
 
 @router.post("/users", status_code=status.HTTP_201_CREATED, response_model=schemas.User)
 async def register(user_in: schemas.UserCreate,
-                   db: Session = Depends(get_db)):
+                   db: AsyncSession = Depends(get_db)):
     """
     New user registration.
     """
     try:
-        user = crud.user.create(db=db, obj_in=user_in)
-        send_email.delay(f"User {user.email} Registered Successfully", user.email, "Email registration Successfully.")
+        user = await crud.user.register(db=db, obj_in=user_in)
         token = generate_access_token(user)
     except IntegrityError:
         raise http_exception(status_code=400, detail="User with this email already exists")
@@ -63,11 +62,11 @@ async def register(user_in: schemas.UserCreate,
 
 @router.post("/users/login", status_code=status.HTTP_200_OK, response_model=schemas.User)
 async def login(form_data: OAuth2PasswordRequestForm = Depends(),
-                db: Session = Depends(get_db)):
+                db: AsyncSession = Depends(get_db)):
     """
     User login
     """
-    user = authenticate_user(form_data.username, form_data.password, db)
+    user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="Incorrect username or password",
@@ -81,16 +80,16 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(),
 
 @router.patch("/users", status_code=status.HTTP_200_OK, response_model=schemas.User)
 async def reset_password(user_in: schemas.UserUpdate,
-                         db: Session = Depends(get_db)):
+                         db: AsyncSession = Depends(get_db)):
     """
     Reset Password
     """
-    user = db.query(User).filter(User.email == user_in.email).first()
+    user = await db.scalar(select(User).filter(User.email == user_in.email))
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="User with given email not found")
 
-    user = crud.user.update(db=db, db_obj=user, obj_in=user_in)
+    user = await crud.user.update(db=db, db_obj=user, obj_in=user_in)
     token = generate_access_token(user)
     user.access_token = token
     user.token_type = 'Bearer'
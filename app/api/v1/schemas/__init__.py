@@ -1,4 +1,7 @@
-from .item import ItemCreate, ItemUpdate, Item, ItemMultiple, ItemInDB
-from .menu import MenuCreate, MenuUpdate, Menu, MenuMultiple, MenuInDB
-from .store import StoreCreate, StoreUpdate, Store, StoreMultiple, StoreInDB
+from .item import ItemCreate, ItemForm, ItemUpdate, Item, ItemMultiple, ItemInDB
+from .menu import MenuCreate, MenuForm, MenuUpdate, Menu, MenuMultiple, MenuInDB
+from .store import StoreCreate, StoreForm, StoreUpdate, Store, StoreMultiple, StoreInDB
 from .user import UserCreate, UserUpdate, User, UserInDB
+from .page import KeysetParams, KeysetPage
+from .catalog import CatalogImportRow, CatalogImportError, CatalogImportResult, MenuCatalog, StoreCatalog
+from .search import SearchResult, SearchResults
@@ -0,0 +1,39 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from .item import Item
+from .menu import Menu
+from .store import Store
+
+
+# One line of an imported catalog, images are file names inside the image archive
+class CatalogImportRow(BaseModel):
+    menu: str
+    menu_image: Optional[str]
+    title: str
+    description: str = ""
+    price: float
+    is_active: bool = True
+    image: str
+
+
+class CatalogImportError(BaseModel):
+    row: int
+    detail: str
+
+
+# Properties to return to client
+class CatalogImportResult(BaseModel):
+    menus_created: int
+    items_created: int
+    errors: List[CatalogImportError]
+
+
+# Full catalog of a store returned to client
+class MenuCatalog(Menu):
+    items: List[Item] = []
+
+
+class StoreCatalog(Store):
+    menus: List[MenuCatalog] = []
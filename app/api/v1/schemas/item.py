@@ -1,5 +1,6 @@
-from typing import Optional, List, Union
+from typing import Dict, Optional, List, Union
 
+from fastapi import Form
 from pydantic import BaseModel, HttpUrl
 
 
@@ -16,6 +17,17 @@ class ItemCreate(ItemBase):
     extension: str = "png"
 
 
+# Properties received as multipart form fields, the image is sent as a file
+class ItemForm(ItemBase):
+    @classmethod
+    def as_form(cls,
+                title: str = Form(...),
+                description: str = Form(...),
+                price: float = Form(...),
+                is_active: bool = Form(True)) -> "ItemForm":
+        return cls(title=title, description=description, price=price, is_active=is_active)
+
+
 class ItemUpdate(BaseModel):
     title: Optional[str]
     description: Optional[str]
@@ -31,6 +43,8 @@ class ItemInDBBase(ItemBase):
     menu_id: int
     owner_id: int
     image_url: HttpUrl
+    # {rendition: {format: url}} for the thumbnail, medium and full sizes, None until processed
+    image_renditions: Optional[Dict[str, Dict[str, HttpUrl]]] = None
 
     class Config:
         orm_mode = True
@@ -1,5 +1,6 @@
-from typing import Optional, List, Union
+from typing import Dict, Optional, List, Union
 
+from fastapi import Form
 from pydantic import BaseModel, HttpUrl
 
 
@@ -14,6 +15,17 @@ class MenuCreate(MenuBase):
     extension: str = "png"
 
 
+# Properties received as multipart form fields, the image is sent as a file
+class MenuForm(MenuBase):
+    is_active: Optional[bool] = True
+
+    @classmethod
+    def as_form(cls,
+                title: str = Form(...),
+                is_active: bool = Form(True)) -> "MenuForm":
+        return cls(title=title, is_active=is_active)
+
+
 class MenuUpdate(BaseModel):
     title: Optional[str]
     encoded_photo: Optional[Union[str, bytes]]
@@ -26,6 +38,8 @@ class MenuInDBBase(MenuBase):
     is_active: bool = True
     store_id: int
     image_url: HttpUrl
+    # {rendition: {format: url}} for the thumbnail, medium and full sizes, None until processed
+    image_renditions: Optional[Dict[str, Dict[str, HttpUrl]]] = None
 
     class Config:
         orm_mode = True
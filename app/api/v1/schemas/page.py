@@ -0,0 +1,20 @@
+from typing import Generic, List, Optional, TypeVar
+
+from fastapi import Query
+from pydantic import BaseModel
+from pydantic.generics import GenericModel
+
+T = TypeVar("T")
+
+
+# Query params of a keyset (cursor) paginated listing
+class KeysetParams(BaseModel):
+    cursor: Optional[int] = Query(None, description="Id of the last row of the previous page")
+    size: int = Query(50, ge=1, le=100, description="Page size")
+
+
+# Keyset page returned to client, pass next_cursor back as cursor to get the next page
+class KeysetPage(GenericModel, Generic[T]):
+    items: List[T]
+    size: int
+    next_cursor: Optional[int]
@@ -0,0 +1,16 @@
+from typing import List
+
+from pydantic import BaseModel
+
+from .item import Item
+
+
+# An item matching a search, with the title of its menu
+class SearchResult(Item):
+    menu_title: str
+    rank: float
+
+
+class SearchResults(BaseModel):
+    query: str
+    results: List[SearchResult]
@@ -1,7 +1,8 @@
-from typing import Optional, List, Union
+from typing import Dict, Optional, List, Union
 from uuid import UUID
 
-from pydantic import BaseModel, HttpUrl
+from fastapi import Form
+from pydantic import BaseModel, HttpUrl, validator
 
 
 # Shared properties
@@ -17,6 +18,19 @@ class StoreCreate(StoreBase):
     extension: str = "png"
 
 
+# Properties received as multipart form fields, the logo is sent as a file
+class StoreForm(StoreBase):
+    is_active: Optional[bool] = True
+
+    @classmethod
+    def as_form(cls,
+                name: str = Form(...),
+                contact_no: str = Form(...),
+                address: str = Form(...),
+                is_active: bool = Form(True)) -> "StoreForm":
+        return cls(name=name, contact_no=contact_no, address=address, is_active=is_active)
+
+
 class StoreUpdate(BaseModel):
     name: Optional[str]
     contact_no: Optional[str]
@@ -30,9 +44,17 @@ class StoreInDBBase(StoreBase):
     id: Optional[int] = None
     is_active: bool = True
     owner_id: int
-    logo_url: HttpUrl
-    qr_code_url: HttpUrl
+    logo_url: Optional[HttpUrl]
+    # {rendition: {format: url}} for the thumbnail, medium and full sizes, None until processed
+    logo_renditions: Optional[Dict[str, Dict[str, HttpUrl]]] = None
+    qr_code_url: Optional[HttpUrl]
     unique_store_key: UUID
+    status: str = "ready"
+
+    # derived from the urls, so rows returned by UPDATE ... RETURNING get it too
+    @validator("status", always=True)
+    def set_status(cls, v, values):
+        return "ready" if values.get("logo_url") and values.get("qr_code_url") else "pending"
 
     class Config:
         orm_mode = True
@@ -1,34 +1,380 @@
+import logging
+import smtplib
+import time
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+from typing import List, Optional, Set, Tuple
+
 from celery import Celery
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
-import asyncio
+from celery.signals import task_postrun, task_prerun, worker_init, worker_process_shutdown
+from fastapi import HTTPException
+from prometheus_client import start_http_server
+from sqlalchemy import delete, func, select, update
 
 from .config import settings
+from .db import query_counter  # noqa: F401, times the statements of the tasks
+from .db.database import SessionLocal
+from .models.item import Item
+from .models.menu import Menu
+from .models.outbox import OutboxMessage
+from .models.store import Store
+from .utils.images import (FORMATS, RENDITIONS, make_renditions, rendition_key, rendition_source_key,
+                           rendition_urls)
+from .utils.s3_util import content_type_of, s3
+from .utils.snapshot import refresh_snapshot, store_key_query
+from .utils.helpers import create_qr_code_url, decode_photo_bytes
+from .utils.mailer import build_message, is_transient, mailer
+from .utils.metrics import CELERY_TASK_SECONDS, get_registry
+
+logger = logging.getLogger(__name__)
 
 celery = Celery(__name__)
 celery.conf.broker_url = settings.CELERY_BROKER_URL
 celery.conf.result_backend = settings.CELERY_RESULT_BACKEND
+celery.conf.beat_schedule = {
+    "collect_orphan_images": {
+        "task": "collect_orphan_images",
+        "schedule": timedelta(hours=settings.IMAGE_GC_INTERVAL_HOURS),
+    },
+    "purge_deleted": {
+        "task": "purge_deleted",
+        "schedule": timedelta(days=1),
+    },
+    "relay_outbox": {
+        "task": "relay_outbox",
+        "schedule": settings.OUTBOX_RELAY_INTERVAL,
+        # a run still draining makes the next ones redundant
+        "options": {"expires": settings.OUTBOX_RELAY_INTERVAL},
+    },
+}
+
+# task start times by task id, tasks of a process run one at a time
+task_started = {}
+
+
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    if settings.CELERY_METRICS_PORT:
+        start_http_server(settings.CELERY_METRICS_PORT, registry=get_registry())
+
+
+@task_prerun.connect
+def record_task_start(task_id=None, **kwargs):
+    task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def record_task_duration(task_id=None, task=None, state=None, **kwargs):
+    start = task_started.pop(task_id, None)
+    if start is not None:
+        CELERY_TASK_SECONDS.labels(task.name, state or "UNKNOWN").observe(time.perf_counter() - start)
+
+
+@worker_process_shutdown.connect
+def close_mailer(**kwargs):
+    mailer.close()
+
+
+def deliver(task, messages: List[Tuple[str, str, str]], outbox_ids: List[Optional[int]], retry_call) -> None:
+    """
+    Send (subject, email_to, body) messages over the worker's SMTP connection, the outbox messages
+    of the sent ones are marked delivered. On a transient failure `task` is retried with backoff for
+    the unsent messages, with the (args, kwargs) of `retry_call(unsent, unsent_outbox_ids)`.
+    Refused recipients are only logged.
+    """
+    for index, (subject, email_to, body) in enumerate(messages):
+        try:
+            mailer.send(build_message(subject, email_to, body))
+        except smtplib.SMTPRecipientsRefused:
+            logger.warning("email recipient refused", extra={"email_to": email_to})
+        except Exception as ex:
+            mark_delivered(*outbox_ids[:index])
+            if not is_transient(ex):
+                raise
+            args, kwargs = retry_call(messages[index:], outbox_ids[index:])
+            raise task.retry(args=args, kwargs=kwargs, exc=ex, countdown=5 * 2 ** task.request.retries)
+    mark_delivered(*outbox_ids)
+
+
+def delivered_ids(outbox_ids: List[Optional[int]]) -> Set[int]:
+    ids = [outbox_id for outbox_id in outbox_ids if outbox_id is not None]
+    if not ids:
+        return set()
+    with SessionLocal() as db:
+        return set(db.scalars(
+            select(OutboxMessage.id).filter(OutboxMessage.id.in_(ids), OutboxMessage.delivered_at.is_not(None))
+        ))
+
+
+def is_delivered(outbox_id: Optional[int]) -> bool:
+    return outbox_id in delivered_ids([outbox_id])
+
+
+def mark_delivered(*outbox_ids: Optional[int]) -> None:
+    ids = [outbox_id for outbox_id in outbox_ids if outbox_id is not None]
+    if ids:
+        with SessionLocal() as db:
+            db.execute(update(OutboxMessage).where(OutboxMessage.id.in_(ids)).values(delivered_at=func.now()))
+            db.commit()
+
+
+@celery.task(name="send_email", bind=True, max_retries=5)
+def send_email(self, subject: str, email_to: str, body: str, outbox_id: Optional[int] = None):
+    # the relay may publish a message twice if it stops before recording it as sent
+    if is_delivered(outbox_id):
+        return {"status": "skipped"}
+    deliver(self, [(subject, email_to, body)], [outbox_id],
+            retry_call=lambda unsent, ids: (unsent[0], {"outbox_id": ids[0]}))
+    return {"status": "success"}
+
+
+@celery.task(name="send_emails", bind=True, max_retries=5)
+def send_emails(self, messages: List[Tuple[str, str, str]], outbox_ids: Optional[List[Optional[int]]] = None):
+    """
+    Send a batch of messages in one SMTP session. The relay merges the queued `send_email` messages
+    into batches, `outbox_ids` are their outbox messages in order and each is marked delivered once sent.
+    """
+    outbox_ids = outbox_ids or [None] * len(messages)
+    delivered = delivered_ids(outbox_ids)
+    pending = [(message, outbox_id) for message, outbox_id in zip(messages, outbox_ids) if outbox_id not in delivered]
+    if not pending:
+        return {"status": "skipped"}
+    messages, outbox_ids = [message for message, _ in pending], [outbox_id for _, outbox_id in pending]
+    deliver(self, messages, outbox_ids, retry_call=lambda unsent, ids: ((unsent,), {"outbox_ids": ids}))
+    return {"status": "success", "sent": len(messages)}
+
+
+def refresh_catalog(db, unique_store_key: Optional[str]) -> None:
+    """
+    Rebuild the catalog snapshot of a store after a task changed it.
+    """
+    if unique_store_key:
+        refresh_snapshot(db, unique_store_key)
+        db.commit()
+
+
+@celery.task(name="refresh_catalog_snapshot", autoretry_for=(Exception,), retry_backoff=True, max_retries=5)
+def refresh_catalog_snapshot(unique_store_key: str, outbox_ids: Optional[List[int]] = None):
+    """
+    Rebuild the catalog snapshot of a store after writes through the API, out of the request. The
+    relay merges the rebuilds queued for a store into one task, `outbox_ids` are the merged messages.
+    """
+    with SessionLocal() as db:
+        refresh_catalog(db, unique_store_key)
+    mark_delivered(*(outbox_ids or []))
+    return {"status": "success"}
+
+
+# Keyed on unique_store_key and safe to run more than once.
+@celery.task(name="generate_store_qr_code", autoretry_for=(Exception,), retry_backoff=True, max_retries=5)
+def generate_store_qr_code(unique_store_key: str, outbox_id: Optional[int] = None):
+    with SessionLocal() as db:
+        store = db.scalar(select(Store).filter(Store.unique_store_key == unique_store_key))
+        if store is not None and not store.qr_code_url:
+            store.qr_code_url = create_qr_code_url(unique_store_key)
+            db.commit()
+            refresh_catalog(db, unique_store_key)
+    mark_delivered(outbox_id)
+    return {"status": "success"}
+
+
+# Keyed on unique_store_key and safe to run more than once, the logo is stored under the hash of its content.
+@celery.task(name="upload_store_logo", autoretry_for=(Exception,), retry_backoff=True, max_retries=5)
+def upload_store_logo(unique_store_key: str, encoded_photo: str, extension: str, outbox_id: Optional[int] = None):
+    """
+    Decode and upload the base64 logo a store was created with, out of the request. A logo set
+    meanwhile by an update is kept, an invalid encoding leaves the store without a logo.
+    """
+    try:
+        photo = decode_photo_bytes(encoded_photo)
+    except HTTPException:
+        logger.warning("invalid store logo encoding", extra={"unique_store_key": unique_store_key})
+        mark_delivered(outbox_id)
+        return {"status": "invalid"}
+    logo_url = s3.upload_content(BytesIO(photo), extension, content_type_of(extension))
+    with SessionLocal() as db:
+        store = db.scalar(select(Store).filter(Store.unique_store_key == unique_store_key))
+        if store is not None and not store.logo_url:
+            store.logo_url = logo_url
+            db.add(OutboxMessage(task="generate_image_renditions", args=[Store.__tablename__, store.id]))
+            db.commit()
+            refresh_catalog(db, unique_store_key)
+    mark_delivered(outbox_id)
+    return {"status": "success"}
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.MAIL_USERNAME,
-    MAIL_PASSWORD=settings.MAIL_PASSWORD,
-    MAIL_FROM=settings.MAIL_FROM,
-    MAIL_PORT=settings.MAIL_PORT,
-    MAIL_SERVER=settings.MAIL_SERVER,
-    MAIL_FROM_NAME=settings.MAIL_FROM_NAME,
-)
-
-
-async def send_message(message) -> str:
-    fm = FastMail(conf)
-    await fm.send_message(message)
-
-
-@celery.task(name="send_email")
-def send_email(subject: str, email_to: str, body: str):
-    message = MessageSchema(
-        subject=subject,
-        recipients=[email_to],
-        body=body,
-    )
-    asyncio.run(send_message(message))
+
+# table: (model, image url column, renditions column)
+RENDITION_MODELS = {
+    Item.__tablename__: (Item, "image_url", "image_renditions"),
+    Menu.__tablename__: (Menu, "image_url", "image_renditions"),
+    Store.__tablename__: (Store, "logo_url", "logo_renditions"),
+}
+
+
+@celery.task(name="generate_image_renditions", autoretry_for=(Exception,), retry_backoff=True, max_retries=5)
+def generate_image_renditions(table: str, id: int, outbox_id: Optional[int] = None):
+    """
+    Resize and re-encode the image of a row into its renditions. The renditions are only saved
+    if the image wasn't replaced meanwhile, the new image has a job of its own.
+    """
+    result = make_row_renditions(table, id)
+    mark_delivered(outbox_id)
+    return result
+
+
+def make_row_renditions(table: str, id: int):
+    model, image_field, renditions_field = RENDITION_MODELS[table]
+    image_column = getattr(model, image_field)
+    with SessionLocal() as db:
+        row = db.execute(
+            select(image_column, getattr(model, renditions_field)).filter(model.id == id)
+        ).first()
+        if row is None or not row[0]:
+            return {"status": "skipped"}
+        source_url, renditions = row
+        source_key = s3.key_from_url(source_url)
+        urls = rendition_urls(source_key, s3.get_url)
+        if renditions == urls:
+            return {"status": "skipped"}
+        # images are shared by content, the renditions may exist already (the last one is written last)
+        name, fmt = RENDITIONS[-1][0], list(FORMATS)[-1]
+        if not s3.exists(rendition_key(source_key, name, fmt)):
+            for name, fmt, content_type, body in make_renditions(s3.download_bytes(source_key)):
+                s3.upload_fileobj(BytesIO(body), rendition_key(source_key, name, fmt), content_type)
+        result = db.execute(
+            update(model).where(model.id == id, image_column == source_url).values({renditions_field: urls})
+        )
+        db.commit()
+        if result.rowcount:
+            refresh_catalog(db, db.scalar(store_key_query(model, id)))
     return {"status": "success"}
+
+
+@celery.task(name="collect_orphan_images")
+def collect_orphan_images():
+    """
+    Delete the objects of the bucket no store, menu or item points to anymore, images are shared
+    by content so they can't be deleted along with a row. Objects modified within the grace period
+    are kept: their rows may not be committed yet, and uploads reusing an old object touch it.
+    References and modification times are checked again right before each batch is deleted.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.IMAGE_GC_GRACE_HOURS)
+
+    def is_orphan(key, last_modified, referenced):
+        return (last_modified < cutoff and key not in referenced
+                and rendition_source_key(key) not in referenced)
+
+    referenced = referenced_image_keys()
+    candidates = [obj["Key"] for obj in s3.list_objects() if is_orphan(obj["Key"], obj["LastModified"], referenced)]
+    deleted = 0
+    for start in range(0, len(candidates), 1000):
+        referenced = referenced_image_keys()
+        orphans = []
+        for key in candidates[start:start + 1000]:
+            head = s3.head(key)
+            if head is not None and is_orphan(key, head["LastModified"], referenced):
+                orphans.append(key)
+        s3.delete_objects(orphans)
+        deleted += len(orphans)
+    return {"status": "success", "deleted": deleted}
+
+
+def referenced_image_keys():
+    with SessionLocal() as db:
+        urls = db.scalars(
+            select(Item.image_url).union(select(Menu.image_url), select(Store.logo_url), select(Store.qr_code_url))
+            # archived rows keep their images until they are purged
+            .execution_options(include_deleted=True)
+        ).all()
+    return {s3.key_from_url(url) for url in urls if url}
+
+
+def merge_snapshot_refreshes(messages: List[OutboxMessage]) -> List[Tuple[str, list, List[int]]]:
+    """
+    One rebuild per store, it reads the store after all the merged writes have committed.
+    """
+    ids_by_store = {}
+    for message in messages:
+        ids_by_store.setdefault(message.args[0], []).append(message.id)
+    return [("refresh_catalog_snapshot", [unique_store_key], ids) for unique_store_key, ids in ids_by_store.items()]
+
+
+def merge_emails(messages: List[OutboxMessage]) -> List[Tuple[str, list, List[int]]]:
+    """
+    Batches of MAIL_BATCH_SIZE emails, each sent in one SMTP session.
+    """
+    batches = [messages[start:start + settings.MAIL_BATCH_SIZE]
+               for start in range(0, len(messages), settings.MAIL_BATCH_SIZE)]
+    return [("send_emails", [[message.args for message in batch]], [message.id for message in batch])
+            for batch in batches]
+
+
+# tasks whose messages of a relay batch are merged, into the (task, args, outbox ids) to publish
+MERGED_TASKS = {
+    "refresh_catalog_snapshot": merge_snapshot_refreshes,
+    "send_email": merge_emails,
+}
+
+
+@celery.task(name="relay_outbox")
+def relay_outbox():
+    """
+    Publish the committed outbox messages to the broker in batches, oldest first. Rows are locked
+    with SKIP LOCKED so concurrent relays never publish the same message. Tasks get the message id
+    as `outbox_id` to skip redeliveries, or the ids of their messages as `outbox_ids` for the
+    tasks of MERGED_TASKS.
+    """
+    published = 0
+    with SessionLocal() as db:
+        while True:
+            messages = db.scalars(
+                select(OutboxMessage)
+                .filter(OutboxMessage.sent_at.is_(None))
+                .order_by(OutboxMessage.id)
+                .limit(settings.OUTBOX_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            ).all()
+            merged = {}
+            for message in messages:
+                if message.task in MERGED_TASKS:
+                    merged.setdefault(message.task, []).append(message)
+                else:
+                    celery.send_task(message.task, args=message.args, kwargs={"outbox_id": message.id},
+                                     task_id=f"outbox-{message.id}")
+                message.sent_at = func.now()
+            for task, task_messages in merged.items():
+                for name, args, ids in MERGED_TASKS[task](task_messages):
+                    celery.send_task(name, args=args, kwargs={"outbox_ids": ids}, task_id=f"outbox-{ids[0]}")
+            db.commit()
+            published += len(messages)
+            if len(messages) < settings.OUTBOX_BATCH_SIZE:
+                break
+        db.execute(delete(OutboxMessage).where(
+            OutboxMessage.delivered_at < datetime.now(timezone.utc) - timedelta(hours=settings.OUTBOX_RETENTION_HOURS)
+        ))
+        db.commit()
+    return {"status": "success", "published": published}
+
+
+@celery.task(name="purge_deleted")
+def purge_deleted():
+    """
+    Hard delete the items, menus and stores archived more than SOFT_DELETE_RETENTION_DAYS ago, in
+    batches of PURGE_BATCH_SIZE. Children go first, they are archived no later than their parent.
+    Their images are left to collect_orphan_images.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.SOFT_DELETE_RETENTION_DAYS)
+    purged = {}
+    with SessionLocal() as db:
+        for model in (Item, Menu, Store):
+            purged[model.__tablename__] = 0
+            while True:
+                batch = select(model.id).where(model.deleted_at < cutoff).limit(settings.PURGE_BATCH_SIZE)
+                result = db.execute(
+                    delete(model).where(model.id.in_(batch)).execution_options(synchronize_session=False)
+                )
+                db.commit()
+                purged[model.__tablename__] += result.rowcount
+                if result.rowcount < settings.PURGE_BATCH_SIZE:
+                    break
+    return {"status": "success", "purged": purged}
@@ -1,6 +1,6 @@
-from typing import List
+from typing import List, Optional
 
-from pydantic import BaseSettings, AnyHttpUrl
+from pydantic import BaseSettings, AnyHttpUrl, validator
 
 
 class Settings(BaseSettings):
@@ -8,13 +8,35 @@ class Settings(BaseSettings):
     DB_PASSWORD: str
     DB_NAME: str
     DATABASE_URL: str
+    ASYNC_DATABASE_URL: Optional[str] = None
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_EXTERNAL_POOLER: bool = False  # PgBouncer in transaction mode, pooling is left to it
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
+    PASSWORD_HASH_WORKERS: int = 4
+    TOKEN_CACHE_SIZE: int = 10000
     TOKEN_URL: str = "/user/login"
     AWS_ACCESS_KEY: str
     AWS_SECRET: str
     AWS_BUCKET: str
     AWS_REGION: str
+    AWS_ENDPOINT_URL: Optional[str] = None  # e.g. a local MinIO or moto server
+    S3_MAX_POOL_CONNECTIONS: int = 32
+    S3_MAX_ATTEMPTS: int = 5
+    S3_CONNECT_TIMEOUT: int = 5
+    S3_READ_TIMEOUT: int = 30
+    S3_CREATE_BUCKET: bool = False  # create AWS_BUCKET on first use, for local stand-ins
+    # object keys are content hashes or never rewritten, so objects can be cached for good
+    S3_CACHE_CONTROL: str = "public, max-age=31536000, immutable"
+    IMPORT_UPLOAD_CONCURRENCY: int = 16
+    IMAGE_GC_INTERVAL_HOURS: int = 24
+    IMAGE_GC_GRACE_HOURS: int = 24
+    SOFT_DELETE_RETENTION_DAYS: int = 30  # archived stores, menus and items are purged after
+    PURGE_BATCH_SIZE: int = 1000
     BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = ["http://localhost:3000"]
     CELERY_BROKER_URL: str
     CELERY_RESULT_BACKEND: str
@@ -24,10 +46,49 @@ class Settings(BaseSettings):
     MAIL_PORT: int = 587
     MAIL_SERVER: str = "smtp.gmail.com"
     MAIL_FROM_NAME: str = "Catalog App"
+    MAIL_STARTTLS: bool = True
+    MAIL_SSL_TLS: bool = False
+    MAIL_USE_CREDENTIALS: bool = True  # off for a local aiosmtpd stand-in
+    MAIL_TIMEOUT: int = 30
+    MAIL_MAX_PER_SECOND: float = 5  # per worker process, 0 disables the throttling
+    MAIL_BATCH_SIZE: int = 50  # queued emails the outbox relay merges into one send_emails task
+    OUTBOX_RELAY_INTERVAL: float = 1.0  # seconds
+    OUTBOX_BATCH_SIZE: int = 500
+    OUTBOX_RETENTION_HOURS: int = 72
     BASE_URL: AnyHttpUrl = "http://localhost:8000"
+    WEB_CONCURRENCY: int = 1  # uvicorn worker processes, read by uvicorn as the --workers default
+    # memory, redis or none, a memory cache is per process so it is switched to redis with several workers
+    CACHE_BACKEND: str = "memory"
+    # a Redis of its own, evicting cache entries must never touch the celery queues
+    CACHE_REDIS_URL: str = "redis://redis_cache:6379/0"
+    CACHE_TTL: int = 300
+    CACHE_MAX_SIZE: int = 10000
+    # public catalog routes, revalidated with their ETag / Last-Modified once stale
+    CATALOG_CACHE_CONTROL: str = "public, max-age=60, stale-while-revalidate=300"
+    CATALOG_VERSION_TTL: int = 5  # seconds, the background jobs bump the version without reaching the cache
+    # list pages are sent with orjson as read from the database, skipping the response_model validation
+    FAST_READ_PATH: bool = False
+    COMPRESSION_MIN_SIZE: int = 1024  # bytes, smaller bodies gain less than the encoding costs
+    COMPRESSION_OFFLOAD_SIZE: int = 65536  # bytes, larger bodies are compressed on a thread pool
+    COMPRESSION_WORKERS: int = 4
+    # "text/" matches every text type
+    COMPRESSION_CONTENT_TYPES: List[str] = ["application/json", "text/", "image/svg+xml"]
+    GZIP_LEVEL: int = 6
+    BROTLI_QUALITY: int = 5  # 0-11, the higher ones are too slow for responses built per request
+    QUERY_COUNT_HEADER: bool = False  # adds X-Query-Count to responses
+    CELERY_METRICS_PORT: Optional[int] = None  # serves the celery worker metrics when set
+    # bearer token of the internal endpoints, which answer 404 while it isn't set
+    INTERNAL_TOKEN: Optional[str] = None
 
     class Config:
         env_file = ".env"
 
+    @validator("CACHE_BACKEND", always=True)
+    def shared_cache_with_workers(cls, v, values):
+        # invalidations of a memory cache only reach the worker which made the change
+        if v == "memory" and values.get("WEB_CONCURRENCY", 1) > 1:
+            return "redis"
+        return v
+
 
 settings = Settings()
@@ -1,13 +1,127 @@
-from sqlalchemy import create_engine
+import time
+from typing import Any, Dict
+
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 
 from app.config import settings
 
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# async drivers used by the API for each sync driver found in DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def get_async_database_url(url: str) -> str:
+    """
+    Convert a sync database url to the matching async driver url.
+    """
+    url = make_url(url)
+    drivername = ASYNC_DRIVERS.get(url.drivername, url.drivername)
+    return str(url.set(drivername=drivername))
+
+
+SQLALCHEMY_ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or get_async_database_url(SQLALCHEMY_DATABASE_URL)
+
+
+class PoolWaitMixin:
+    """
+    Records how long checkouts wait for a connection of the pool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def recreate(self):
+        # pool.recreate() drops the counters, keep them across the dispose() of an engine
+        pool = super().recreate()
+        pool.checkouts, pool.wait_total = self.checkouts, self.wait_total
+        pool.wait_max, pool.timeouts = self.wait_max, self.timeouts
+        return pool
+
+
+class TimedQueuePool(PoolWaitMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(PoolWaitMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def get_engine_options(url: str, asynchronous: bool = False) -> Dict[str, Any]:
+    """
+    Pool options of an engine for `url`. With DB_EXTERNAL_POOLER connections aren't pooled here and
+    asyncpg prepared statement caches are disabled, as PgBouncer in transaction mode may run the
+    statements of a session on different server connections.
+    """
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        return {}
+    if settings.DB_EXTERNAL_POOLER:
+        options = {"poolclass": NullPool}
+        if url.get_driver_name() == "asyncpg":
+            options["connect_args"] = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+        return options
+    return {
+        "poolclass": TimedAsyncQueuePool if asynchronous else TimedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def get_pool_stats(engine: Engine) -> Dict[str, Any]:
+    """
+    Current usage and wait statistics of the connection pool of `engine`.
+    """
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(size=pool.size(), checked_in=pool.checkedin(), checked_out=pool.checkedout(),
+                     overflow=pool.overflow())
+    if isinstance(pool, PoolWaitMixin):
+        stats.update(checkouts=pool.checkouts, timeouts=pool.timeouts,
+                     wait_avg_ms=round(pool.wait_total / pool.checkouts * 1000, 3) if pool.checkouts else 0.0,
+                     wait_max_ms=round(pool.wait_max * 1000, 3))
+    return stats
+
+
+# sync engine, used by alembic, celery workers and scripts.
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **get_engine_options(SQLALCHEMY_DATABASE_URL))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# async engine, used by the API request handlers.
+async_engine = create_async_engine(SQLALCHEMY_ASYNC_DATABASE_URL,
+                                   **get_engine_options(SQLALCHEMY_ASYNC_DATABASE_URL, asynchronous=True))
+
+AsyncSessionLocal = sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
@@ -0,0 +1,75 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from fastapi import Request
+from sqlalchemy import event
+
+from app.db.database import async_engine, engine
+from app.utils.metrics import DB_QUERY_SECONDS
+
+
+class QueryStats:
+    """
+    Number of statements and time spent in them by the current request.
+    """
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """
+    Collect the statements run inside the block, nested blocks share the outer stats.
+    """
+    stats = query_stats.get()
+    if stats is not None:
+        yield stats
+        return
+    stats = QueryStats()
+    token = query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        query_stats.reset(token)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_start"].pop()
+    DB_QUERY_SECONDS.observe(duration)
+    stats = query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += duration
+
+
+def handle_error(context):
+    if context.connection is not None and context.connection.info.get("query_start"):
+        context.connection.info["query_start"].pop()
+
+
+for _engine in (async_engine.sync_engine, engine):
+    event.listen(_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(_engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(_engine, "handle_error", handle_error)
+
+
+async def query_count_middleware(request: Request, call_next):
+    """
+    Count the statements a request runs and return it as `X-Query-Count`.
+    """
+    with track_queries() as stats:
+        response = await call_next(request)
+    response.headers["X-Query-Count"] = str(stats.count)
+    return response
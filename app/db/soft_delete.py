@@ -0,0 +1,25 @@
+from sqlalchemy import Column, DateTime, event, text
+from sqlalchemy.orm import Session, with_loader_criteria
+
+
+# partial index conditions, live rows and the live active rows public listings read
+LIVE = text("deleted_at IS NULL")
+PUBLIC = text("deleted_at IS NULL AND is_active")
+
+
+class SoftDeleteMixin:
+    """
+    Rows are archived by setting `deleted_at` and purged later by a batch job. ORM selects skip
+    archived rows, relationship loads included, unless run with `execution_options(include_deleted=True)`.
+    """
+    deleted_at = Column(DateTime(timezone=True))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def skip_deleted_rows(execute_state):
+    if (execute_state.is_select
+            and not execute_state.is_column_load
+            and not execute_state.execution_options.get("include_deleted", False)):
+        execute_state.statement = execute_state.statement.options(
+            with_loader_criteria(SoftDeleteMixin, lambda cls: cls.deleted_at.is_(None), include_aliases=True)
+        )
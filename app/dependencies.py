@@ -1,58 +1,74 @@
+import hmac
+import logging
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
-from passlib.context import CryptContext
 from pydantic import EmailStr
 
 from app.config import settings
-from app.db.database import SessionLocal
-from app.api.v1.schemas.user import UserInDBBase
+from app.db.database import AsyncSessionLocal
+from app.models.user import User
+from app.utils.cache import MemoryCache
+# re-exported for the routers, crud imports them from the leaf module to avoid an import cycle
+from app.utils.passwords import get_password_hash, verify_password  # noqa: F401
 
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
-bcrypt_context = CryptContext(schemes=["bcrypt"])
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl=settings.TOKEN_URL, scheme_name="JWT")
+ACCESS_TOKEN_EXPIRE_MINUTES = 180
+# verified tokens, kept until their exp so repeated requests skip the jwt verification
+token_cache = MemoryCache(ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60, max_size=settings.TOKEN_CACHE_SIZE)
 
+logger = logging.getLogger(__name__)
 
-def generate_access_token(user: UserInDBBase, expires_delta: Optional[timedelta] = None):
+
+def generate_access_token(user: User, expires_delta: Optional[timedelta] = None):
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=180)
+        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     encode = {"email": user.email, "id": user.id, "exp": expire}
     return jwt.encode(encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
 async def get_current_user(token: str = Depends(oauth2_bearer)):
+    user = await token_cache.get(token)
+    if user is not None:
+        return user
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        print(f"{payload=}")
-        email: EmailStr = payload.get("email")
-        user_id: int = payload.get("id")
-        if email is None or user_id is None:
-            raise get_user_exception()
-        return {"email": email, "id": user_id}
-    except JWTError:
+    except JWTError as ex:
+        logger.info("access token rejected", extra={"reason": str(ex)})
         raise get_user_exception()
+    email: EmailStr = payload.get("email")
+    user_id: int = payload.get("id")
+    if email is None or user_id is None:
+        logger.info("access token rejected", extra={"reason": "missing email or id claim"})
+        raise get_user_exception()
+    user = {"email": email, "id": user_id}
+    expires_in = payload.get("exp", 0) - time.time()
+    if expires_in > 0:
+        await token_cache.set(token, user, ttl=expires_in)
+    logger.debug("access token verified", extra={"user_id": user_id, "exp": payload.get("exp")})
+    return user
 
 
-def get_db():
-    try:
-        db = SessionLocal()
-        yield db
-    finally:
-        db.close()
-
-
-def get_password_hash(password):
-    return bcrypt_context.hash(password)
+def verify_internal_token(authorization: Optional[str] = Header(None)):
+    """
+    Guard of the internal endpoints, they are hidden unless the request has `Bearer INTERNAL_TOKEN`.
+    """
+    expected = f"Bearer {settings.INTERNAL_TOKEN}"
+    if not settings.INTERNAL_TOKEN or not hmac.compare_digest((authorization or "").encode(), expected.encode()):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
 
 
-def verify_password(plain_password, hashed_password):
-    return bcrypt_context.verify(plain_password, hashed_password)
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
 
 
 # Exceptions
@@ -1,13 +1,20 @@
 import uvicorn
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Response
 from fastapi_pagination import add_pagination
+from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api import api_router
 from app.config import settings
+from app.db.query_counter import query_count_middleware
+from app.dependencies import verify_internal_token
+from app.middleware import CatalogValidatorMiddleware, CompressionMiddleware, MetricsMiddleware
+from app.utils.metrics import render_metrics
 
 app = FastAPI()
 
+# added first so that CORS wraps its 304 responses too
+app.add_middleware(CatalogValidatorMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[str(origin) for origin in settings.BACKEND_CORS_ORIGINS],
@@ -16,8 +23,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.QUERY_COUNT_HEADER:
+    app.add_middleware(BaseHTTPMiddleware, dispatch=query_count_middleware)
+
+# inside the metrics one, so response sizes are the compressed ones
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(api_router)
 add_pagination(app)
 
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(verify_internal_token)])
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,270 @@
+import asyncio
+import gzip
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.api.v1 import crud
+from app.config import settings
+from app.db.database import AsyncSessionLocal
+from app.db.query_counter import track_queries
+from app.utils.cache import cache, catalog_group, catalog_key
+from app.utils.helpers import etag_matches
+from app.utils.metrics import (DB_REQUEST_QUERIES, DB_REQUEST_QUERY_SECONDS, HTTP_COMPRESSED_RESPONSES,
+                               HTTP_COMPRESSION_SAVED_BYTES, HTTP_REQUEST_SECONDS, HTTP_REQUESTS_IN_FLIGHT,
+                               HTTP_RESPONSE_BYTES)
+
+
+class MetricsMiddleware:
+    """
+    Records latency, in flight requests, response size and SQL statements per route.
+    Routes are labelled with their path template, requests matching no route as "unmatched".
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code, size = 500, 0
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        start = time.perf_counter()
+        with track_queries() as queries:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                in_flight.dec()
+                route = getattr(scope.get("route"), "path", "unmatched")
+                HTTP_REQUEST_SECONDS.labels(method, route, status_code).observe(time.perf_counter() - start)
+                HTTP_RESPONSE_BYTES.labels(method, route).observe(size)
+                DB_REQUEST_QUERIES.labels(method, route).observe(queries.count)
+                DB_REQUEST_QUERY_SECONDS.labels(method, route).observe(queries.seconds)
+
+
+# public routes showing the catalog of the store named in their path
+CATALOG_ROUTE = re.compile(r"^/api/v1/stores/(?P<key>[^/]+)/(?:catalog|search|menus(?:/keyset)?|items(?:/keyset)?)$")
+
+
+def catalog_store_key(scope: Scope) -> Optional[str]:
+    match = CATALOG_ROUTE.match(scope["path"])
+    if match:
+        return match["key"]
+    if scope["path"] == "/api/v1/stores/":
+        return parse_qs(scope["query_string"].decode("latin-1")).get("unique_store_key", [None])[0]
+    return None
+
+
+def as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def round_up_to_second(value: datetime) -> datetime:
+    rounded = as_utc(value).replace(microsecond=0)
+    return rounded + timedelta(seconds=1) if rounded < as_utc(value) else rounded
+
+
+def last_modified_date(last_modified: datetime) -> datetime:
+    """
+    Last-Modified to send, HTTP dates have whole seconds. Rounded up, so sending it back covers the
+    change, once that second is over. Until then a later change could round up to the same date, so
+    it is rounded down instead, which is never answered 304.
+    """
+    rounded = round_up_to_second(last_modified)
+    if rounded <= datetime.now(timezone.utc):
+        return rounded
+    return as_utc(last_modified).replace(microsecond=0)
+
+
+def not_modified(headers: Headers, etag: str, last_modified: datetime) -> bool:
+    """
+    Whether the validators of the request match, If-None-Match takes precedence over If-Modified-Since.
+    """
+    if "if-none-match" in headers:
+        return etag_matches(headers["if-none-match"], etag)
+    try:
+        since = parsedate_to_datetime(headers["if-modified-since"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return round_up_to_second(last_modified) <= as_utc(since)
+
+
+async def get_catalog_version(unique_store_key: str) -> Optional[Dict[str, Any]]:
+    """
+    Catalog version of a live active store, read through the cache. The version is bumped by the
+    celery workers rebuilding the snapshot after a write, they can't reach the cache so the new
+    version is picked up once the entry expires, hence its short TTL.
+    """
+    async def load():
+        async with AsyncSessionLocal() as db:
+            version = await crud.store.get_catalog_version(db, unique_store_key=unique_store_key)
+        if version is None:
+            return None
+        return {"version": version.catalog_version, "updated_at": as_utc(version.catalog_updated_at).isoformat()}
+
+    return await cache.get_or_set(catalog_key(unique_store_key, "version"), load,
+                                  ttl=settings.CATALOG_VERSION_TTL, group=catalog_group(unique_store_key))
+
+
+class CatalogValidatorMiddleware:
+    """
+    Conditional GETs of the public catalog routes, validated with the catalog version of the store.
+    Responses get an ETag (unless the route sets its own), Last-Modified and Cache-Control, and a
+    request holding the current version is answered 304 before reaching the route, so without
+    loading or serializing the catalog.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        key = catalog_store_key(scope) if scope["type"] == "http" and scope["method"] in ("GET", "HEAD") else None
+        version = await get_catalog_version(key) if key else None
+        if version is None:
+            await self.app(scope, receive, send)
+            return
+
+        etag = f'W/"{version["version"]}"'
+        updated_at = datetime.fromisoformat(version["updated_at"])
+        validators = {
+            "ETag": etag,
+            "Last-Modified": formatdate(last_modified_date(updated_at).timestamp(), usegmt=True),
+            "Cache-Control": settings.CATALOG_CACHE_CONTROL,
+        }
+        if not_modified(Headers(scope=scope), etag, updated_at):
+            await send({"type": "http.response.start", "status": 304,
+                        "headers": [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                                    for name, value in validators.items()]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start" and message["status"] in (200, 304):
+                headers = MutableHeaders(raw=message["headers"])
+                for name, value in validators.items():
+                    if name not in headers:
+                        headers[name] = value
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+# encodings by order of preference
+ENCODERS = {
+    "br": lambda body: brotli.compress(body, quality=settings.BROTLI_QUALITY),
+    "gzip": lambda body: gzip.compress(body, compresslevel=settings.GZIP_LEVEL, mtime=0),
+}
+
+compression_executor = ThreadPoolExecutor(max_workers=settings.COMPRESSION_WORKERS, thread_name_prefix="compress")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Preferred encoding of ENCODERS the client accepts, None when it accepts none of them.
+    """
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        params = params.strip()
+        try:
+            weights[name.strip().lower()] = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            weights[name.strip().lower()] = 0.0
+    for encoding in ENCODERS:
+        if weights.get(encoding, weights.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def is_compressible(headers: Headers, size: int) -> bool:
+    if size < settings.COMPRESSION_MIN_SIZE or "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+    return any(content_type.startswith(prefix) if prefix.endswith("/") else content_type == prefix
+               for prefix in settings.COMPRESSION_CONTENT_TYPES)
+
+
+async def compress(encoding: str, body: bytes) -> bytes:
+    if len(body) < settings.COMPRESSION_OFFLOAD_SIZE:
+        return ENCODERS[encoding](body)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(compression_executor, ENCODERS[encoding], body)
+
+
+class CompressionMiddleware:
+    """
+    Brotli or gzip compression of the responses, brotli when the client accepts both. Only whole
+    bodies of COMPRESSION_CONTENT_TYPES from COMPRESSION_MIN_SIZE up are compressed, streamed responses
+    pass through as they are. The bytes saved are counted per route.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start_message: Optional[Message] = None
+
+        async def send_wrapper(message: Message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # held back until the body shows whether it is compressed
+                start_message = message
+                return
+            if start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if message.get("more_body", False) or not is_compressible(headers, len(body)):
+                await send(start)
+                await send(message)
+                return
+
+            headers.add_vary_header("Accept-Encoding")
+            compressed = await compress(encoding, body) if encoding else body
+            if len(compressed) >= len(body):
+                await send(start)
+                await send(message)
+                return
+
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            # a strong ETag names the exact bytes, which are no longer those of the route
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_COMPRESSED_RESPONSES.labels(encoding, route).inc()
+            HTTP_COMPRESSION_SAVED_BYTES.labels(encoding, route).inc(len(body) - len(compressed))
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -2,3 +2,5 @@ from .item import Item
 from .menu import Menu
 from .store import Store
 from .user import User
+from .outbox import OutboxMessage
+from .catalog_snapshot import CatalogSnapshot
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text, func
+
+from app.db.database import Base
+
+
+class CatalogSnapshot(Base):
+    """
+    Public catalog of a store serialized ahead of time, rebuilt by the celery workers after the
+    writes to the store, its menus and items and served as is.
+    """
+    __tablename__ = "catalog_snapshots"
+
+    store_id = Column(Integer, ForeignKey("stores.id", ondelete="CASCADE"), primary_key=True)
+    unique_store_key = Column(String, nullable=False, unique=True, index=True)
+    body = Column(Text, nullable=False)  # StoreCatalog as json
+    etag = Column(String, nullable=False)
+    built_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
@@ -1,22 +1,30 @@
-from sqlalchemy import Boolean, Column, Integer, String, ForeignKey, Float, UniqueConstraint
+from sqlalchemy import JSON, Boolean, Column, DateTime, Index, Integer, String, ForeignKey, Float, func
 from sqlalchemy.orm import relationship
 
 from app.db.database import Base
+from app.db.soft_delete import LIVE, PUBLIC, SoftDeleteMixin
 
 
-class Item(Base):
+class Item(SoftDeleteMixin, Base):
     __tablename__ = "items"
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String)
     description = Column(String)
     price = Column(Float)
-    image_url = Column(String, unique=True)
+    image_url = Column(String, index=True)  # shared by rows with the same image
+    image_renditions = Column(JSON)  # {rendition: {format: url}}, filled in by a background job
     is_active = Column(Boolean, default=True)
-    menu_id = Column(Integer, ForeignKey("menus.id"))
-    owner_id = Column(Integer, ForeignKey("users.id"))
+    menu_id = Column(Integer, ForeignKey("menus.id"), index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
 
     menu = relationship("Menu", back_populates="items")
     owner = relationship("User", back_populates="items")
 
-    __table_args__ = (UniqueConstraint('title', 'menu_id'),)
+    # titles are unique among the live items of a menu only
+    __table_args__ = (
+        Index("uq_items_title_menu_id_live", "title", "menu_id", unique=True, postgresql_where=LIVE,
+              sqlite_where=LIVE),
+        Index("ix_items_menu_id_public", "menu_id", "id", postgresql_where=PUBLIC, sqlite_where=PUBLIC),
+    )
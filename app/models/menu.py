@@ -1,19 +1,26 @@
-from sqlalchemy import Boolean, Column, Integer, String, ForeignKey, UniqueConstraint
+from sqlalchemy import JSON, Boolean, Column, DateTime, Index, Integer, String, ForeignKey, func
 from sqlalchemy.orm import relationship
 
 from app.db.database import Base
+from app.db.soft_delete import LIVE, PUBLIC, SoftDeleteMixin
 
 
-class Menu(Base):
+class Menu(SoftDeleteMixin, Base):
     __tablename__ = "menus"
 
     id = Column(Integer, primary_key=True, index=True)
-    title = Column(String, unique=True)
+    title = Column(String)
     is_active = Column(Boolean, default=True)
-    image_url = Column(String, unique=True)
-    store_id = Column(Integer, ForeignKey("stores.id"))
+    image_url = Column(String, index=True)  # shared by rows with the same image
+    image_renditions = Column(JSON)  # {rendition: {format: url}}, filled in by a background job
+    store_id = Column(Integer, ForeignKey("stores.id"), index=True)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
 
     store = relationship("Store", back_populates="menus")
-    items = relationship("Item", back_populates="menu")
+    items = relationship("Item", back_populates="menu", order_by="Item.id")
 
-    __table_args__ = (UniqueConstraint('title', 'store_id'),)
+    # titles are unique among live menus only, archived menus don't hold on to theirs
+    __table_args__ = (
+        Index("uq_menus_title_live", "title", unique=True, postgresql_where=LIVE, sqlite_where=LIVE),
+        Index("ix_menus_store_id_public", "store_id", "id", postgresql_where=PUBLIC, sqlite_where=PUBLIC),
+    )
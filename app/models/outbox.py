@@ -0,0 +1,22 @@
+from sqlalchemy import JSON, Column, DateTime, Index, Integer, String, func
+
+from app.db.database import Base
+
+
+class OutboxMessage(Base):
+    """
+    Celery task written in the transaction of the change that causes it, the outbox relay
+    publishes it once that transaction has committed.
+    """
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True)
+    task = Column(String, nullable=False)
+    args = Column(JSON, nullable=False, default=list)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    sent_at = Column(DateTime(timezone=True))  # published to the broker by the relay
+    delivered_at = Column(DateTime(timezone=True))  # task done, a redelivered message is skipped
+
+    __table_args__ = (
+        Index("ix_outbox_pending", "id", postgresql_where=sent_at.is_(None), sqlite_where=sent_at.is_(None)),
+    )
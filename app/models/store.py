@@ -1,29 +1,45 @@
 import uuid
 
-from sqlalchemy import Boolean, Column, Integer, String, ForeignKey, UniqueConstraint
+from sqlalchemy import JSON, Boolean, Column, DateTime, Index, Integer, String, ForeignKey, func
 from sqlalchemy.orm import relationship
 
 from app.db.database import Base
+from app.db.soft_delete import LIVE, SoftDeleteMixin
 
 
 def generate_uuid():
     return str(uuid.uuid4())
 
 
-class Store(Base):
+class Store(SoftDeleteMixin, Base):
     __tablename__ = "stores"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, unique=True)
+    name = Column(String)
     contact_no = Column(String)
     address = Column(String)
-    logo_url = Column(String, unique=True)
+    logo_url = Column(String, index=True)  # shared by stores with the same logo
+    logo_renditions = Column(JSON)  # {rendition: {format: url}}, filled in by a background job
     qr_code_url = Column(String, unique=True)
     is_active = Column(Boolean, default=True)
-    owner_id = Column(Integer, ForeignKey("users.id"))
-    unique_store_key = Column(String, nullable=False, default=generate_uuid)
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
+    unique_store_key = Column(String, nullable=False, unique=True, index=True, default=generate_uuid)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+    # bumped by every change of the public catalog (store, menus and items), the HTTP validators of its routes
+    catalog_version = Column(Integer, nullable=False, server_default="0")
+    catalog_updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
 
     owner = relationship("User", back_populates="stores")
-    menus = relationship("Menu", back_populates="store")
-
-    __table_args__ = (UniqueConstraint('name', 'owner_id'),)
+    menus = relationship("Menu", back_populates="store", order_by="Menu.id")
+
+    # names are unique among live stores only, archived stores don't hold on to theirs
+    __table_args__ = (
+        Index("uq_stores_name_live", "name", unique=True, postgresql_where=LIVE, sqlite_where=LIVE),
+    )
+
+    @property
+    def status(self):
+        """
+        Stores are pending until the background jobs have uploaded the logo and qr code.
+        """
+        return "ready" if self.logo_url and self.qr_code_url else "pending"
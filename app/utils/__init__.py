@@ -1,2 +1,3 @@
 from .helpers import decode_photo
 from .s3_util import s3
+from .cache import cache
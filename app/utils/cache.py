@@ -0,0 +1,187 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.utils.search import drop_search_index
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend:
+    """
+    Base class of the cache backends, values must be json serializable. Entries can be set in a
+    group, e.g. all the entries of a store, and a group is invalidated at once by `delete_group`.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None, group: Optional[str] = None) -> None:
+        raise NotImplementedError
+
+    async def delete_group(self, group: str) -> None:
+        raise NotImplementedError
+
+    async def get_or_set(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: Optional[int] = None,
+                         group: Optional[str] = None) -> Any:
+        """
+        Read through the cache, `loader` is awaited and its result stored on a miss.
+        """
+        value = await self.get(key)
+        if value is None:
+            value = await loader()
+            await self.set(key, value, ttl, group)
+        return value
+
+
+class NullCache(CacheBackend):
+    """
+    Backend that caches nothing, every read goes to the database.
+    """
+
+    async def get(self, key: str) -> Optional[Any]:
+        return None
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None, group: Optional[str] = None) -> None:
+        pass
+
+    async def delete_group(self, group: str) -> None:
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """
+    In-process LRU cache with per entry TTL. Entries live in the worker process,
+    so the redis backend is used when running more than one worker.
+    """
+
+    def __init__(self, ttl: int, max_size: int):
+        super().__init__(ttl)
+        self.max_size = max_size
+        self._data: "OrderedDict[str, Tuple[float, Any, Optional[str]]]" = OrderedDict()
+        self._groups: Dict[str, Set[str]] = {}
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            self._delete(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None, group: Optional[str] = None) -> None:
+        if key in self._data:
+            self._delete(key)
+        self._data[key] = (time.monotonic() + (ttl or self.ttl), value, group)
+        if group is not None:
+            self._groups.setdefault(group, set()).add(key)
+        while len(self._data) > self.max_size:
+            self._delete(next(iter(self._data)))
+
+    async def delete_group(self, group: str) -> None:
+        for key in self._groups.pop(group, ()):
+            self._data.pop(key, None)
+
+    def _delete(self, key: str) -> None:
+        _, _, group = self._data.pop(key)
+        keys = self._groups.get(group)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._groups[group]
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache shared by all workers. Keys are written with a TTL and LRU eviction is left
+    to its redis (`maxmemory-policy allkeys-lru`). Redis errors are treated as a cache miss.
+    The keys of a group are kept in a redis set, so invalidating a group never scans the keyspace.
+    """
+
+    # deletes the keys of a group and its set atomically, no key is added to the set meanwhile
+    DELETE_GROUP = """
+    local keys = redis.call('SMEMBERS', KEYS[1])
+    for i = 1, #keys, 1000 do
+        redis.call('DEL', unpack(keys, i, math.min(i + 999, #keys)))
+    end
+    return redis.call('DEL', KEYS[1])
+    """
+
+    def __init__(self, url: str, ttl: int):
+        super().__init__(ttl)
+        self.redis = aioredis.from_url(url)
+        self.delete_group_script = self.redis.register_script(self.DELETE_GROUP)
+
+    @staticmethod
+    def group_key(group: str) -> str:
+        return f"group:{group}"
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            value = await self.redis.get(key)
+        except RedisError as ex:
+            logger.warning("cache get failed for %s: %s", key, ex)
+            return None
+        return None if value is None else json.loads(value)
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None, group: Optional[str] = None) -> None:
+        ttl = ttl or self.ttl
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(key, json.dumps(value), ex=ttl)
+                if group is not None:
+                    # the set outlives the entries added to it, expired members are only deleted again
+                    pipe.sadd(self.group_key(group), key)
+                    pipe.expire(self.group_key(group), max(ttl, self.ttl))
+                await pipe.execute()
+        except RedisError as ex:
+            logger.warning("cache set failed for %s: %s", key, ex)
+
+    async def delete_group(self, group: str) -> None:
+        try:
+            await self.delete_group_script(keys=[self.group_key(group)])
+        except RedisError as ex:
+            logger.warning("cache invalidation failed for %s: %s", group, ex)
+
+
+def get_cache_backend() -> CacheBackend:
+    if settings.CACHE_BACKEND == "redis":
+        return RedisCache(settings.CACHE_REDIS_URL, ttl=settings.CACHE_TTL)
+    if settings.CACHE_BACKEND == "memory":
+        return MemoryCache(ttl=settings.CACHE_TTL, max_size=settings.CACHE_MAX_SIZE)
+    return NullCache(ttl=settings.CACHE_TTL)
+
+
+def catalog_key(unique_store_key: str, *parts: Any) -> str:
+    """
+    Cache key of a public catalog entry, set in the `catalog_group` of its store.
+    """
+    return ":".join(["catalog", str(unique_store_key), *map(str, parts)])
+
+
+def catalog_group(unique_store_key: str) -> str:
+    """
+    Cache group of the public catalog entries of a store, invalidated when its catalog changes.
+    """
+    return catalog_key(unique_store_key)
+
+
+async def invalidate_store(unique_store_key: Optional[str]) -> None:
+    if unique_store_key:
+        await cache.delete_group(catalog_group(unique_store_key))
+        drop_search_index(str(unique_store_key))
+
+
+cache = get_cache_backend()
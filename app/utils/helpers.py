@@ -1,17 +1,22 @@
+import asyncio
 import base64
-import os
-import uuid
-from typing import Union
+import binascii
+import hashlib
+import io
+import json
+import mimetypes
+import zipfile
+from typing import Any, Dict, Optional, Tuple, Union
 
 import png  # noqa
 import pyqrcode  # noqa
-from fastapi import HTTPException
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import ORJSONResponse
 from pydantic import HttpUrl
 from pyqrcode import QRCode  # noqa
 
 from app.config import settings
-from app.constants import TEMP_FILE_FOLDER
-from app.utils.s3_util import s3
+from app.utils.s3_util import content_type_of, s3
 
 
 def decode_photo(path, encoded_string):
@@ -23,19 +28,108 @@ def decode_photo(path, encoded_string):
 
 
 def upload_photo_to_s3(encoded_photo: Union[str, bytes], ext: str) -> HttpUrl:
-    name = f"{uuid.uuid4()}.{ext}"
-    path = os.path.join(TEMP_FILE_FOLDER, name)
-    decode_photo(path, encoded_photo)
-    url = s3.upload_photo(path, name, ext)
-    os.remove(path)
-    return url
+    """
+    Decode a base64 photo in memory and upload it under the hash of its content.
+    """
+    photo = io.BytesIO(decode_photo_bytes(encoded_photo))
+    return s3.upload_content(photo, ext, content_type_of(ext))
+
+
+async def upload_encoded_photo(encoded_photo: Union[str, bytes], ext: str) -> HttpUrl:
+    """
+    `upload_photo_to_s3` for the API, run on the S3 threads.
+    """
+    return await s3.run(upload_photo_to_s3, encoded_photo, ext)
+
+
+def decode_photo_bytes(encoded_photo: Union[str, bytes]) -> bytes:
+    try:
+        photo = base64.b64decode(encoded_photo)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid photo encoding")
+    if not photo:
+        raise HTTPException(status_code=400, detail="Invalid photo encoding")
+    return photo
+
+
+# content types accepted for uploaded photos, with the extension of their S3 key
+PHOTO_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+}
+
+
+async def upload_file_to_s3(photo: UploadFile) -> HttpUrl:
+    """
+    Stream an uploaded photo to S3 without decoding or copying it in the app, under the hash of
+    its content.
+    """
+    content_type = (photo.content_type or "").split(";", 1)[0].strip().lower()
+    ext = PHOTO_EXTENSIONS.get(content_type)
+    if ext is None:
+        raise HTTPException(status_code=400, detail="Photo must be a JPEG, PNG or WebP image")
+    return await s3.run(s3.upload_content, photo.file, ext, content_type)
+
+
+async def upload_archive_images(archive: Optional[zipfile.ZipFile],
+                                names: Dict[Any, str]) -> Tuple[Dict[Any, HttpUrl], Dict[Any, str]]:
+    """
+    Upload images of a zip archive concurrently, `names` maps a caller key to a file name in the
+    archive. Returns the urls and the errors by key, keys with the same image share one S3 object.
+    """
+    semaphore = asyncio.Semaphore(settings.IMPORT_UPLOAD_CONCURRENCY)
+    urls, errors = {}, {}
+
+    def upload_member(name, ext, content_type):
+        # reading a member decompresses it, so it runs on the S3 threads too
+        return s3.upload_content(io.BytesIO(archive.read(name)), ext, content_type)
+
+    async def upload(key, name):
+        content_type = mimetypes.guess_type(name)[0]
+        if archive is None:
+            errors[key] = "Image archive is missing"
+        elif content_type not in PHOTO_EXTENSIONS:
+            errors[key] = f"Invalid photo content type of {name}"
+        else:
+            try:
+                async with semaphore:
+                    urls[key] = await s3.run(upload_member, name, PHOTO_EXTENSIONS[content_type], content_type)
+            except KeyError:
+                errors[key] = f"Image {name} not found in archive"
+            except HTTPException as ex:
+                errors[key] = ex.detail
+
+    await asyncio.gather(*(upload(key, name) for key, name in names.items()))
+    return urls, errors
+
+
+def rows_response(page: Dict[str, Any]) -> Union[Dict[str, Any], ORJSONResponse]:
+    """
+    Response of a page of `paginate_rows` / `paginate_keyset_rows`. The page goes through the
+    route's response_model, unless FAST_READ_PATH sends the rows as they are with orjson.
+    """
+    return ORJSONResponse(page) if settings.FAST_READ_PATH else page
+
+
+def make_etag(data: Any) -> str:
+    body = json.dumps(data, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Weak comparison of an If-None-Match header with `etag`.
+    """
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
 
 
 def create_qr_code_url(unique_store_key):
     s = f"{settings.BASE_URL}/store/{unique_store_key}"
-    url = pyqrcode.create(s)
-    path = os.path.join(TEMP_FILE_FOLDER, unique_store_key)
-    url.png(path, scale=6)
-    url = s3.upload_photo(path, unique_store_key, ".png")
-    os.remove(path)
-    return url
+    qr_code = io.BytesIO()
+    pyqrcode.create(s).png(qr_code, scale=6)
+    qr_code.seek(0)
+    return s3.upload_fileobj(qr_code, unique_store_key, "image/png")
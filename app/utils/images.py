@@ -0,0 +1,53 @@
+import re
+from io import BytesIO
+from typing import Dict, Iterator, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+# longest side of each rendition in pixels, largest first as each one is resized from the previous
+RENDITIONS = (("full", 1600), ("medium", 640), ("thumbnail", 200))
+
+# format name: (Pillow format, content type, encoder options)
+FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def rendition_key(source_key: str, name: str, fmt: str) -> str:
+    return f"{source_key}-{name}.{fmt}"
+
+
+RENDITION_KEY_RE = re.compile(
+    rf"^(?P<source>.+)-(?:{'|'.join(name for name, _ in RENDITIONS)})\.(?:{'|'.join(FORMATS)})$"
+)
+
+
+def rendition_source_key(key: str) -> Optional[str]:
+    """
+    Key of the image a rendition was made from, None if `key` isn't a rendition.
+    """
+    match = RENDITION_KEY_RE.match(key)
+    return match.group("source") if match else None
+
+
+def make_renditions(data: bytes) -> Iterator[Tuple[str, str, str, bytes]]:
+    """
+    Decode an image once and yield (rendition, format, content type, body) for every rendition,
+    images smaller than a rendition are never upscaled.
+    """
+    with Image.open(BytesIO(data)) as image:
+        # decode large JPEGs at a reduced scale straight away
+        image.draft("RGB", (RENDITIONS[0][1], RENDITIONS[0][1]))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+    for name, size in RENDITIONS:
+        image.thumbnail((size, size), Image.LANCZOS, reducing_gap=3.0)
+        for fmt, (pil_format, content_type, options) in FORMATS.items():
+            body = BytesIO()
+            image.save(body, pil_format, **options)
+            yield name, fmt, content_type, body.getvalue()
+
+
+def rendition_urls(source_key: str, get_url) -> Dict[str, Dict[str, str]]:
+    return {name: {fmt: get_url(rendition_key(source_key, name, fmt)) for fmt in FORMATS}
+            for name, _ in RENDITIONS}
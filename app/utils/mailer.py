@@ -0,0 +1,89 @@
+import logging
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from email.utils import formataddr
+from typing import Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# errors worth retrying later, the connection dropped or the server answered with a 4xx code
+TRANSIENT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+
+def is_transient(ex: Exception) -> bool:
+    if isinstance(ex, smtplib.SMTPResponseException):
+        return 400 <= ex.smtp_code < 500
+    return isinstance(ex, TRANSIENT_ERRORS)
+
+
+def build_message(subject: str, email_to: str, body: str) -> EmailMessage:
+    message = EmailMessage()
+    message["Subject"] = subject
+    message["From"] = formataddr((settings.MAIL_FROM_NAME, settings.MAIL_FROM))
+    message["To"] = email_to
+    message.set_content(body)
+    return message
+
+
+class Mailer:
+    """
+    SMTP connection kept open across messages by a worker process, so the TLS handshake and login
+    are paid once instead of per email. Messages are throttled to MAIL_MAX_PER_SECOND.
+    """
+
+    def __init__(self):
+        self.smtp: Optional[smtplib.SMTP] = None
+        self.lock = threading.Lock()
+        self.interval = 1 / settings.MAIL_MAX_PER_SECOND if settings.MAIL_MAX_PER_SECOND else 0
+        self.next_send = 0.0
+
+    def connect(self) -> smtplib.SMTP:
+        if settings.MAIL_SSL_TLS:
+            smtp = smtplib.SMTP_SSL(settings.MAIL_SERVER, settings.MAIL_PORT, timeout=settings.MAIL_TIMEOUT)
+        else:
+            smtp = smtplib.SMTP(settings.MAIL_SERVER, settings.MAIL_PORT, timeout=settings.MAIL_TIMEOUT)
+            if settings.MAIL_STARTTLS:
+                smtp.starttls()
+        if settings.MAIL_USE_CREDENTIALS:
+            smtp.login(settings.MAIL_USERNAME, settings.MAIL_PASSWORD)
+        logger.info("smtp connection opened", extra={"server": settings.MAIL_SERVER})
+        return smtp
+
+    def close(self) -> None:
+        with self.lock:
+            if self.smtp is not None:
+                try:
+                    self.smtp.quit()
+                except smtplib.SMTPException:
+                    pass
+                self.smtp = None
+
+    def throttle(self) -> None:
+        now = time.monotonic()
+        if self.next_send > now:
+            time.sleep(self.next_send - now)
+        self.next_send = max(now, self.next_send) + self.interval
+
+    def send(self, message: EmailMessage) -> None:
+        """
+        Send on the open connection, a connection closed by the server meanwhile is reopened once.
+        """
+        with self.lock:
+            self.throttle()
+            for attempt in range(2):
+                if self.smtp is None:
+                    self.smtp = self.connect()
+                try:
+                    self.smtp.send_message(message)
+                    return
+                except smtplib.SMTPServerDisconnected:
+                    self.smtp = None
+                    if attempt:
+                        raise
+
+
+mailer = Mailer()
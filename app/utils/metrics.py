@@ -0,0 +1,47 @@
+import os
+
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+                               generate_latest, multiprocess)
+
+# latency buckets in seconds, sizes in bytes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+HTTP_REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency by route",
+                                 ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests being served",
+                                ["method"], multiprocess_mode="livesum")
+HTTP_RESPONSE_BYTES = Histogram("http_response_size_bytes", "Response body size by route",
+                                ["method", "route"], buckets=SIZE_BUCKETS)
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "Duration of a single SQL statement",
+                             buckets=LATENCY_BUCKETS)
+DB_REQUEST_QUERIES = Histogram("db_queries_per_request", "SQL statements run by a request",
+                               ["method", "route"], buckets=COUNT_BUCKETS)
+DB_REQUEST_QUERY_SECONDS = Histogram("db_query_duration_per_request_seconds", "Time a request spent in SQL",
+                                     ["method", "route"], buckets=LATENCY_BUCKETS)
+S3_UPLOAD_SECONDS = Histogram("s3_upload_duration_seconds", "Duration of S3 uploads",
+                              ["operation"], buckets=LATENCY_BUCKETS)
+S3_UPLOAD_ERRORS = Counter("s3_upload_errors_total", "Failed S3 uploads", ["operation"])
+HTTP_COMPRESSED_RESPONSES = Counter("http_compressed_responses_total", "Responses sent compressed",
+                                    ["encoding", "route"])
+HTTP_COMPRESSION_SAVED_BYTES = Counter("http_compression_saved_bytes_total", "Body bytes saved by compression",
+                                       ["encoding", "route"])
+CELERY_TASK_SECONDS = Histogram("celery_task_duration_seconds", "Duration of celery tasks",
+                                ["task", "state"], buckets=LATENCY_BUCKETS)
+
+
+def get_registry() -> CollectorRegistry:
+    """
+    Registry to export, metrics of all the processes are merged when PROMETHEUS_MULTIPROC_DIR is set
+    (several uvicorn workers or a prefork celery worker).
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_metrics():
+    return generate_latest(get_registry()), CONTENT_TYPE_LATEST
@@ -0,0 +1,22 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+from app.config import settings
+
+bcrypt_context = CryptContext(schemes=["bcrypt"])
+# bcrypt releases the GIL, a bounded thread pool keeps hashing off the event loop
+# and caps the cpu a login burst can take from the worker.
+password_hash_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS,
+                                            thread_name_prefix="password-hash")
+
+
+async def get_password_hash(password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_hash_executor, bcrypt_context.hash, password)
+
+
+async def verify_password(plain_password, hashed_password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_hash_executor, bcrypt_context.verify, plain_password, hashed_password)
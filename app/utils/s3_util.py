@@ -1,16 +1,42 @@
+import asyncio
+import hashlib
+import mimetypes
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import partial
 
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from fastapi import HTTPException
 
 from app.config import settings
 from app.constants import TEMP_FILE_FOLDER
+from app.utils.metrics import S3_UPLOAD_ERRORS, S3_UPLOAD_SECONDS
 
 AWS_ACCESS_KEY = settings.AWS_ACCESS_KEY
 AWS_SECRET = settings.AWS_SECRET
 AWS_BUCKET = settings.AWS_BUCKET
 AWS_REGION = settings.AWS_REGION
+AWS_ENDPOINT_URL = settings.AWS_ENDPOINT_URL
+
+# one client shared by all threads, its connection pool sized for the upload threads
+S3_CONFIG = Config(
+    region_name=AWS_REGION,
+    max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+    connect_timeout=settings.S3_CONNECT_TIMEOUT,
+    read_timeout=settings.S3_READ_TIMEOUT,
+    retries={"mode": "adaptive", "max_attempts": settings.S3_MAX_ATTEMPTS},
+)
+
+
+def content_type_of(ext):
+    """
+    Content type of a file extension, e.g. jpg -> image/jpeg.
+    """
+    return mimetypes.types_map.get(f".{ext.lower()}", f"image/{ext.lower()}")
 
 
 class S3Service:
@@ -18,18 +44,156 @@ class S3Service:
         self.key = AWS_ACCESS_KEY
         self.secret = AWS_SECRET
         self.bucket = AWS_BUCKET
-        self.s3 = boto3.client("s3", aws_access_key_id=self.key, aws_secret_access_key=self.secret, )
+        self._client = None
+        self._client_lock = threading.Lock()
+        # boto3 is blocking, the API runs its calls on these threads instead of the event loop
+        self.executor = ThreadPoolExecutor(max_workers=settings.S3_MAX_POOL_CONNECTIONS, thread_name_prefix="s3")
+
+    @property
+    def s3(self):
+        """
+        The boto3 client, created on first use so importing the app doesn't need S3 settings to resolve.
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    client = boto3.client("s3", aws_access_key_id=self.key, aws_secret_access_key=self.secret,
+                                          endpoint_url=AWS_ENDPOINT_URL, config=S3_CONFIG)
+                    if settings.S3_CREATE_BUCKET:
+                        self.create_bucket(client)
+                    self._client = client
+        return self._client
+
+    def create_bucket(self, client):
+        """
+        Create the bucket if missing, for local stand-ins like moto server or MinIO.
+        """
+        try:
+            client.head_bucket(Bucket=self.bucket)
+        except ClientError:
+            options = {}
+            if AWS_REGION and AWS_REGION != "us-east-1":
+                options["CreateBucketConfiguration"] = {"LocationConstraint": AWS_REGION}
+            client.create_bucket(Bucket=self.bucket, **options)
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Await a blocking S3 call on the S3 threads, concurrent uploads each get a thread and a connection.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    def extra_args(self, content_type):
+        return {'ACL': 'public-read', 'ContentType': content_type, 'CacheControl': settings.S3_CACHE_CONTROL}
+
+    def get_url(self, key):
+        if AWS_ENDPOINT_URL:
+            return f"{AWS_ENDPOINT_URL}/{self.bucket}/{key}"
+        return f"https://{AWS_BUCKET}.s3.{AWS_REGION}.amazonaws.com/{key}"
 
     def upload_photo(self, path, key, ext):
         try:
-            self.s3.upload_file(path, self.bucket, key,
-                                ExtraArgs={'ACL': 'public-read', 'ContentType': f'image / {ext}'})
-            return f"https://{AWS_BUCKET}.s3.{AWS_REGION}.amazonaws.com/{key}"
+            with S3_UPLOAD_SECONDS.labels("upload_photo").time():
+                self.s3.upload_file(path, self.bucket, key,
+                                    ExtraArgs=self.extra_args(content_type_of(ext)))
+            return self.get_url(key)
         except ClientError as ex:
+            S3_UPLOAD_ERRORS.labels("upload_photo").inc()
             raise HTTPException(status_code=500, detail="S3 is not available at the moment")
         except Exception as ex:
+            S3_UPLOAD_ERRORS.labels("upload_photo").inc()
             raise HTTPException(status_code=500, detail="S3 is not available at the moment")
 
+    def upload_fileobj(self, fileobj, key, content_type):
+        """
+        Stream a file like object to S3, large bodies are sent as a multipart upload.
+        """
+        try:
+            with S3_UPLOAD_SECONDS.labels("upload_fileobj").time():
+                self.s3.upload_fileobj(fileobj, self.bucket, key,
+                                       ExtraArgs=self.extra_args(content_type))
+            return self.get_url(key)
+        except ClientError as ex:
+            S3_UPLOAD_ERRORS.labels("upload_fileobj").inc()
+            raise HTTPException(status_code=500, detail="S3 is not available at the moment")
+        except Exception as ex:
+            S3_UPLOAD_ERRORS.labels("upload_fileobj").inc()
+            raise HTTPException(status_code=500, detail="S3 is not available at the moment")
+
+    @staticmethod
+    def content_key(fileobj, ext):
+        """
+        Key of a file named after the sha256 of its content, the file is rewound after hashing.
+        """
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: fileobj.read(1024 * 1024), b""):
+            digest.update(chunk)
+        fileobj.seek(0)
+        return f"{digest.hexdigest()}.{ext}"
+
+    def head(self, key):
+        """
+        Metadata of an object (LastModified, ContentLength...), None when it doesn't exist. Always
+        asks S3, the orphan collection may have deleted an object any process has seen before.
+        """
+        try:
+            return self.s3.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as ex:
+            if ex.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise HTTPException(status_code=500, detail="S3 is not available at the moment")
+
+    def exists(self, key):
+        return self.head(key) is not None
+
+    def touch(self, key, content_type):
+        """
+        Reset the LastModified of an object by copying it onto itself.
+        """
+        self.s3.copy_object(Bucket=self.bucket, Key=key, CopySource={"Bucket": self.bucket, "Key": key},
+                            MetadataDirective="REPLACE", **self.extra_args(content_type))
+
+    def upload_content(self, fileobj, ext, content_type):
+        """
+        Upload a file under a key derived from its content, identical files share one object and
+        are only sent once. An existing object old enough to be collected as an orphan is touched,
+        the orphan collection keeps objects modified within its grace period.
+        """
+        key = self.content_key(fileobj, ext)
+        head = self.head(key)
+        if head is None:
+            return self.upload_fileobj(fileobj, key, content_type)
+        if head["LastModified"] < datetime.now(timezone.utc) - timedelta(hours=settings.IMAGE_GC_GRACE_HOURS / 2):
+            try:
+                self.touch(key, content_type)
+            except ClientError:
+                S3_UPLOAD_ERRORS.labels("touch").inc()
+                raise HTTPException(status_code=500, detail="S3 is not available at the moment")
+        return self.get_url(key)
+
+    def list_objects(self):
+        """
+        Iterate over the objects of the bucket, as dicts with Key and LastModified.
+        """
+        for page in self.s3.get_paginator("list_objects_v2").paginate(Bucket=self.bucket):
+            yield from page.get("Contents", [])
+
+    def delete_objects(self, keys):
+        """
+        Delete objects in batches of 1000 keys, the maximum of a DeleteObjects request.
+        """
+        keys = list(keys)
+        for start in range(0, len(keys), 1000):
+            self.s3.delete_objects(Bucket=self.bucket, Delete={
+                "Objects": [{"Key": key} for key in keys[start:start + 1000]], "Quiet": True
+            })
+
+    def key_from_url(self, url):
+        return url.rsplit("/", 1)[-1]
+
+    def download_bytes(self, key):
+        return self.s3.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+
     def download_photo(self, key):
         file_name = os.path.join(TEMP_FILE_FOLDER, key)
         self.s3.download_file(
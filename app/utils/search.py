@@ -0,0 +1,81 @@
+import bisect
+import difflib
+import heapq
+import re
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+TOKEN_RE = re.compile(r"\w+")
+
+# weight of a token found in each field, titles rank first like the 'A' weight of the Postgres vectors
+FIELD_WEIGHTS = (1.0, 0.4, 0.2)  # item title, item description, menu title
+PREFIX_FACTOR = 0.5
+FUZZY_FACTOR = 0.3
+
+MAX_INDEXES = 64
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_RE.findall((text or "").lower())
+
+
+class SearchIndex:
+    """
+    In-memory inverted index of the items of one store, the search fallback where Postgres full text
+    search isn't available (SQLite test runs). Matches whole tokens, prefixes and close spellings.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[int, str, Optional[str], str]]):
+        # token -> {item id: weight}
+        self.postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        for item_id, *fields in rows:
+            for weight, text in zip(FIELD_WEIGHTS, fields):
+                for token in tokenize(text):
+                    weights = self.postings[token]
+                    weights[item_id] = weights.get(item_id, 0.0) + weight
+        self.vocabulary = sorted(self.postings)
+
+    def expand(self, term: str) -> Dict[str, float]:
+        """
+        Tokens of the index matching a query term, with the factor applied to their weights.
+        """
+        matches = {term: 1.0} if term in self.postings else {}
+        start = bisect.bisect_left(self.vocabulary, term)
+        for token in self.vocabulary[start:]:
+            if not token.startswith(term):
+                break
+            matches.setdefault(token, PREFIX_FACTOR)
+        if not matches:
+            for token in difflib.get_close_matches(term, self.vocabulary, n=3, cutoff=0.75):
+                matches[token] = FUZZY_FACTOR
+        return matches
+
+    def search(self, q: str, limit: int) -> List[Tuple[int, float]]:
+        scores: Dict[int, float] = defaultdict(float)
+        for term in tokenize(q):
+            for token, factor in self.expand(term).items():
+                for item_id, weight in self.postings[token].items():
+                    scores[item_id] += weight * factor
+        return heapq.nlargest(limit, scores.items(), key=lambda score: (score[1], -score[0]))
+
+
+# indexes by unique_store_key, dropped by invalidate_store when the catalog of the store changes
+search_indexes: "OrderedDict[str, SearchIndex]" = OrderedDict()
+
+
+def get_search_index(unique_store_key: str) -> Optional[SearchIndex]:
+    index = search_indexes.get(unique_store_key)
+    if index is not None:
+        search_indexes.move_to_end(unique_store_key)
+    return index
+
+
+def set_search_index(unique_store_key: str, index: SearchIndex) -> None:
+    search_indexes[unique_store_key] = index
+    search_indexes.move_to_end(unique_store_key)
+    while len(search_indexes) > MAX_INDEXES:
+        search_indexes.popitem(last=False)
+
+
+def drop_search_index(unique_store_key: str) -> None:
+    search_indexes.pop(unique_store_key, None)
@@ -0,0 +1,66 @@
+import json
+from typing import Any, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.sql import Select
+
+from app.models.catalog_snapshot import CatalogSnapshot
+from app.models.item import Item
+from app.models.menu import Menu
+from app.models.store import Store
+from app.utils.helpers import make_etag
+
+
+def store_key_query(model: Any, id: int) -> Select:
+    """
+    `unique_store_key` of the store a store, menu or item row belongs to.
+    """
+    query = select(Store.unique_store_key)
+    if model is Item:
+        return query.join(Menu).join(Item).filter(Item.id == id)
+    if model is Menu:
+        return query.join(Menu).filter(Menu.id == id)
+    return query.filter(Store.id == id)
+
+
+def refresh_snapshot(db: Session, unique_store_key: str, bump_version: bool = True) -> Optional[Tuple[str, str]]:
+    """
+    Rebuild the (body, etag) snapshot of a store from its live active menus and items, the snapshot
+    is dropped when the store isn't public anymore. The store row is locked so the rebuilds of a
+    store run one at a time and the last one sees the last write. The catalog version of the store
+    is bumped unless `bump_version` is off. Doesn't commit.
+    """
+    # the api package imports the celery worker, which rebuilds snapshots too
+    from app.api.v1 import schemas
+
+    store = db.scalar(
+        select(Store)
+        .options(selectinload(Store.menus.and_(Menu.is_active.is_(True)))
+                 .selectinload(Menu.items.and_(Item.is_active.is_(True))))
+        .filter(Store.unique_store_key == unique_store_key)
+        .with_for_update()
+        # rows of the session may be stale after UPDATE ... RETURNING writes
+        .execution_options(populate_existing=True)
+    )
+    if store is not None and bump_version:
+        # updated_at is kept, it tracks the writes to the store row itself
+        db.execute(update(Store).where(Store.id == store.id).values(
+            catalog_version=Store.catalog_version + 1, catalog_updated_at=func.now(), updated_at=Store.updated_at
+        ))
+    if store is None or not store.is_active:
+        db.execute(delete(CatalogSnapshot).where(CatalogSnapshot.unique_store_key == unique_store_key))
+        return None
+
+    catalog = jsonable_encoder(schemas.StoreCatalog.from_orm(store))
+    body, etag = json.dumps(catalog, ensure_ascii=False, separators=(",", ":")), make_etag(catalog)
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(CatalogSnapshot).values(store_id=store.id, unique_store_key=unique_store_key,
+                                                       body=body, etag=etag, built_at=func.now())
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[CatalogSnapshot.store_id],
+        set_={column: statement.excluded[column] for column in ("body", "etag", "built_at")}
+    ))
+    return body, etag
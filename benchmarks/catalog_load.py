@@ -0,0 +1,299 @@
+"""
+Load test of the catalog API replaying a realistic traffic mix against a seeded catalog.
+
+Virtual users pick a scenario by weight until --duration is over:
+
+    browse  customer scanning a QR code: store, menus, catalog, items and a search
+    edit    owner changing the price of an item
+    login   owner logging in
+    create  owner adding items one by one (base64 photo upload)
+    import  owner bulk importing a menu of items from a csv and a zip of images
+
+Throughput and p50/p95/p99 latency are reported per route and written as JSON with --output, a
+previous run given with --baseline is compared route by route (exit code 1 on a p95 regression
+above --max-regression percent). Seed the catalog first with benchmarks.seed_catalog, then either
+run in process, with the S3 network calls and celery (so SMTP) stubbed:
+
+    python -m benchmarks.catalog_load --manifest catalog.json --output run.json
+
+or against a running server:
+
+    python -m benchmarks.catalog_load --manifest catalog.json --base-url http://localhost:8000
+"""
+import argparse
+import asyncio
+import base64
+import csv
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import zipfile
+from collections import defaultdict
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import httpx
+from botocore.exceptions import ClientError
+
+from benchmarks.login_storm import percentiles
+
+MIX = {"browse": 70, "edit": 12, "login": 8, "create": 8, "import": 2}
+IMPORT_ROWS = 25
+# share of the imported images already in the bucket, deduplicated by their content hash
+IMPORT_REUSED_IMAGES = 0.5
+SEARCH_TERMS = ["tikka", "spicy", "chicken", "soup", "mango", "grilled", "latte", "paneer", "burgr", "currie"]
+# 1x1 transparent png
+PHOTO = base64.b64encode(bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)).decode()
+
+
+class Recorder:
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def request(self, client, route, method, url, **kwargs):
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.timings[route].append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            self.errors[route] += 1
+        return response
+
+
+class Traffic:
+    def __init__(self, manifest, recorder: Recorder):
+        self.manifest = manifest
+        self.recorder = recorder
+        self.tokens = {}
+        self.stores = [(user, store) for user in manifest["users"] for store in user["stores"]]
+
+    async def token(self, client, user):
+        if user["email"] not in self.tokens:
+            response = await client.post("/api/v1/users/login",
+                                         data={"username": user["email"], "password": self.manifest["password"]})
+            response.raise_for_status()
+            self.tokens[user["email"]] = response.json()["access_token"]
+        return {"Authorization": f"Bearer {self.tokens[user['email']]}"}
+
+    async def browse(self, client):
+        _, store = random.choice(self.stores)
+        key, request = store["key"], self.recorder.request
+        await request(client, "GET /stores/?unique_store_key", "GET", "/api/v1/stores/",
+                      params={"unique_store_key": key})
+        await request(client, "GET /stores/{key}/menus", "GET", f"/api/v1/stores/{key}/menus",
+                      params={"page": 1, "size": 50})
+        await request(client, "GET /stores/{key}/catalog", "GET", f"/api/v1/stores/{key}/catalog")
+        await request(client, "GET /stores/{key}/items", "GET", f"/api/v1/stores/{key}/items",
+                      params={"page": 1, "size": 50})
+        await request(client, "GET /stores/{key}/search", "GET", f"/api/v1/stores/{key}/search",
+                      params={"q": random.choice(SEARCH_TERMS)})
+
+    async def edit(self, client):
+        user, store = random.choice(self.stores)
+        menu = random.choice(store["menus"])
+        if not menu["items"]:
+            return
+        await self.recorder.request(
+            client, "PUT /stores/{id}/menus/{id}/items/{id}", "PUT",
+            f"/api/v1/stores/{store['id']}/menus/{menu['id']}/items/{random.choice(menu['items'])}",
+            json={"price": round(random.uniform(2, 40), 2)}, headers=await self.token(client, user)
+        )
+
+    async def login(self, client):
+        user = random.choice(self.manifest["users"])
+        await self.recorder.request(client, "POST /users/login", "POST", "/api/v1/users/login",
+                                    data={"username": user["email"], "password": self.manifest["password"]})
+
+    async def create(self, client):
+        user, store = random.choice(self.stores)
+        menu = random.choice(store["menus"])
+        await self.recorder.request(
+            client, "POST /stores/{id}/menus/{id}/items", "POST",
+            f"/api/v1/stores/{store['id']}/menus/{menu['id']}/items",
+            json={"title": f"Bench item {uuid4().hex[:12]}", "description": "added by the load test",
+                  "price": 9.5, "encoded_photo": PHOTO, "extension": "png"},
+            headers=await self.token(client, user)
+        )
+
+
+    async def bulk_import(self, client):
+        user, store = random.choice(self.stores)
+        run = uuid4().hex[:12]
+        rows, archive = io.StringIO(), io.BytesIO()
+        writer = csv.DictWriter(rows, ["menu", "menu_image", "title", "description", "price", "image"])
+        writer.writeheader()
+        with zipfile.ZipFile(archive, "w") as images:
+            images.writestr("menu.png", photo_bytes(run))
+            for row in range(IMPORT_ROWS):
+                reused = random.random() < IMPORT_REUSED_IMAGES
+                images.writestr(f"{row}.png", photo_bytes(None if reused else f"{run}-{row}"))
+                writer.writerow({"menu": f"Import {run}", "menu_image": "menu.png", "title": f"Imported {run} {row}",
+                                 "description": "imported by the load test", "price": 9.5, "image": f"{row}.png"})
+        await self.recorder.request(
+            client, "POST /stores/{id}/catalog/import", "POST", f"/api/v1/stores/{store['id']}/catalog/import",
+            files={"catalog": ("catalog.csv", rows.getvalue().encode(), "text/csv"),
+                   "images": ("images.zip", archive.getvalue(), "application/zip")},
+            headers=await self.token(client, user)
+        )
+
+
+def photo_bytes(variant):
+    """
+    The png, made unique per `variant` by trailing bytes so it gets an object of its own.
+    """
+    photo = base64.b64decode(PHOTO)
+    return photo if variant is None else photo + variant.encode()
+
+
+SCENARIOS = {"browse": Traffic.browse, "edit": Traffic.edit, "login": Traffic.login, "create": Traffic.create,
+             "import": Traffic.bulk_import}
+
+
+async def virtual_user(traffic: Traffic, client, mix, stop_at):
+    scenarios, weights = zip(*mix.items())
+    while time.perf_counter() < stop_at:
+        await SCENARIOS[random.choices(scenarios, weights)[0]](traffic, client)
+
+
+class MemoryS3Client:
+    """
+    Stand-in for the boto3 client keeping the objects in memory, only the network is stubbed: the
+    S3Service code (content hashing, HEAD before upload, deduplication) runs as in production.
+    """
+
+    def __init__(self):
+        self.objects = {}
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+        return {"ContentLength": len(self.objects[Key]), "LastModified": datetime.now(timezone.utc)}
+
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        pass
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None):
+        self.objects[Key] = Fileobj.read()
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None):
+        with open(Filename, "rb") as f:
+            self.objects[Key] = f.read()
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+
+def stub_services():
+    """
+    Run the app in process without S3, a broker or SMTP: S3 calls go to an in-memory client and
+    celery uses an in-memory broker, so queued jobs (QR codes, renditions, emails) are never run.
+    """
+    os.environ["CELERY_BROKER_URL"] = "memory://"
+    os.environ["CELERY_RESULT_BACKEND"] = "cache+memory://"
+    from app.utils.s3_util import s3
+
+    s3._client = MemoryS3Client()
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(recorder: Recorder, duration: float):
+    routes = {}
+    for route, timings in sorted(recorder.timings.items()):
+        p = percentiles(timings)
+        routes[route] = {"count": len(timings), "errors": recorder.errors[route],
+                         "throughput": round(len(timings) / duration, 2), "mean_ms": round(statistics.mean(timings), 2),
+                         "p50_ms": round(p[50], 2), "p95_ms": round(p[95], 2), "p99_ms": round(p[99], 2)}
+    return routes
+
+
+def compare(routes, baseline, max_regression: float) -> bool:
+    """
+    Print the p95 change of every route against a baseline run, False if one regressed too much.
+    """
+    ok = True
+    print(f"\n{'route':<42}{'baseline p95':>14}{'p95':>10}{'change':>10}")
+    for route, stats in routes.items():
+        if route not in baseline["routes"]:
+            continue
+        before = baseline["routes"][route]["p95_ms"]
+        change = (stats["p95_ms"] - before) / before * 100 if before else 0.0
+        flag = ""
+        if change > max_regression:
+            ok, flag = False, "  REGRESSION"
+        print(f"{route:<42}{before:>12.1f}ms{stats['p95_ms']:>8.1f}ms{change:>+9.1f}%{flag}")
+    return ok
+
+
+async def run(args, manifest):
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60,
+                                   limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        stub_services()
+        from app.main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+    recorder = Recorder()
+    traffic = Traffic(manifest, recorder)
+    mix = {name: weight for name, weight in MIX.items() if name not in args.skip}
+    async with client:
+        stop_at = time.perf_counter() + args.duration
+        await asyncio.gather(*(virtual_user(traffic, client, mix, stop_at) for _ in range(args.concurrency)))
+    return report(recorder, args.duration), mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--manifest", default="catalog.json", help="written by benchmarks.seed_catalog")
+    parser.add_argument("--base-url", help="server to load, the app runs in process with stubs when omitted")
+    parser.add_argument("--concurrency", type=int, default=20, help="virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--skip", nargs="*", default=[], choices=list(MIX), help="scenarios left out of the mix")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare with")
+    parser.add_argument("--max-regression", type=float, default=20, help="allowed p95 increase in percent")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    routes, mix = asyncio.run(run(args, manifest))
+
+    print(f"{'route':<42}{'n':>7}{'err':>6}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for route, stats in routes.items():
+        print(f"{route:<42}{stats['count']:>7}{stats['errors']:>6}{stats['throughput']:>9.1f}"
+              f"{stats['p50_ms']:>7.1f}ms{stats['p95_ms']:>7.1f}ms{stats['p99_ms']:>7.1f}ms")
+
+    results = {
+        "meta": {"commit": git_commit(), "timestamp": datetime.now(timezone.utc).isoformat(),
+                 "target": args.base_url or "in-process", "concurrency": args.concurrency,
+                 "duration": args.duration, "mix": mix},
+        "routes": routes,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            if not compare(routes, json.load(f), args.max_regression):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark of login throughput and of the latency of other requests during a login storm.
+
+Registers a user on a running server, measures GET /api/v1/user latency alone, then again
+while `--concurrency` clients log in as fast as they can for `--duration` seconds:
+
+    python -m benchmarks.login_storm --base-url http://localhost:8000 --concurrency 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from uuid import uuid4
+
+import httpx
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return {p: timings[min(len(timings) - 1, int(len(timings) * p / 100))] for p in (50, 95, 99)}
+
+
+async def probe(client, token, stop_at):
+    timings = []
+    while time.perf_counter() < stop_at:
+        start = time.perf_counter()
+        response = await client.get("/api/v1/user", headers={"Authorization": f"Bearer {token}"})
+        response.raise_for_status()
+        timings.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.01)
+    return timings
+
+
+async def login(client, email, password, stop_at):
+    logins = 0
+    while time.perf_counter() < stop_at:
+        response = await client.post("/api/v1/users/login", data={"username": email, "password": password})
+        response.raise_for_status()
+        logins += 1
+    return logins
+
+
+async def run(base_url: str, concurrency: int, duration: float):
+    email, password = f"bench-{uuid4().hex[:8]}@example.com", uuid4().hex
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        response = await client.post("/api/v1/users", json={"email": email, "password": password})
+        response.raise_for_status()
+        token = response.json()["access_token"]
+
+        idle = await probe(client, token, time.perf_counter() + duration)
+
+        stop_at = time.perf_counter() + duration
+        busy, *logins = await asyncio.gather(
+            probe(client, token, stop_at),
+            *(login(client, email, password, stop_at) for _ in range(concurrency))
+        )
+
+    print(f"logins: {sum(logins)} in {duration:.0f}s ({sum(logins) / duration:.1f}/s, {concurrency} clients)")
+    for name, timings in (("idle", idle), ("during login storm", busy)):
+        p = percentiles(timings)
+        print(f"GET /api/v1/user {name:<18} n={len(timings):<6} mean={statistics.mean(timings):.1f}ms "
+              f"p50={p[50]:.1f}ms p95={p[95]:.1f}ms p99={p[99]:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=50, help="concurrent login clients")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per phase")
+    args = parser.parse_args()
+    asyncio.run(run(args.base_url, args.concurrency, args.duration))
+
+
+if __name__ == "__main__":
+    main()
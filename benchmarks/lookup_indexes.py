@@ -0,0 +1,107 @@
+"""
+Benchmark of the hot lookup queries before and after the lookup indexes migration.
+
+Seeds N stores, each with menus and items, into the database configured by DATABASE_URL,
+then times the lookups with the indexes dropped (downgrade) and created (upgrade).
+Run it against a scratch database only:
+
+    python -m benchmarks.lookup_indexes --stores 2000 --menus 5 --items 20
+"""
+import argparse
+import random
+import statistics
+import time
+from uuid import uuid4
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import insert, select
+
+from app.db.database import SessionLocal
+from app.models import Item, Menu, Store, User
+
+REVISION = "b3f1c2a9d4e7"
+PREVIOUS_REVISION = "6d8df73cc636"
+
+
+def insert_returning_ids(db, model, rows, chunk_size: int = 1000):
+    ids = []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        ids.extend(db.execute(insert(model).values(chunk).returning(model.id)).scalars().all())
+    return ids
+
+
+def seed(db, stores: int, menus: int, items: int):
+    run = uuid4().hex[:8]
+    owner_id = db.execute(
+        insert(User).values(email=f"bench-{run}@example.com", hashed_password="", is_active=True).returning(User.id)
+    ).scalar_one()
+    store_rows = [dict(name=f"store-{run}-{s}", contact_no="0", address="bench",
+                       logo_url=f"https://bench/{run}/logo/{s}", qr_code_url=f"https://bench/{run}/qr/{s}",
+                       is_active=True, owner_id=owner_id, unique_store_key=str(uuid4()))
+                  for s in range(stores)]
+    store_ids = insert_returning_ids(db, Store, store_rows)
+    menu_rows = [dict(title=f"menu-{run}-{store_id}-{m}", is_active=True,
+                      image_url=f"https://bench/{run}/menu/{store_id}/{m}", store_id=store_id)
+                 for store_id in store_ids for m in range(menus)]
+    menu_ids = insert_returning_ids(db, Menu, menu_rows)
+    item_rows = [dict(title=f"item-{i}", description="bench", price=1.0, is_active=True,
+                      image_url=f"https://bench/{run}/item/{menu_id}/{i}", menu_id=menu_id, owner_id=owner_id)
+                 for menu_id in menu_ids for i in range(items)]
+    db.execute(insert(Item), item_rows)
+    db.commit()
+    return owner_id, [row["unique_store_key"] for row in store_rows], store_ids, menu_ids
+
+
+def lookups(owner_id, keys, store_ids, menu_ids):
+    return {
+        "store by unique_store_key": lambda: select(Store).filter(Store.unique_store_key == random.choice(keys)),
+        "stores by owner_id": lambda: select(Store).filter(Store.owner_id == owner_id).limit(50),
+        "menus by store_id": lambda: select(Menu).filter(Menu.store_id == random.choice(store_ids)),
+        "items by menu_id": lambda: select(Item).filter(Item.menu_id == random.choice(menu_ids)),
+        "items by owner_id": lambda: select(Item).filter(Item.owner_id == owner_id).limit(50),
+    }
+
+
+def measure(db, queries, repeat: int):
+    report = {}
+    for name, query in queries.items():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            db.execute(query()).all()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        report[name] = (statistics.mean(timings), timings[int(len(timings) * 0.95) - 1])
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stores", type=int, default=1000)
+    parser.add_argument("--menus", type=int, default=5, help="menus per store")
+    parser.add_argument("--items", type=int, default=20, help="items per menu")
+    parser.add_argument("--repeat", type=int, default=200, help="executions per query")
+    args = parser.parse_args()
+
+    config = Config("alembic.ini")
+    command.upgrade(config, "head")
+    with SessionLocal() as db:
+        queries = lookups(*seed(db, args.stores, args.menus, args.items))
+
+    command.downgrade(config, PREVIOUS_REVISION)
+    with SessionLocal() as db:
+        before = measure(db, queries, args.repeat)
+    command.upgrade(config, REVISION)
+    with SessionLocal() as db:
+        after = measure(db, queries, args.repeat)
+    command.upgrade(config, "head")
+
+    print(f"{'query':<28}{'before mean/p95 ms':>22}{'after mean/p95 ms':>22}")
+    for name in queries:
+        print(f"{name:<28}{'%.3f / %.3f' % before[name]:>22}{'%.3f / %.3f' % after[name]:>22}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Data generator of realistic catalogs for the load tests: users -> stores -> menus -> items.
+
+Seeds the database configured by DATABASE_URL (SQLite or a local Postgres) and writes a manifest
+of the created users, stores, menus and items used by benchmarks.catalog_load:
+
+    python -m benchmarks.seed_catalog --users 20 --stores 5 --menus 8 --items 40 --manifest catalog.json
+
+Use --create-all on a fresh SQLite file, Postgres databases are expected to be at alembic head.
+"""
+import argparse
+import json
+import random
+from uuid import uuid4
+
+from sqlalchemy import insert
+
+from app.db.database import Base, SessionLocal, engine
+from app.models import Item, Menu, Store, User
+from app.utils.passwords import bcrypt_context
+
+MENU_TITLES = ["Starters", "Soups", "Salads", "Mains", "Grill", "Pasta", "Pizza", "Curries", "Rice", "Breads",
+               "Sides", "Desserts", "Drinks", "Coffee", "Tea", "Breakfast", "Specials", "Kids"]
+DISHES = ["tikka", "biryani", "burger", "risotto", "ramen", "tacos", "falafel", "lasagne", "gnocchi", "pho",
+          "paella", "curry", "kebab", "dumplings", "noodles", "sandwich", "wrap", "bowl", "salad", "soup",
+          "pancakes", "waffles", "cheesecake", "brownie", "lassi", "latte", "smoothie", "lemonade"]
+INGREDIENTS = ["paneer", "chicken", "lamb", "beef", "prawn", "tofu", "mushroom", "spinach", "mango", "lentil",
+               "chickpea", "halloumi", "salmon", "pork", "aubergine", "pumpkin", "truffle", "chocolate"]
+STYLES = ["spicy", "smoked", "crispy", "creamy", "grilled", "roasted", "tandoori", "garlic", "sweet", "classic"]
+
+# manifest keeps this many item ids per menu, enough for the owner edit traffic
+MANIFEST_ITEMS_PER_MENU = 20
+
+
+def insert_returning_ids(db, model, rows, chunk_size: int = 1000):
+    ids = []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        ids.extend(db.execute(insert(model).values(chunk).returning(model.id)).scalars().all())
+    return ids
+
+
+def item_title(rng: random.Random, taken: set) -> str:
+    while True:
+        title = f"{rng.choice(STYLES)} {rng.choice(INGREDIENTS)} {rng.choice(DISHES)}".capitalize()
+        if title not in taken:
+            taken.add(title)
+            return title
+        if len(taken) >= len(STYLES) * len(INGREDIENTS) * len(DISHES):
+            raise ValueError("too many items per menu for the word lists")
+
+
+def seed(db, users: int, stores: int, menus: int, items: int, password: str, seed_value: int = 0):
+    """
+    Seed `users` owners with `stores` stores each, `menus` menus per store and `items` items per menu.
+    Images point at fake urls, the load tests stub S3.
+    """
+    rng = random.Random(seed_value)
+    run = uuid4().hex[:8]
+    hashed_password = bcrypt_context.hash(password)
+    manifest = {"password": password, "users": []}
+    for u in range(users):
+        email = f"owner-{run}-{u}@example.com"
+        owner_id = insert_returning_ids(db, User, [dict(email=email, hashed_password=hashed_password,
+                                                        is_active=True)])[0]
+        store_rows = [dict(name=f"Store {run} {u}-{s}", contact_no=f"+1555{rng.randrange(10 ** 6):06d}",
+                           address=f"{rng.randrange(1, 999)} Market street",
+                           logo_url=f"https://bench.example.com/{run}/logo/{u}/{s}.png",
+                           qr_code_url=f"https://bench.example.com/{run}/qr/{u}/{s}.png",
+                           is_active=True, owner_id=owner_id, unique_store_key=str(uuid4()))
+                      for s in range(stores)]
+        store_ids = insert_returning_ids(db, Store, store_rows)
+        user_manifest = {"email": email, "stores": []}
+        for store_id, store_row in zip(store_ids, store_rows):
+            titles = rng.sample(MENU_TITLES, min(menus, len(MENU_TITLES)))
+            menu_ids = insert_returning_ids(db, Menu, [
+                dict(title=f"{title} {store_id}", is_active=True, store_id=store_id,
+                     image_url=f"https://bench.example.com/{run}/menu/{store_id}/{m}.png")
+                for m, title in enumerate(titles)
+            ])
+            store_manifest = {"id": store_id, "key": store_row["unique_store_key"], "menus": []}
+            for menu_id in menu_ids:
+                taken = set()
+                item_ids = insert_returning_ids(db, Item, [
+                    dict(title=item_title(rng, taken), description=f"{rng.choice(STYLES)} house favourite",
+                         price=round(rng.uniform(2, 40), 2), is_active=rng.random() > 0.05, menu_id=menu_id,
+                         owner_id=owner_id, image_url=f"https://bench.example.com/{run}/item/{menu_id}/{i}.png")
+                    for i in range(items)
+                ])
+                store_manifest["menus"].append({"id": menu_id, "items": item_ids[:MANIFEST_ITEMS_PER_MENU]})
+            user_manifest["stores"].append(store_manifest)
+        manifest["users"].append(user_manifest)
+        db.commit()
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--stores", type=int, default=5, help="stores per user")
+    parser.add_argument("--menus", type=int, default=8, help="menus per store")
+    parser.add_argument("--items", type=int, default=40, help="items per menu")
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--seed", type=int, default=0, help="random seed, for repeatable catalogs")
+    parser.add_argument("--create-all", action="store_true", help="create the tables from the models first")
+    parser.add_argument("--manifest", default="catalog.json")
+    args = parser.parse_args()
+
+    if args.create_all:
+        Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        manifest = seed(db, args.users, args.stores, args.menus, args.items, args.password, args.seed)
+    with open(args.manifest, "w") as f:
+        json.dump(manifest, f)
+    print(f"seeded {args.users} users, {args.users * args.stores} stores, "
+          f"{args.users * args.stores * args.menus} menus, {args.users * args.stores * args.menus * args.items} "
+          f"items, manifest written to {args.manifest}")
+
+
+if __name__ == "__main__":
+    main()
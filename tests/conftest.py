@@ -0,0 +1,46 @@
+"""
+The tests run against a throwaway SQLite database, with celery on an in-memory broker.
+The settings are read from the environment on import, so they are set before importing the app.
+"""
+import os
+import tempfile
+
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(), "test.db")
+
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{DATABASE_PATH}",
+    ASYNC_DATABASE_URL=f"sqlite+aiosqlite:///{DATABASE_PATH}",
+    CELERY_BROKER_URL="memory://",
+    CELERY_RESULT_BACKEND="cache+memory://",
+    CACHE_BACKEND="memory",
+)
+for name in ("DB_USER", "DB_PASSWORD", "DB_NAME", "SECRET_KEY", "AWS_ACCESS_KEY", "AWS_SECRET", "AWS_BUCKET",
+             "AWS_REGION", "MAIL_USERNAME", "MAIL_PASSWORD"):
+    os.environ.setdefault(name, "test")
+
+import pytest  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from app.db.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import Store  # noqa: E402
+from benchmarks.seed_catalog import seed  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def database():
+    Base.metadata.create_all(engine)
+    yield
+    engine.dispose()
+
+
+@pytest.fixture
+def catalog(database):
+    """
+    Manifest of a freshly seeded owner with one store, 2 menus and 3 items per menu, see
+    benchmarks.seed_catalog, with the `owner_id` of the user added.
+    """
+    with SessionLocal() as db:
+        manifest = seed(db, users=1, stores=1, menus=2, items=3, password="password")
+        store_id = manifest["users"][0]["stores"][0]["id"]
+        manifest["owner_id"] = db.scalar(select(Store.owner_id).filter(Store.id == store_id))
+    return manifest
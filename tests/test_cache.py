@@ -0,0 +1,34 @@
+"""
+Invalidation of the cached catalog entries of a store.
+"""
+import asyncio
+
+from app.utils.cache import MemoryCache, catalog_group, catalog_key
+
+
+def test_group_is_deleted_without_other_stores():
+    cache = MemoryCache(ttl=60, max_size=10)
+
+    async def scenario():
+        await cache.set(catalog_key("a", "menus", 1, 50), "menus a", group=catalog_group("a"))
+        await cache.set(catalog_key("a", "version"), "version a", group=catalog_group("a"))
+        await cache.set(catalog_key("ab", "menus", 1, 50), "menus ab", group=catalog_group("ab"))
+        await cache.delete_group(catalog_group("a"))
+        return [await cache.get(key) for key in (catalog_key("a", "menus", 1, 50), catalog_key("a", "version"),
+                                                 catalog_key("ab", "menus", 1, 50))]
+
+    assert asyncio.run(scenario()) == [None, None, "menus ab"]
+
+
+def test_evicted_entries_leave_their_group():
+    cache = MemoryCache(ttl=60, max_size=2)
+
+    async def scenario():
+        for page in range(3):
+            await cache.set(catalog_key("a", "items", page, 50), page, group=catalog_group("a"))
+        evicted = await cache.get(catalog_key("a", "items", 0, 50))
+        await cache.delete_group(catalog_group("a"))
+        return evicted
+
+    assert asyncio.run(scenario()) is None
+    assert cache._data == {} and cache._groups == {}
@@ -0,0 +1,57 @@
+"""
+Bulk import of a store catalog with its zip archive of images.
+"""
+import asyncio
+import io
+import threading
+import zipfile
+from types import SimpleNamespace
+
+import httpx
+
+from app.dependencies import generate_access_token
+from app.main import app
+from app.utils.helpers import upload_archive_images
+from app.utils.s3_util import s3
+
+
+def import_catalog(catalog, store_id, owner_id, filename):
+    async def request():
+        token = generate_access_token(SimpleNamespace(email="owner@example.com", id=owner_id))
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.post(f"/api/v1/stores/{store_id}/catalog/import",
+                                     files={"catalog": (filename, catalog, "text/csv")},
+                                     headers={"Authorization": f"Bearer {token}"})
+
+    return asyncio.run(request())
+
+
+def test_catalog_must_be_utf8(catalog):
+    store = catalog["users"][0]["stores"][0]
+    csv = "menu,title,price,image\nBoissons,Café crème,3,cafe.png\n".encode("latin-1")
+
+    response = import_catalog(csv, store["id"], catalog["owner_id"], "catalog.csv")
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Catalog must be UTF-8 encoded"
+
+
+def test_archive_images_are_read_off_the_event_loop(monkeypatch):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("cafe.png", b"png")
+        archive.writestr("menu.svg", b"<svg/>")
+    threads = []
+
+    def upload_content(fileobj, ext, content_type):
+        threads.append(threading.current_thread())
+        return f"https://bucket.example.com/{fileobj.read().decode()}.{ext}"
+
+    monkeypatch.setattr(s3, "upload_content", upload_content)
+
+    urls, errors = asyncio.run(upload_archive_images(zipfile.ZipFile(buffer),
+                                                     {"item": "cafe.png", "menu": "menu.svg", "other": "tea.png"}))
+
+    assert urls == {"item": "https://bucket.example.com/png.png"}
+    assert set(errors) == {"menu", "other"}
+    assert threading.main_thread() not in threads
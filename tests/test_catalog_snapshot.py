@@ -0,0 +1,73 @@
+"""
+Catalog snapshots are rebuilt by the celery workers after the writes, through the outbox.
+"""
+import asyncio
+import json
+
+from sqlalchemy import select
+
+from app import celery_worker
+from app.api.v1 import crud
+from app.db.database import AsyncSessionLocal, SessionLocal, async_engine
+from app.models import OutboxMessage, Store
+
+
+def run(write):
+    async def session():
+        try:
+            async with AsyncSessionLocal() as db:
+                return await write(db)
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(session())
+
+
+def price_in_snapshot(unique_store_key, item_id):
+    body, _ = run(lambda db: crud.snapshot.get(db, unique_store_key=unique_store_key))
+    return next(item["price"] for menu in json.loads(body)["menus"] for item in menu["items"] if item["id"] == item_id)
+
+
+def catalog_version(unique_store_key):
+    with SessionLocal() as db:
+        return db.scalar(select(Store.catalog_version).filter(Store.unique_store_key == unique_store_key))
+
+
+def relay(monkeypatch):
+    """
+    Run the outbox relay, returns the (task, args, kwargs) it published.
+    """
+    published = []
+    monkeypatch.setattr(celery_worker.celery, "send_task",
+                        lambda task, args, kwargs, task_id: published.append((task, args, kwargs)))
+    celery_worker.relay_outbox()
+    return published
+
+
+def test_writes_are_served_from_the_previous_snapshot_until_rebuilt(monkeypatch, catalog):
+    store = catalog["users"][0]["stores"][0]
+    menu = store["menus"][0]
+    item_id = menu["items"][0]
+    run(lambda db: crud.item.update_owned(db, item_id=item_id, menu_id=menu["id"], store_id=store["id"],
+                                          owner_id=catalog["owner_id"], obj_in={"price": 10, "is_active": True}))
+    celery_worker.refresh_catalog_snapshot.apply(args=[store["key"]]).get()
+    version = catalog_version(store["key"])
+
+    for price in (11, 12, 13):
+        run(lambda db: crud.item.update_owned(db, item_id=item_id, menu_id=menu["id"], store_id=store["id"],
+                                              owner_id=catalog["owner_id"], obj_in={"price": price}))
+    assert price_in_snapshot(store["key"], item_id) == 10
+    assert catalog_version(store["key"]) == version
+
+    # the rebuilds queued for the store are merged into one task
+    refreshes = [kwargs["outbox_ids"] for task, args, kwargs in relay(monkeypatch)
+                 if task == "refresh_catalog_snapshot" and args == [store["key"]]]
+    assert len(refreshes) == 1 and len(refreshes[0]) == 4
+
+    celery_worker.refresh_catalog_snapshot.apply(args=[store["key"]], kwargs={"outbox_ids": refreshes[0]}).get()
+    assert price_in_snapshot(store["key"], item_id) == 13
+    assert catalog_version(store["key"]) == version + 1
+    with SessionLocal() as db:
+        assert db.scalars(
+            select(OutboxMessage.delivered_at).filter(OutboxMessage.id.in_(refreshes[0]))
+        ).all().count(None) == 0
@@ -0,0 +1,53 @@
+"""
+Internal endpoints, only served with the INTERNAL_TOKEN bearer token.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.main import app
+
+
+def get(url, token=None):
+    async def request():
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get(url, headers=headers)
+
+    return asyncio.run(request())
+
+
+@pytest.fixture
+def internal_token(monkeypatch):
+    monkeypatch.setattr(settings, "INTERNAL_TOKEN", "internal-secret")
+    return "internal-secret"
+
+
+def test_pool_stats(internal_token):
+    response = get("/api/v1/internal/pool", internal_token)
+    assert response.status_code == 200
+    assert set(response.json()) == {"async", "sync"}
+
+
+def test_pool_stats_need_the_token(internal_token):
+    assert get("/api/v1/internal/pool").status_code == 404
+    assert get("/api/v1/internal/pool", "wrong").status_code == 404
+
+
+def test_pool_stats_hidden_without_a_configured_token(monkeypatch):
+    monkeypatch.setattr(settings, "INTERNAL_TOKEN", None)
+    assert get("/api/v1/internal/pool").status_code == 404
+    assert get("/api/v1/internal/pool", "None").status_code == 404
+
+
+def test_metrics(internal_token):
+    response = get("/metrics", internal_token)
+    assert response.status_code == 200
+    assert "http_request_duration_seconds" in response.text
+
+
+def test_metrics_need_the_token(internal_token):
+    assert get("/metrics").status_code == 404
+    assert get("/metrics", "wrong").status_code == 404
@@ -0,0 +1,238 @@
+"""
+Email delivery of the celery workers against a local aiosmtpd server.
+"""
+import socket
+import time
+
+import pytest
+from aiosmtpd.controller import Controller
+from sqlalchemy import func, select
+
+from app import celery_worker
+from app.config import settings
+from app.db.database import SessionLocal
+from app.models import OutboxMessage
+from app.utils.mailer import Mailer
+
+
+class RecordingHandler:
+    """
+    Keeps the received messages with the SMTP session they came in. DATA is answered with the
+    queued `replies` first, None accepting the message.
+    """
+
+    def __init__(self):
+        self.messages = []
+        self.replies = []
+        self.connections = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.connections.append(server)
+        reply = self.replies.pop(0) if self.replies else None
+        if reply is not None:
+            return reply
+        self.messages.append((id(session), envelope.rcpt_tos[0]))
+        return "250 OK"
+
+    @property
+    def recipients(self):
+        return [rcpt for _, rcpt in self.messages]
+
+    @property
+    def sessions(self):
+        return {session for session, _ in self.messages}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    for name, value in dict(MAIL_SERVER=controller.hostname, MAIL_PORT=controller.port, MAIL_STARTTLS=False,
+                            MAIL_SSL_TLS=False, MAIL_USE_CREDENTIALS=False, MAIL_MAX_PER_SECOND=0).items():
+        monkeypatch.setattr(settings, name, value)
+    yield controller
+    controller.stop()
+
+
+@pytest.fixture
+def mailer(monkeypatch, smtp_server):
+    """
+    Mailer of the worker process, created once the settings point at the local server.
+    """
+    mailer = Mailer()
+    monkeypatch.setattr(celery_worker, "mailer", mailer)
+    yield mailer
+    mailer.close()
+
+
+def batch(*recipients):
+    return [("Welcome", email_to, "Hello") for email_to in recipients]
+
+
+def test_batch_is_sent_in_one_session(smtp_server, mailer):
+    celery_worker.send_emails.apply(args=[batch("a@example.com", "b@example.com", "c@example.com")]).get()
+
+    assert smtp_server.handler.recipients == ["a@example.com", "b@example.com", "c@example.com"]
+    assert len(smtp_server.handler.sessions) == 1
+
+
+def test_connection_is_kept_across_tasks(smtp_server, mailer):
+    celery_worker.send_email.apply(args=["Welcome", "a@example.com", "Hello"]).get()
+    celery_worker.send_email.apply(args=["Welcome", "b@example.com", "Hello"]).get()
+
+    assert len(smtp_server.handler.sessions) == 1
+
+
+def test_throttling(monkeypatch, smtp_server):
+    monkeypatch.setattr(settings, "MAIL_MAX_PER_SECOND", 20)
+    mailer = Mailer()
+    monkeypatch.setattr(celery_worker, "mailer", mailer)
+
+    start = time.monotonic()
+    celery_worker.send_emails.apply(args=[batch(*(f"{n}@example.com" for n in range(5)))]).get()
+    mailer.close()
+
+    assert len(smtp_server.handler.messages) == 5
+    # the first message goes right away, the next ones 1/20s apart
+    assert time.monotonic() - start >= 4 / 20
+
+
+def test_reconnect_after_a_disconnect(smtp_server, mailer):
+    celery_worker.send_email.apply(args=["Welcome", "a@example.com", "Hello"]).get()
+    # the server drops the open connection, e.g. an idle timeout
+    smtp_server.loop.call_soon_threadsafe(smtp_server.handler.connections[-1].transport.close)
+    time.sleep(0.1)
+    celery_worker.send_email.apply(args=["Welcome", "b@example.com", "Hello"]).get()
+
+    assert smtp_server.handler.recipients == ["a@example.com", "b@example.com"]
+    assert len(smtp_server.handler.sessions) == 2
+
+
+def test_retry_of_the_unsent_messages_on_a_4xx_reply(smtp_server, mailer):
+    smtp_server.handler.replies = [None, "451 4.3.0 Try again later"]
+
+    result = celery_worker.send_emails.apply(args=[batch("a@example.com", "b@example.com", "c@example.com")])
+
+    # the retry only sends the messages from the refused one on, eager tasks retry right away
+    assert result.get() == {"status": "success", "sent": 2}
+    assert smtp_server.handler.recipients == ["a@example.com", "b@example.com", "c@example.com"]
+
+
+def count_connects(monkeypatch, mailer, refused: int = 0):
+    """
+    Connection attempts of `mailer`, the first `refused` ones fail as if the server was down.
+    """
+    attempts = []
+    connect = mailer.connect
+
+    def counted_connect():
+        attempts.append(1)
+        if len(attempts) <= refused:
+            raise ConnectionRefusedError(111, "Connection refused")
+        return connect()
+
+    monkeypatch.setattr(mailer, "connect", counted_connect)
+    return attempts
+
+
+def test_retry_until_the_server_is_back(monkeypatch, smtp_server, mailer):
+    attempts = count_connects(monkeypatch, mailer, refused=2)
+
+    celery_worker.send_email.apply(args=["Welcome", "a@example.com", "Hello"]).get()
+
+    assert len(attempts) == 3
+    assert smtp_server.handler.recipients == ["a@example.com"]
+
+
+def test_retries_are_bounded(monkeypatch, smtp_server, mailer):
+    attempts = count_connects(monkeypatch, mailer, refused=100)
+
+    result = celery_worker.send_email.apply(args=["Welcome", "a@example.com", "Hello"])
+
+    assert result.failed()
+    assert isinstance(result.result, ConnectionRefusedError)
+    assert len(attempts) == 1 + celery_worker.send_email.max_retries
+
+
+def add_outbox_message(delivered: bool) -> int:
+    with SessionLocal() as db:
+        message = OutboxMessage(task="send_email", args=[], sent_at=func.now(),
+                                delivered_at=func.now() if delivered else None)
+        db.add(message)
+        db.commit()
+        return message.id
+
+
+def test_delivered_outbox_message_is_skipped(database, smtp_server, mailer):
+    outbox_id = add_outbox_message(delivered=True)
+
+    result = celery_worker.send_email.apply(args=["Welcome", "a@example.com", "Hello"],
+                                            kwargs={"outbox_id": outbox_id})
+
+    assert result.get() == {"status": "skipped"}
+    assert smtp_server.handler.messages == []
+
+
+def test_outbox_messages_are_marked_delivered(database, smtp_server, mailer):
+    outbox_ids = [add_outbox_message(delivered=False), add_outbox_message(delivered=False)]
+
+    celery_worker.send_emails.apply(args=[batch("a@example.com", "b@example.com")],
+                                    kwargs={"outbox_ids": outbox_ids}).get()
+    # the relay published the messages twice
+    result = celery_worker.send_emails.apply(args=[batch("a@example.com", "b@example.com")],
+                                             kwargs={"outbox_ids": outbox_ids})
+
+    assert result.get() == {"status": "skipped"}
+    assert smtp_server.handler.recipients == ["a@example.com", "b@example.com"]
+    with SessionLocal() as db:
+        assert db.scalars(
+            select(OutboxMessage.delivered_at).filter(OutboxMessage.id.in_(outbox_ids))
+        ).all().count(None) == 0
+
+
+def test_only_the_undelivered_messages_of_a_batch_are_sent(database, smtp_server, mailer):
+    outbox_ids = [add_outbox_message(delivered=True), add_outbox_message(delivered=False)]
+
+    result = celery_worker.send_emails.apply(args=[batch("a@example.com", "b@example.com")],
+                                             kwargs={"outbox_ids": outbox_ids})
+
+    assert result.get() == {"status": "success", "sent": 1}
+    assert smtp_server.handler.recipients == ["b@example.com"]
+
+
+def test_messages_sent_before_a_retry_are_marked_delivered(database, smtp_server, mailer):
+    smtp_server.handler.replies = [None, "451 4.3.0 Try again later"]
+    outbox_ids = [add_outbox_message(delivered=False), add_outbox_message(delivered=False)]
+
+    celery_worker.send_emails.apply(args=[batch("a@example.com", "b@example.com")],
+                                    kwargs={"outbox_ids": outbox_ids}).get()
+
+    assert smtp_server.handler.recipients == ["a@example.com", "b@example.com"]
+    assert celery_worker.delivered_ids(outbox_ids) == set(outbox_ids)
+
+
+def test_relay_batches_queued_emails(monkeypatch, database):
+    monkeypatch.setattr(settings, "MAIL_BATCH_SIZE", 2)
+    with SessionLocal() as db:
+        messages = [OutboxMessage(task="send_email", args=["Welcome", f"{n}@example.com", "Hello"]) for n in range(3)]
+        db.add_all(messages)
+        db.commit()
+        outbox_ids = [message.id for message in messages]
+    published = []
+    monkeypatch.setattr(celery_worker.celery, "send_task",
+                        lambda task, args, kwargs, task_id: published.append((task, args, kwargs)))
+
+    celery_worker.relay_outbox()
+
+    batches = [(args[0], kwargs["outbox_ids"]) for task, args, kwargs in published
+               if task == "send_emails" and set(kwargs["outbox_ids"]) & set(outbox_ids)]
+    assert [ids for _, ids in batches] == [outbox_ids[:2], outbox_ids[2:]]
+    assert [message[1] for emails, _ in batches for message in emails] == [f"{n}@example.com" for n in range(3)]
+    assert "send_email" not in [task for task, _, _ in published]
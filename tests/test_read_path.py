@@ -0,0 +1,45 @@
+"""
+List pages go through their response_model unless FAST_READ_PATH sends the rows with orjson.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from app.api.v1 import crud
+from app.config import settings
+from app.main import app
+
+
+def get(url):
+    async def request():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get(url)
+
+    return asyncio.run(request())
+
+
+@pytest.mark.parametrize("fast_read_path", [False, True])
+def test_menu_page_of_a_store(monkeypatch, catalog, fast_read_path):
+    monkeypatch.setattr(settings, "FAST_READ_PATH", fast_read_path)
+    store = catalog["users"][0]["stores"][0]
+
+    response = get(f"/api/v1/stores/{store['key']}/menus/keyset?size=1")
+
+    assert response.status_code == 200
+    page = response.json()
+    assert [menu["id"] for menu in page["items"]] == [store["menus"][0]["id"]]
+    assert page["next_cursor"] == store["menus"][0]["id"]
+
+
+@pytest.mark.parametrize("fast_read_path, exposed", [(False, False), (True, True)])
+def test_rows_are_validated_unless_fast(monkeypatch, catalog, fast_read_path, exposed):
+    monkeypatch.setattr(settings, "FAST_READ_PATH", fast_read_path)
+    # a column the response model doesn't declare
+    monkeypatch.setattr(crud.menu, "row_to_dict", lambda row: {**row._mapping, "internal_note": "x"})
+    store = catalog["users"][0]["stores"][0]
+
+    response = get(f"/api/v1/stores/{store['key']}/menus/keyset")
+
+    assert response.status_code == 200
+    assert ("internal_note" in response.json()["items"][0]) is exposed
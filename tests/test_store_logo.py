@@ -0,0 +1,55 @@
+"""
+The base64 logo of a new store is decoded and uploaded by the celery workers.
+"""
+import asyncio
+import base64
+
+from sqlalchemy import select
+
+from app import celery_worker
+from app.api.v1 import crud, schemas
+from app.db.database import AsyncSessionLocal, SessionLocal, async_engine
+from app.models import OutboxMessage, Store
+from app.utils.s3_util import s3
+
+
+def create_store(owner_id, encoded_photo):
+    async def session():
+        try:
+            async with AsyncSessionLocal() as db:
+                store_in = schemas.StoreCreate(name="Logo store", contact_no="0", address="Street",
+                                               encoded_photo=encoded_photo)
+                store = await crud.store.create_with_owner(db, obj_in=store_in, owner_id=owner_id)
+                return store.id, store.unique_store_key, store.logo_url
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(session())
+
+
+def queued_logos():
+    with SessionLocal() as db:
+        return db.scalars(select(OutboxMessage.args).filter(OutboxMessage.task == "upload_store_logo")).all()
+
+
+def test_logo_is_uploaded_by_the_worker(monkeypatch, catalog):
+    uploads = []
+    monkeypatch.setattr(s3, "upload_content",
+                        lambda fileobj, ext, content_type: uploads.append(fileobj.read()) or "https://bucket.example.com/logo.png")
+
+    store_id, unique_store_key, logo_url = create_store(catalog["owner_id"], base64.b64encode(b"logo").decode())
+
+    assert logo_url is None and uploads == []
+    args = next(args for args in queued_logos() if args[0] == str(unique_store_key))
+    assert celery_worker.upload_store_logo.apply(args=args).get() == {"status": "success"}
+    assert uploads == [b"logo"]
+    with SessionLocal() as db:
+        assert db.scalar(select(Store.logo_url).filter(Store.id == store_id)) == "https://bucket.example.com/logo.png"
+        assert db.scalar(select(OutboxMessage.id).filter(OutboxMessage.task == "generate_image_renditions",
+                                                         OutboxMessage.args == ["stores", store_id])) is not None
+
+
+def test_invalid_logo_is_not_retried(monkeypatch, catalog):
+    monkeypatch.setattr(s3, "upload_content", lambda fileobj, ext, content_type: "https://bucket.example.com/logo.png")
+
+    assert celery_worker.upload_store_logo.apply(args=["unknown", "not base64!", "png"]).get() == {"status": "invalid"}
@@ -0,0 +1,38 @@
+"""
+Photos uploaded as multipart files.
+"""
+import asyncio
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+
+from app.utils import helpers
+from app.utils.s3_util import s3
+
+
+def upload(content_type):
+    photo = UploadFile(io.BytesIO(b"photo"), filename="photo", headers=Headers({"content-type": content_type}))
+    return asyncio.run(helpers.upload_file_to_s3(photo))
+
+
+@pytest.mark.parametrize("content_type, key", [
+    ("image/jpeg", "photo.jpg"),
+    ("image/png", "photo.png"),
+    ("image/webp; charset=binary", "photo.webp"),
+])
+def test_photo_key_extension_is_derived_from_the_content_type(monkeypatch, content_type, key):
+    monkeypatch.setattr(s3, "upload_content",
+                        lambda fileobj, ext, content_type: f"https://bucket.example.com/photo.{ext}")
+
+    assert upload(content_type) == f"https://bucket.example.com/{key}"
+
+
+@pytest.mark.parametrize("content_type", ["image/svg+xml", "image/../../index.html", "text/html", ""])
+def test_other_content_types_are_rejected(monkeypatch, content_type):
+    monkeypatch.setattr(s3, "upload_content", lambda fileobj, ext, content_type: pytest.fail("uploaded"))
+
+    with pytest.raises(HTTPException) as error:
+        upload(content_type)
+    assert error.value.status_code == 400
@@ -0,0 +1,134 @@
+"""
+Statements run by the owner writes, counted with app.db.query_counter. A write is one
+ownership-scoped `UPDATE/DELETE ... RETURNING`, plus on success the outbox row queueing the rebuild
+of the catalog snapshot of the store on the celery workers, whatever the catalog size.
+"""
+import asyncio
+import base64
+
+from sqlalchemy import select
+
+from app.api.v1 import crud
+from app.api.v1.crud import base
+from app.db.database import AsyncSessionLocal, SessionLocal, async_engine
+from app.db.query_counter import track_queries
+from app.models import Store
+from benchmarks.seed_catalog import seed
+
+# INSERT of the outbox row of the snapshot rebuild, in the transaction of the write
+QUEUE_REFRESH_STATEMENTS = 1
+
+
+def count_statements(write):
+    """
+    Run `write(db)` in a new session, returns its result and the number of statements it ran.
+    """
+    async def run():
+        try:
+            async with AsyncSessionLocal() as db:
+                with track_queries() as stats:
+                    result = await write(db)
+            return result, stats.count
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(run())
+
+
+def first_item(catalog):
+    store = catalog["users"][0]["stores"][0]
+    menu = store["menus"][0]
+    return dict(item_id=menu["items"][0], menu_id=menu["id"], store_id=store["id"], owner_id=catalog["owner_id"])
+
+
+def test_update_item(catalog):
+    item, count = count_statements(lambda db: crud.item.update_owned(db, **first_item(catalog),
+                                                                     obj_in={"price": 12.5}))
+    assert item.price == 12.5
+    assert count == 1 + QUEUE_REFRESH_STATEMENTS
+
+
+def test_update_item_of_another_owner(catalog):
+    ids = {**first_item(catalog), "owner_id": catalog["owner_id"] + 1}
+    item, count = count_statements(lambda db: crud.item.update_owned(db, **ids, obj_in={"price": 12.5}))
+    assert item is None
+    assert count == 1
+
+
+def test_update_item_of_a_large_catalog(database):
+    with SessionLocal() as db:
+        large = seed(db, users=1, stores=1, menus=8, items=40, password="password")
+    store = large["users"][0]["stores"][0]
+    with SessionLocal() as db:
+        owner_id = db.scalar(select(Store.owner_id).filter(Store.id == store["id"]))
+    ids = dict(item_id=store["menus"][0]["items"][0], menu_id=store["menus"][0]["id"], store_id=store["id"],
+               owner_id=owner_id)
+    item, count = count_statements(lambda db: crud.item.update_owned(db, **ids, obj_in={"price": 12.5}))
+    assert item.price == 12.5
+    assert count == 1 + QUEUE_REFRESH_STATEMENTS
+
+
+def test_remove_store(catalog):
+    ids = first_item(catalog)
+    store, count = count_statements(lambda db: crud.store.remove_owned(db, store_id=ids["store_id"],
+                                                                       owner_id=ids["owner_id"]))
+    assert store.deleted_at is not None
+    # archive the store, its menus and their items
+    assert count == 3 + QUEUE_REFRESH_STATEMENTS
+
+
+def test_remove_item(catalog):
+    item, count = count_statements(lambda db: crud.item.remove_owned(db, **first_item(catalog)))
+    assert item.deleted_at is not None
+    assert count == 1 + QUEUE_REFRESH_STATEMENTS
+
+
+def test_update_menu(catalog):
+    ids = first_item(catalog)
+    menu, count = count_statements(lambda db: crud.menu.update_owned(
+        db, menu_id=ids["menu_id"], store_id=ids["store_id"], owner_id=ids["owner_id"], obj_in={"title": "Lunch"}
+    ))
+    assert menu.title == "Lunch"
+    assert count == 1 + QUEUE_REFRESH_STATEMENTS
+
+
+def test_remove_menu(catalog):
+    ids = first_item(catalog)
+    menu, count = count_statements(lambda db: crud.menu.remove_owned(
+        db, menu_id=ids["menu_id"], store_id=ids["store_id"], owner_id=ids["owner_id"]
+    ))
+    assert menu.deleted_at is not None
+    # the items of the menu are archived in the same transaction
+    assert count == 2 + QUEUE_REFRESH_STATEMENTS
+
+
+def test_update_store(catalog):
+    ids = first_item(catalog)
+    store, count = count_statements(lambda db: crud.store.update_owned(
+        db, store_id=ids["store_id"], owner_id=ids["owner_id"], obj_in={"address": "1 Harbour road"}
+    ))
+    assert store.address == "1 Harbour road"
+    assert count == 1 + QUEUE_REFRESH_STATEMENTS
+
+
+def test_photo_is_uploaded_once_the_owner_matched(monkeypatch, catalog):
+    uploads = []
+
+    async def upload_encoded_photo(encoded_photo, extension):
+        uploads.append(extension)
+        return "https://bucket.example.com/photo.png"
+
+    monkeypatch.setattr(base, "upload_encoded_photo", upload_encoded_photo)
+    photo = {"price": 9.5, "encoded_photo": base64.b64encode(b"photo").decode(), "extension": "png"}
+
+    ids = {**first_item(catalog), "owner_id": catalog["owner_id"] + 1}
+    item, count = count_statements(lambda db: crud.item.update_owned(db, **ids, obj_in=photo))
+    assert item is None
+    assert uploads == []
+    assert count == 1
+
+    item, count = count_statements(lambda db: crud.item.update_owned(db, **first_item(catalog), obj_in=photo))
+    assert uploads == ["png"]
+    assert item.image_url == "https://bucket.example.com/photo.png" and item.price == 9.5
+    # the price, then the image of the matched row, the outbox rows of its renditions and of the rebuild
+    assert count == 2 + 1 + QUEUE_REFRESH_STATEMENTS